@@ -1,7 +1,7 @@
 from django.contrib import admin
 from accounts.models import User
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from accounts.models import user_address
+from accounts.models import OutgoingEmail, user_address
 
 class user_addressAdmin(admin.ModelAdmin):
     list_display = ['email', 'village_or_town', 'city', 'state', 'pincode', 'phone']
@@ -37,6 +37,7 @@ class UserModelAdmin(BaseUserAdmin):
 # Now register the new UserModelAdmin...
 admin.site.register(User, UserModelAdmin)
 admin.site.register(user_address)
+admin.site.register(OutgoingEmail)
 
 
 
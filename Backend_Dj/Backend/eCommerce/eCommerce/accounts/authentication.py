@@ -0,0 +1,183 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import User
+
+# User fields copied into every token, and read back from it on each request
+CLAIM_FIELDS = ('email', 'name', 'is_admin')
+
+
+class UserCache:
+    """
+    Per-process cache of full User rows with a short TTL. Saving or deleting
+    a User drops its entry here, and a committed save puts the new row back
+    (see accounts.signals); other processes see the change once their entry
+    expires.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._users.clear()
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+    def get(self, pk):
+        with self._lock:
+            entry = self._users.get(pk)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self._users.pop(pk, None)
+            self.misses += 1
+            return None
+
+    def set(self, user):
+        with self._lock:
+            self._users[user.pk] = (time.monotonic() + settings.USER_CACHE_TTL, user)
+
+    def invalidate(self, pk):
+        with self._lock:
+            self._users.pop(pk, None)
+            self.invalidations += 1
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._users),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+user_cache = UserCache()
+
+
+def _copy(user):
+    fields = User._meta.concrete_fields
+    return User.from_db(
+        user._state.db,
+        [field.attname for field in fields],
+        [getattr(user, field.attname) for field in fields],
+    )
+
+
+def remember(user):
+    """Cache a copy of a fully loaded `user`; partial instances are skipped."""
+    if not user.get_deferred_fields():
+        user_cache.set(_copy(user))
+
+
+def _fetch(pk):
+    user = User.objects.filter(pk=pk).first()
+    if user is not None:
+        user_cache.set(user)
+        user = _copy(user)
+    return user
+
+
+def load_user(pk):
+    """
+    Return the full User row for `pk`, from the per-process cache when
+    fresh. Callers get their own copy, so mutating it is safe.
+    """
+    user = user_cache.get(pk)
+    return _copy(user) if user is not None else _fetch(pk)
+
+
+def full_user(user):
+    """
+    The complete User behind a (possibly token-built) request.user, for the
+    views that read or write more than the token carries.
+    """
+    if not user.get_deferred_fields():
+        return user
+    return load_user(user.pk) or user
+
+
+def token_user(pk, claims):
+    """
+    Build a User from token claims without touching the database. Fields
+    the token doesn't carry are deferred: reading one loads it.
+    """
+    loaded = {'id': pk, 'is_active': True, **claims}
+    fields = User._meta.concrete_fields
+    return User.from_db(
+        DEFAULT_DB_ALIAS,
+        [field.attname for field in fields if field.attname in loaded],
+        [loaded[field.attname] for field in fields if field.attname in loaded],
+    )
+
+
+class UserRefreshToken(RefreshToken):
+    """Refresh token (and derived access token) carrying CLAIM_FIELDS."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for field in CLAIM_FIELDS:
+            token[field] = getattr(user, field)
+        return token
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that trusts the signed claims instead of loading the
+    user on every request. request.user is a real User instance, so
+    `customer=request.user` filters and foreign keys work unchanged, with
+    everything but the claims deferred.
+
+    The claims are only trusted for reads by non-admins. Admin tokens and
+    state-changing requests (anything but GET/HEAD/OPTIONS) check the stored
+    row through the user cache, so a deactivated or demoted user loses
+    access within USER_CACHE_TTL rather than when the token expires.
+    A fresh cached row also wins over the claims, and tokens issued before
+    the claims existed fall back to a cached lookup.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is None or request.method in SAFE_METHODS:
+            return result
+        user, token = result
+        if user.get_deferred_fields():
+            user = self.check_user(load_user(user.pk))
+        return user, token
+
+    def get_user(self, validated_token):
+        try:
+            pk = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        cached = user_cache.get(pk)
+        if cached is not None:
+            return self.check_user(_copy(cached))
+        claims = {field: validated_token.get(field) for field in CLAIM_FIELDS}
+        if None not in claims.values() and not claims['is_admin']:
+            return token_user(pk, claims)
+        return self.check_user(_fetch(pk))
+
+    @staticmethod
+    def check_user(user):
+        if user is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
@@ -0,0 +1,112 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework.exceptions import APIException
+
+
+class HashingBusy(APIException):
+    status_code = 503
+    default_detail = "Too many logins at once, please try again."
+    default_code = "hashing_busy"
+
+
+class HashingPool:
+    """
+    Bounded pool password hashes run on. At most PASSWORD_HASH_WORKERS hashes
+    run at once and PASSWORD_HASH_QUEUE more may wait; past that HashingBusy
+    (503) is raised, so a login storm can't take every request thread's CPU.
+    The hash functions release the GIL, so the workers really run in parallel.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._executor = None
+        self._slots = None
+
+    def _mark_worker(self):
+        self._local.in_worker = True
+
+    def _start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS,
+                    thread_name_prefix='hasher',
+                    initializer=self._mark_worker,
+                )
+                self._slots = threading.BoundedSemaphore(
+                    settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE
+                )
+            return self._executor, self._slots
+
+    def run(self, func, *args):
+        # verify() calls encode(): don't queue behind ourselves
+        if not settings.PASSWORD_HASH_WORKERS or getattr(self._local, 'in_worker', False):
+            return func(*args)
+        executor, slots = self._start()
+        if not slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            return executor.submit(func, *args).result()
+        finally:
+            slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._executor = self._slots = None
+
+
+pool = HashingPool()
+
+
+class PooledHasherMixin:
+    """Run the expensive part of a hasher on `pool`."""
+
+    def encode(self, password, salt, *args, **kwargs):
+        return pool.run(super().encode, password, salt, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        return pool.run(super().verify, password, encoded)
+
+
+# Work factors are read from PASSWORD_HASHER_PARAMS on every use. Raising one
+# makes must_update() true for older hashes, which Django then re-hashes on
+# the user's next successful login.
+
+class PBKDF2PasswordHasher(PooledHasherMixin, hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHER_PARAMS['pbkdf2']['iterations']
+
+
+class ScryptPasswordHasher(PooledHasherMixin, hashers.ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_HASHER_PARAMS['scrypt']['work_factor']
+
+    @property
+    def block_size(self):
+        return settings.PASSWORD_HASHER_PARAMS['scrypt']['block_size']
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_HASHER_PARAMS['scrypt']['parallelism']
+
+
+class Argon2PasswordHasher(PooledHasherMixin, hashers.Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_HASHER_PARAMS['argon2']['time_cost']
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_HASHER_PARAMS['argon2']['memory_cost']
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_HASHER_PARAMS['argon2']['parallelism']
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from accounts.authentication import StatelessJWTAuthentication, user_cache
+from accounts.models import User
+from accounts.views import get_tokens_for_user
+from orders.views import showOrder
+from utility.benchmark import measure, throwaway_database
+
+
+class Command(BaseCommand):
+    help = "Compare authenticated requests/s with and without stateless JWT users (uses a throwaway database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per measurement")
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        with throwaway_database():
+            user = User.objects.create_user(
+                email='bench@example.com', name='Bench', terms_condition=True, password='bench'
+            )
+            header = f"Bearer {get_tokens_for_user(user)['access']}"
+            factory = APIRequestFactory()
+
+            self.stdout.write(f"{count} authenticated GET /showorder/?status=pending")
+            baseline = None
+            for name, authentication in (
+                ("JWTAuthentication", JWTAuthentication),
+                ("StatelessJWTAuthentication", StatelessJWTAuthentication),
+            ):
+                view = showOrder.as_view(authentication_classes=[authentication])
+                user_cache.reset()
+
+                def run():
+                    for _ in range(count):
+                        request = factory.get('/showorder/', {'status': 'pending'}, HTTP_AUTHORIZATION=header)
+                        response = view(request)
+                        assert response.status_code == 200, response.data
+
+                run()  # warm up
+                _, elapsed, queries = measure(run)
+                per_second = count / elapsed
+                baseline = baseline or per_second
+                self.stdout.write(
+                    f"  {name:<28} {per_second:8.1f} req/s  "
+                    f"{queries / count:.1f} queries/req  x{per_second / baseline:.2f}"
+                )
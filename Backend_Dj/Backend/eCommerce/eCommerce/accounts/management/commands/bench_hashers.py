@@ -0,0 +1,81 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from accounts.hashers import HashingBusy, pool
+from accounts.models import User
+from accounts.views import UserLoginView
+from utility.benchmark import throwaway_database
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = "Report password hashes/s and login latency for each hasher (uses a throwaway database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hashes', type=int, default=20, help="Hashes per measurement")
+        parser.add_argument('--logins', type=int, default=100, help="Logins per measurement")
+        parser.add_argument('--concurrency', type=int, default=8, help="Concurrent login threads")
+
+    def login(self, view, factory):
+        request = factory.post(
+            '/login/', {'email': 'bench@example.com', 'password': 'bench-password'}, format='json'
+        )
+        start = time.perf_counter()
+        try:
+            status_code = view(request).status_code
+        except HashingBusy:
+            status_code = 503
+        finally:
+            connections.close_all()
+        return status_code, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        view = UserLoginView.as_view()
+        factory = APIRequestFactory()
+        self.stdout.write(
+            f"{options['concurrency']} concurrent logins, "
+            f"{settings.PASSWORD_HASH_WORKERS} hash workers, queue {settings.PASSWORD_HASH_QUEUE}"
+        )
+        self.stdout.write(f"{'hasher':<8} {'hashes/s':>9} {'login p50 ms':>13} {'p99 ms':>8} {'503s':>5}")
+        with throwaway_database():
+            user = User.objects.create_user(
+                email='bench@example.com', name='Bench', terms_condition=True, password='bench'
+            )
+            for algorithm, path in settings.PASSWORD_HASHER_CLASSES.items():
+                if path not in settings.PASSWORD_HASHERS:
+                    self.stdout.write(f"{algorithm:<8} not available")
+                    continue
+                with override_settings(PASSWORD_HASHERS=[path]):
+                    start = time.perf_counter()
+                    for _ in range(options['hashes']):
+                        make_password('bench-password')
+                    per_second = options['hashes'] / (time.perf_counter() - start)
+
+                    User.objects.filter(pk=user.pk).update(password=make_password('bench-password'))
+                    with ThreadPoolExecutor(max_workers=options['concurrency']) as clients:
+                        results = list(clients.map(
+                            lambda _: self.login(view, factory), range(options['logins'])
+                        ))
+                timings = [seconds for status_code, seconds in results if status_code == 200]
+                rejected = sum(status_code == 503 for status_code, _ in results)
+                if not timings:
+                    self.stdout.write(f"{algorithm:<8} {per_second:>9.1f} {'-':>13} {'-':>8} {rejected:>5}")
+                    continue
+                self.stdout.write(
+                    f"{algorithm:<8} {per_second:>9.1f} "
+                    f"{statistics.median(timings) * 1000:>13.1f} {percentile(timings, 0.99) * 1000:>8.1f} "
+                    f"{rejected:>5}"
+                )
+        pool.shutdown()
@@ -0,0 +1,101 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.response import Response
+
+from accounts import renderers
+from accounts.renderers import UserRenderer
+
+
+def legacy_render(data):
+    # The renderer as it was before: stringify everything, then json.dumps it.
+    if 'ErrorDetail' in str(data):
+        return json.dumps({'errors': data})
+    return json.dumps(data)
+
+
+def product_payload(rows):
+    return [
+        {
+            "id": i,
+            "title": f"Product {i}",
+            "decription": "Soft cotton t-shirt with a relaxed fit. " * 4,
+            "actual_price": 1499.0,
+            "discount_price": 999.0,
+            "stock": 25,
+            "front_imges": f"/media/products/images/front_{i}.png",
+            "back_imges": f"/media/products/images/back_{i}.png",
+            "slug": f"{i:08x}",
+            "brand": i % 20,
+            "category": i % 8,
+            "brand_detail": {"name": f"Brand {i % 20}"},
+            "category_detail": {"name": f"Category {i % 8}"},
+        }
+        for i in range(rows)
+    ]
+
+
+def order_payload(rows):
+    return [
+        {
+            "products": {
+                "brand": {"name": f"Brand {i % 20}"},
+                "category": {"name": f"Category {i % 8}"},
+                "front_imges": f"/media/products/images/front_{i}.png",
+                "title": f"Product {i}",
+                "discount_price": 999.0,
+                "slug": f"{i:08x}",
+            },
+            "customer": {"name": "Test Customer", "email": "customer@example.com"},
+            "order_id": f"ORD-20250101-120000-{i:04d}",
+            "final_price": 1998.0,
+            "quantity": 2,
+            "cancelled_at": None,
+            "cancellation_reason": None,
+            "shipped_at": None,
+            "address": 1,
+        }
+        for i in range(rows)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compare JSON renderer throughput on large product and order payloads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help="Rows per payload")
+        parser.add_argument('--repeat', type=int, default=20, help="Renders per measurement")
+
+    def renderer(self, dumps):
+        renderer = UserRenderer()
+        renderer.dumps = dumps
+        context = {'response': Response(status=200)}
+        return lambda data: renderer.render(data, renderer_context=context)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        repeat = options['repeat']
+
+        candidates = [("legacy str-scan + json.dumps", legacy_render)]
+        candidates.append(("UserRenderer (stdlib)", self.renderer(renderers.stdlib_dumps)))
+        if renderers.orjson_dumps is not None:
+            candidates.append(("UserRenderer (orjson)", self.renderer(renderers.orjson_dumps)))
+        else:
+            self.stdout.write("orjson is not installed, skipping the orjson encoder")
+
+        for label, payload in (("products", product_payload(rows)), ("orders", order_payload(rows))):
+            self.stdout.write(f"\n{label}: {rows} rows x {repeat} renders")
+            baseline = None
+            for name, render in candidates:
+                render(payload)  # warm up
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    body = render(payload)
+                elapsed = time.perf_counter() - start
+                per_second = repeat / elapsed
+                baseline = baseline or per_second
+                self.stdout.write(
+                    f"  {name:<32} {per_second:8.1f} renders/s  "
+                    f"{len(body):>10} bytes  x{per_second / baseline:.2f}"
+                )
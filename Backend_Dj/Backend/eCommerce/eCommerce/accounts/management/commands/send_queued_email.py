@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from accounts.outbox import queue_metrics, send_queued
+
+
+class Command(BaseCommand):
+    help = "Send the due emails of the outbox in this process, e.g. from cron after a restart"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Emails per SMTP connection")
+
+    def handle(self, *args, **options):
+        sent, not_sent = send_queued(options['batch_size'])
+        metrics = queue_metrics()
+        self.stdout.write(
+            f"Sent {sent} email(s), {not_sent} failed; "
+            f"{metrics['queue_depth']} queued, {metrics['failed']} given up"
+        )
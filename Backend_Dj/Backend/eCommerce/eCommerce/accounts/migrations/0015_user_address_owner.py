@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user_address',
+            name='owner',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=models.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def copy_owners(apps, schema_editor):
+    """
+    Give every address the first user it was linked to. Addresses shared by
+    several users (get_or_create used to reuse identical rows) are copied
+    once per extra user, and that user's orders are moved to their copy.
+    """
+    Address = apps.get_model('accounts', 'user_address')
+    Order = apps.get_model('orders', 'Order')
+    Link = Address.user.through
+
+    users_by_address = {}
+    for address_id, user_id in Link.objects.order_by('id').values_list('user_address_id', 'user_id'):
+        users_by_address.setdefault(address_id, []).append(user_id)
+
+    for address in Address.objects.filter(pk__in=users_by_address).order_by('pk').iterator():
+        owner, *others = users_by_address[address.pk]
+        Address.objects.filter(pk=address.pk).update(owner_id=owner)
+        for user_id in others:
+            original = address.pk
+            address.pk = None
+            address.owner_id = user_id
+            address.save()
+            Order.objects.filter(address_id=original, customer_id=user_id).update(address_id=address.pk)
+            address.pk = original
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_user_address_owner'),
+        ('orders', '0019_order_history_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_owners, migrations.RunPython.noop),
+    ]
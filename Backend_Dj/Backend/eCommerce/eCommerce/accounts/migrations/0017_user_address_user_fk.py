@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_address_owner_from_m2m'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user_address',
+            name='user',
+        ),
+        migrations.RenameField(
+            model_name='user_address',
+            old_name='owner',
+            new_name='user',
+        ),
+        migrations.AlterField(
+            model_name='user_address',
+            name='user',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=models.CASCADE, related_name='addresses', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='user_address',
+            index=models.Index(fields=['user', 'id'], name='address_owner_idx'),
+        ),
+    ]
@@ -6,7 +6,12 @@ from django.conf import settings
 
 
 class user_address(models.Model):
-    user = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="addresses", null=True, blank=True)
+    # Null only for addresses nobody was linked to before addresses had an owner.
+    # The (user, id) index below covers lookups by user, so no separate one.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="addresses",
+        null=True, blank=True, db_index=False,
+    )
     village_or_town = models.TextField()
     city = models.CharField(max_length=200)
     state = models.CharField(max_length=200)
@@ -16,6 +21,10 @@ class user_address(models.Model):
         max_length=12,
         validators=[RegexValidator(regex=r'^\+?1?\d{9,15}$')]
     )
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'id'], name='address_owner_idx')]
+
     def __str__(self):
         return f"{self.id},{self.village_or_town}, {self.city}, {self.state}, {self.pincode}"
 
@@ -101,3 +110,34 @@ class User(AbstractBaseUser):
         # Simplest possible answer: All admins are staff
         return self.is_admin
 
+
+
+class OutgoingEmail(models.Model):
+    """
+    Outbox of emails to send. Rows are written in the same transaction as
+    the change that triggers them and sent by `accounts.outbox`.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENDING, 'Sending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.EmailField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    claim = models.CharField(max_length=32, blank=True, default='')  # batch that is sending it
+    next_attempt_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx')]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to} ({self.status})"
@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections, transaction
+from django.db.models import Avg, Count, F, Max, Min, Q
+from django.utils import timezone
+
+from accounts.models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+# A SENDING email untouched for this long belonged to a sender that died
+STALE_AFTER = timedelta(minutes=10)
+
+
+class OutboxStats:
+    """Per-process send counters and timings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.sent = 0
+            self.failed = 0
+            self.retried = 0
+            self.batches = 0
+            self.send_seconds = 0.0
+
+    def record_batch(self, sent, failed, retried, seconds):
+        with self._lock:
+            self.sent += sent
+            self.failed += failed
+            self.retried += retried
+            self.batches += 1
+            self.send_seconds += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "sent": self.sent,
+                "failed": self.failed,
+                "retried": self.retried,
+                "batches": self.batches,
+                "avg_send_ms": round(self.send_seconds / self.sent * 1000, 2) if self.sent else None,
+            }
+
+
+stats = OutboxStats()
+
+
+def queue_email(subject, body, to, from_email=None):
+    """
+    Write an email to the outbox. Inside a transaction it is only sent if
+    the transaction commits; the sender is kicked once it does.
+    """
+    email = OutgoingEmail.objects.create(
+        subject=subject, body=body, to=to, from_email=from_email or settings.EMAIL_HOST_USER,
+    )
+    transaction.on_commit(kick)
+    return email
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # One sender thread: one SMTP connection, batches never overlap
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outbox')
+        return _executor
+
+
+def kick():
+    if not settings.EMAIL_OUTBOX_ASYNC:
+        send_queued()
+        return
+    get_executor().submit(_run_in_worker)
+
+
+def _run_in_worker():
+    try:
+        send_queued()
+    except Exception:
+        logger.exception("Outbox sender crashed")
+    finally:
+        connections.close_all()
+
+
+def backoff(attempts):
+    """Delay before retry number `attempts`: doubles each time, capped."""
+    delay = settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return min(delay, settings.EMAIL_OUTBOX_RETRY_MAX_DELAY)
+
+
+def claim_batch(size, now=None):
+    """
+    Mark up to `size` due emails as SENDING under a fresh claim token and
+    return them. The claim is one conditional UPDATE, so concurrent senders
+    never get the same email.
+    """
+    now = now or timezone.now()
+    due = Q(status=OutgoingEmail.PENDING, next_attempt_at__lte=now) | Q(
+        status=OutgoingEmail.SENDING, updated_at__lt=now - STALE_AFTER
+    )
+    token = uuid.uuid4().hex
+    ids = list(OutgoingEmail.objects.filter(due).order_by('next_attempt_at', 'pk').values_list('pk', flat=True)[:size])
+    if not ids:
+        return []
+    OutgoingEmail.objects.filter(due, pk__in=ids).update(
+        status=OutgoingEmail.SENDING, claim=token, attempts=F('attempts') + 1, updated_at=now
+    )
+    return list(OutgoingEmail.objects.filter(claim=token, status=OutgoingEmail.SENDING).order_by('pk'))
+
+
+def send_batch(emails):
+    """
+    Send `emails` over a single connection of EMAIL_BACKEND and record the
+    outcome of each. Failed emails are retried with exponential backoff
+    until EMAIL_OUTBOX_MAX_ATTEMPTS. Returns `(sent, not_sent)`.
+    """
+    start = time.perf_counter()
+    sent, retry, failed = [], [], []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for email in emails:
+            try:
+                EmailMessage(
+                    email.subject, email.body, email.from_email, [email.to], connection=connection
+                ).send()
+                sent.append(email)
+            except Exception as e:
+                email.last_error = str(e)[:1000]
+                (failed if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS else retry).append(email)
+    except Exception as e:
+        # Could not connect: nothing in the batch went out
+        logger.error(f"Outbox could not open the mail connection: {e}")
+        for email in emails[len(sent) + len(retry) + len(failed):]:
+            email.last_error = str(e)[:1000]
+            (failed if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS else retry).append(email)
+    finally:
+        connection.close()
+    elapsed = time.perf_counter() - start
+
+    now = timezone.now()
+    for email in sent:
+        email.status, email.sent_at, email.last_error = OutgoingEmail.SENT, now, ''
+    for email in retry:
+        email.status, email.next_attempt_at = OutgoingEmail.PENDING, now + backoff(email.attempts)
+    for email in failed:
+        email.status = OutgoingEmail.FAILED
+        logger.error(f"Giving up on email {email.pk} to {email.to}: {email.last_error}")
+    for email in emails:
+        email.claim, email.updated_at = '', now
+    OutgoingEmail.objects.bulk_update(
+        emails, ['status', 'sent_at', 'last_error', 'next_attempt_at', 'claim', 'updated_at']
+    )
+    stats.record_batch(len(sent), len(failed), len(retry), elapsed)
+    return len(sent), len(failed) + len(retry)
+
+
+def send_queued(batch_size=None):
+    """Send due emails batch by batch until none are left. Returns `(sent, not_sent)`."""
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    total_sent = total_not_sent = 0
+    while True:
+        emails = claim_batch(batch_size)
+        if not emails:
+            return total_sent, total_not_sent
+        sent, not_sent = send_batch(emails)
+        total_sent += sent
+        total_not_sent += not_sent
+
+
+def queue_metrics():
+    """Queue depth and send latency, read from the outbox table."""
+    now = timezone.now()
+    pending = OutgoingEmail.objects.filter(status__in=[OutgoingEmail.PENDING, OutgoingEmail.SENDING])
+    depth = pending.aggregate(depth=Count('pk'), oldest=Min('created_at'))
+    recent = OutgoingEmail.objects.filter(status=OutgoingEmail.SENT, sent_at__gte=now - timedelta(hours=1))
+    latency = recent.aggregate(avg=Avg(F('sent_at') - F('created_at')), max=Max(F('sent_at') - F('created_at')))
+    return {
+        "queue_depth": depth['depth'],
+        "oldest_pending_seconds": (now - depth['oldest']).total_seconds() if depth['oldest'] else None,
+        "failed": OutgoingEmail.objects.filter(status=OutgoingEmail.FAILED).count(),
+        "latency_avg_seconds": latency['avg'].total_seconds() if latency['avg'] else None,
+        "latency_max_seconds": latency['max'].total_seconds() if latency['max'] else None,
+        **stats.snapshot(),
+    }
@@ -1,18 +1,87 @@
 from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.utils import encoders
 import json
 
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib encoder
+    orjson = None
+
+
+_drf_encoder = encoders.JSONEncoder()
+
+
+def stdlib_dumps(data):
+    """
+    Serialize `data` to UTF-8 bytes with the stdlib json module.
+    """
+    return json.dumps(
+        data,
+        cls=encoders.JSONEncoder,
+        ensure_ascii=False,
+        separators=(',', ':'),
+    ).encode('utf-8')
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def orjson_dumps(data):
+        """
+        Serialize `data` to UTF-8 bytes with orjson.
+
+        Types orjson does not know about (Decimal, lazy strings, datetimes...)
+        go through DRF's encoder so the output matches the stdlib path.
+        """
+        return orjson.dumps(data, default=_drf_encoder.default, option=_ORJSON_OPTIONS)
+
+    default_dumps = orjson_dumps
+else:
+    orjson_dumps = None
+    default_dumps = stdlib_dumps
+
+
+def contains_error_detail(data):
+    """
+    Return True if `data` holds an ErrorDetail anywhere in its nested
+    dicts/lists, stopping at the first one found.
+    """
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, ErrorDetail):
+            return True
+        if isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return False
+
+
 class UserRenderer(JSONRenderer):
     """
     Renderer which serializes to JSON.
+
+    Validation errors (payloads holding `ErrorDetail` values) are wrapped in
+    `{"errors": ...}`. Successful responses are never inspected, so large
+    listings are encoded exactly once. Override `dumps` to swap the encoder.
     """
-    charset='utf-8'
-    def render(self,data,accepted_media_type=None, renderer_context=None):
+    charset = 'utf-8'
+    dumps = staticmethod(default_dumps)
+
+    def is_error_payload(self, data, renderer_context):
+        response = (renderer_context or {}).get('response')
+        if response is not None and response.status_code < 400:
+            return False
+        return contains_error_detail(data)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
         """
         Render `data` into JSON, returning a bytestring.
         """
-        if 'ErrorDetail' in str(data):
-            # This is used to convert python object into json string
-            return json.dumps({'errors':data})
-        return json.dumps(data)
-        
-        
+        if data is None:
+            return b''
+        if self.is_error_payload(data, renderer_context):
+            data = {'errors': data}
+        return self.dumps(data)
@@ -135,6 +135,7 @@ class AddressSerializer(serializers.ModelSerializer):
         model=user_address
         # exclude=['id']
         fields="__all__"
+        read_only_fields = ['user']
 
 
     def validate_email(self, value):
@@ -144,14 +145,5 @@ class AddressSerializer(serializers.ModelSerializer):
         return value
 
     def create(self, validated_data):
-        validated_data['user'] = self.context['request'].user
-        return super().create(validated_data)
-   
-    
-    def create(self, validated_data):
-        user = self.context['request'].user
- 
-        address,_=user_address.objects.get_or_create(**validated_data) 
-        user_instance=User.objects.get(email=user)
-        address.user.add(user_instance)
-        return address 
\ No newline at end of file
+        # One INSERT: the address belongs to the user saving it
+        return user_address.objects.create(user=self.context['request'].user, **validated_data)
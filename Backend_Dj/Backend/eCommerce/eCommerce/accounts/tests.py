@@ -1,3 +1,246 @@
-from django.test import TestCase
+import copy
+import json
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core import mail
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts import outbox, renderers
+from accounts.views import get_tokens_for_user
+from accounts.authentication import user_cache
+from accounts.hashers import HashingBusy, pool
+from accounts.models import OutgoingEmail, User
+from accounts.renderers import UserRenderer
+
+
+class UserRendererTests(SimpleTestCase):
+    def render(self, data, status_code=200, dumps=None):
+        renderer = UserRenderer()
+        if dumps is not None:
+            renderer.dumps = dumps
+        response = Response(data, status=status_code)
+        return renderer.render(data, renderer_context={'response': response})
+
+    def test_success_payload_is_not_wrapped(self):
+        body = self.render([{'title': 'Tee', 'price': 10.5}])
+        self.assertEqual(json.loads(body), [{'title': 'Tee', 'price': 10.5}])
+
+    def test_validation_errors_are_wrapped(self):
+        errors = {'email': [ErrorDetail('This field is required.', code='required')]}
+        body = self.render(errors, status_code=400)
+        self.assertEqual(json.loads(body), {'errors': {'email': ['This field is required.']}})
+
+    def test_plain_error_messages_are_not_wrapped(self):
+        body = self.render({'error': 'Product not found'}, status_code=404)
+        self.assertEqual(json.loads(body), {'error': 'Product not found'})
+
+    def test_without_response_context_falls_back_to_scan(self):
+        errors = {'non_field_errors': [ErrorDetail('Bad', code='invalid')]}
+        body = UserRenderer().render(errors)
+        self.assertEqual(json.loads(body), {'errors': {'non_field_errors': ['Bad']}})
+
+    def test_encoders_agree(self):
+        data = {'name': 'Café', 'items': [1, 2.5, None, True]}
+        expected = renderers.stdlib_dumps(data)
+        if renderers.orjson_dumps is not None:
+            self.assertEqual(renderers.orjson_dumps(data), expected)
+        self.assertEqual(self.render(data, dumps=renderers.stdlib_dumps), expected)
+
+
+@override_settings(EMAIL_OUTBOX_ASYNC=False, EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class OutboxTests(TestCase):
+    def setUp(self):
+        outbox.stats.reset()
+
+    def register(self):
+        payload = {
+            "email": "new@example.com", "name": "New", "password": "pass12345",
+            "password2": "pass12345", "terms_condition": True,
+        }
+        return self.client.post(reverse("register"), payload, content_type="application/json")
+
+    def test_registration_email_is_sent_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.assertEqual(self.register().status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.get().status, OutgoingEmail.PENDING)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["new@example.com"])
+        self.assertEqual(OutgoingEmail.objects.get().status, OutgoingEmail.SENT)
+
+    def test_rolled_back_transaction_sends_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                outbox.queue_email("Hi", "Body", "user@example.com")
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+        self.assertFalse(OutgoingEmail.objects.exists())
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_batch_shares_one_connection(self):
+        for i in range(5):
+            outbox.queue_email("Hi", "Body", f"user{i}@example.com")
+        with mock.patch("accounts.outbox.get_connection", wraps=outbox.get_connection) as get_connection:
+            self.assertEqual(outbox.send_queued(batch_size=10), (5, 0))
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(outbox.queue_metrics()["queue_depth"], 0)
+
+    def test_failures_back_off_then_give_up(self):
+        email = outbox.queue_email("Hi", "Body", "user@example.com")
+        with mock.patch("django.core.mail.EmailMessage.send", side_effect=OSError("refused")):
+            self.assertEqual(outbox.send_queued(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error), (OutgoingEmail.PENDING, 1, "refused"))
+            self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=20))
+            # Not due yet
+            self.assertEqual(outbox.send_queued(), (0, 0))
+
+            with override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2):
+                OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+                outbox.send_queued()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.FAILED, 2))
+        self.assertEqual(outbox.queue_metrics()["failed"], 1)
+
+    def test_metrics(self):
+        outbox.queue_email("Hi", "Body", "user@example.com")
+        self.assertEqual(outbox.queue_metrics()["queue_depth"], 1)
+        outbox.send_queued()
+        metrics = outbox.queue_metrics()
+        self.assertEqual((metrics["queue_depth"], metrics["sent"]), (0, 1))
+        self.assertIsNotNone(metrics["latency_avg_seconds"])
+
+
+class StatelessAuthTests(TestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        user_cache.reset()
+        self.user = User.objects.create_user(
+            email="buyer@example.com", name="Buyer", terms_condition=True, password="pass12345"
+        )
+
+    def authorize(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_login_token_carries_claims(self):
+        response = self.client.post(
+            reverse("login"), {"email": "buyer@example.com", "password": "pass12345"}, format="json"
+        )
+        self.authorize(response.data["token"]["access"])
+        # Just the order page: the user comes from the token
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("showorder"), {"status": "pending"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_views_needing_the_row_load_it(self):
+        self.authorize(get_tokens_for_user(self.user)["access"])
+        payload = {"password": "newpass123", "password2": "newpass123"}
+        with self.assertNumQueries(2):  # the user row, then its update
+            response = self.client.post(reverse("passwordchange"), payload, format="json")
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get()
+        self.assertTrue(user.check_password("newpass123"))
+        self.assertEqual((user.name, user.created_at), (self.user.name, self.user.created_at))
+
+    def test_token_without_claims_falls_back_to_the_cache(self):
+        self.authorize(str(RefreshToken.for_user(self.user).access_token))
+        with self.assertNumQueries(2):
+            self.client.get(reverse("showorder"), {"status": "pending"})
+        with self.assertNumQueries(1):
+            self.client.get(reverse("showorder"), {"status": "pending"})
+
+    def test_deactivation_is_seen_by_the_next_request(self):
+        self.authorize(get_tokens_for_user(self.user)["access"])
+        self.assertEqual(self.client.get(reverse("showorder"), {"status": "pending"}).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get(reverse("showorder"), {"status": "pending"}).status_code, 401)
+
+    def test_state_changing_requests_check_the_row(self):
+        self.authorize(get_tokens_for_user(self.user)["access"])
+        # Deactivated by another process: this one's cache and signals never saw it
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(reverse("showorder"), {"status": "pending"}).status_code, 200)
+        self.assertEqual(self.client.post(reverse("cart-bulk"), {"items": []}, format="json").status_code, 401)
+
+    def test_admin_tokens_check_the_row(self):
+        User.objects.filter(pk=self.user.pk).update(is_admin=True)
+        self.user.refresh_from_db()
+        self.authorize(get_tokens_for_user(self.user)["access"])
+        self.assertEqual(self.client.get(reverse("outbox_stats")).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_admin=False)
+        user_cache.reset()
+        self.assertEqual(self.client.get(reverse("outbox_stats")).status_code, 403)
+
+
+class PasswordHashingTests(TestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        pool.shutdown()
+        self.addCleanup(pool.shutdown)
+        self.user = User.objects.create_user(
+            email="buyer@example.com", name="Buyer", terms_condition=True, password="pass12345"
+        )
+
+    def login(self):
+        return self.client.post(
+            reverse("login"), {"email": "buyer@example.com", "password": "pass12345"}, format="json"
+        )
+
+    def test_new_passwords_use_the_preferred_hasher(self):
+        self.assertTrue(self.user.password.startswith(f"{settings.PASSWORD_HASHER}$"))
+
+    def test_login_rehashes_other_algorithms(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password("pass12345", hasher="pbkdf2_sha256"))
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith(f"{settings.PASSWORD_HASHER}$"))
+
+    @override_settings(PASSWORD_HASHERS=["accounts.hashers.PBKDF2PasswordHasher"])
+    def test_login_rehashes_when_parameters_change(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password("pass12345"))
+        params = copy.deepcopy(settings.PASSWORD_HASHER_PARAMS)
+        params["pbkdf2"]["iterations"] += 1000
+        with override_settings(PASSWORD_HASHER_PARAMS=params):
+            self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password.split("$")[1], str(params["pbkdf2"]["iterations"]))
+
+    @override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=0)
+    def test_full_pool_turns_logins_away(self):
+        pool.shutdown()  # restart with the settings above
+        started, release = threading.Event(), threading.Event()
+
+        def busy():
+            started.set()
+            release.wait(5)
+
+        blocker = threading.Thread(target=pool.run, args=(busy,))
+        blocker.start()
+        try:
+            started.wait(5)
+            with self.assertRaises(HashingBusy):
+                pool.run(len, "x")
+            self.assertEqual(self.login().status_code, 503)
+        finally:
+            release.set()
+            blocker.join()
+        self.assertEqual(self.login().status_code, 200)
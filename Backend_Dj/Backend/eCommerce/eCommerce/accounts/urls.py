@@ -10,5 +10,6 @@ urlpatterns = [
     path('passwordchange/', UserChangePassword.as_view(), name='passwordchange'),
     path('sendpasswordemail/', UserSendPasswordEmail.as_view(), name='sendpasswordemail'),
     path('resetpassword/<uid>/<token>/', UserRestPassword.as_view(), name='resetpassword'),
-    path('addaddress/', UserAddressCreate.as_view(), name='addaddress')  # ✅ Fixed name typo (was "resetpassword")
+    path('addaddress/', UserAddressCreate.as_view(), name='addaddress'),  # ✅ Fixed name typo (was "resetpassword")
+    path('outbox-stats/', OutboxStats.as_view(), name='outbox_stats'),
 ]
@@ -1,17 +1,12 @@
-from django.core.mail import send_mail,EmailMessage
-from django.core.mail import EmailMultiAlternatives
-from decouple import config
+from accounts.outbox import queue_email
 
 class Util:
     @staticmethod
     def send_email(data):
-        Email=send_mail(
+        # Queued in the outbox and sent in the background once the
+        # surrounding transaction commits
+        return queue_email(
             subject=data['email_subject'],
-            message=data['message'],
-            from_email=config('EMAIL_HOST_USER',default='localhost'),
-            recipient_list=[data['recipient_list']],
-            fail_silently=True,
+            body=data['message'],
+            to=data['recipient_list'],
         )
-        
-
-        
\ No newline at end of file
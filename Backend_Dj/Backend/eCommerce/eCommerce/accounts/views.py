@@ -3,18 +3,21 @@ from rest_framework import status
 from rest_framework.views import APIView
 from accounts.serializers import *
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 # from api.renderers import UserRenderer
 from django.utils.http import urlsafe_base64_decode,urlsafe_base64_encode
 from django.urls import reverse
 from django.conf import settings
+from django.db import transaction
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from utility.queryset import with_related
+from accounts import outbox
+from accounts.authentication import UserRefreshToken, full_user
 
 
 # Generate Token Manually
 def get_tokens_for_user(user):
-    refresh = RefreshToken.for_user(user)
+    refresh = UserRefreshToken.for_user(user)
 
     return {
         'refresh': str(refresh),
@@ -26,19 +29,21 @@ class UserRagistrationView(APIView):
         serializer=UserRagistrationSerializers(data=request.data)
         
         if serializer.is_valid():
-            user=serializer.save()
-            user.is_active = False 
-            user.save()
-            # token=get_tokens_for_user(user)
-            uid=urlsafe_base64_encode(force_bytes(user.id))
-            token = PasswordResetTokenGenerator().make_token(user)
-         
-            # Reverse the correct URL
-            activate_link = reverse('activate', kwargs={'uid': uid, 'token': token})
-            activate_url = f'{settings.SITE_DOMAIN}{activate_link}'
-            # link=f'http://127.0.0.1:8000/api/account/activate/{uid}/{token}'
-            print(activate_url)
-            Util.send_email(data={'email_subject':'register','message':activate_url,'recipient_list':user.email})
+            # The activation email is only sent if the user is committed
+            with transaction.atomic():
+                user=serializer.save()
+                user.is_active = False 
+                user.save()
+                # token=get_tokens_for_user(user)
+                uid=urlsafe_base64_encode(force_bytes(user.id))
+                token = PasswordResetTokenGenerator().make_token(user)
+             
+                # Reverse the correct URL
+                activate_link = reverse('activate', kwargs={'uid': uid, 'token': token})
+                activate_url = f'{settings.SITE_DOMAIN}{activate_link}'
+                # link=f'http://127.0.0.1:8000/api/account/activate/{uid}/{token}'
+                print(activate_url)
+                Util.send_email(data={'email_subject':'register','message':activate_url,'recipient_list':user.email})
             return Response({'token':token,'msg':'RagisterSuccessFull Check your email to activate your account.'},status=status.HTTP_201_CREATED)
         return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
 
@@ -89,14 +94,14 @@ class AdminDashboardView(APIView):
 class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self,request,format=None):
-        serializer=UserProfileSerializers(request.user) # request.user means current user
+        serializer=UserProfileSerializers(full_user(request.user)) # request.user means current user
         return Response(serializer.data,status=status.HTTP_200_OK)
 
 class UserChangePassword(APIView):
     permission_classes = [IsAuthenticated]
     def post(self,request,format=None):
         serializer=UserChangePasswordSerializers(data=request.data,context={
-            'user':request.user,
+            'user':full_user(request.user),
         })
         if serializer.is_valid():
             return Response({'msg':'Password Change Successfull!'},status=status.HTTP_200_OK)
@@ -133,8 +138,15 @@ class UserAddressCreate(APIView):
         return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
     
     def get(self,request):
-        addresses = user_address.objects.filter(user=request.user)
+        addresses = with_related(user_address.objects.filter(user=request.user), AddressSerializer)
       
         serializer = AddressSerializer(addresses,many=True)
         return Response(serializer.data,status=status.HTTP_200_OK)
 
+
+class OutboxStats(APIView):
+    """Depth of the email outbox and send latency."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(outbox.queue_metrics())
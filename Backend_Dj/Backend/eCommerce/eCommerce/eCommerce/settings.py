@@ -10,9 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import copy
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
+import django
+from importlib.util import find_spec
 import os
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -51,6 +55,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'utility.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.common.CommonMiddleware',
@@ -62,6 +67,10 @@ MIDDLEWARE = [
    
 ]
 
+# utility.middleware.CompressionMiddleware: gzip / brotli for larger API responses
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)  # bytes
+COMPRESSION_CONTENT_TYPES = {'application/json', 'text/html', 'text/plain'}
+
 ROOT_URLCONF = 'eCommerce.urls'
 
 TEMPLATES = [
@@ -86,12 +95,92 @@ WSGI_APPLICATION = 'eCommerce.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
+# SQLite by default. DB_ENGINE=postgres selects PostgreSQL, which needs
+# psycopg (pip install "psycopg[binary,pool]").
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='ecommerce'),
+            'USER': config('DB_USER', default='ecommerce'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default=5432, cast=int),
+            # Persistent connections, checked before each request reuses one
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if config('DB_POOL', default=False, cast=bool):
+        if django.VERSION < (5, 1):
+            raise ImproperlyConfigured("DB_POOL needs Django 5.1 or later")
+        # A psycopg_pool pool per process replaces persistent connections
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        }
+    if config('DB_REPLICA_HOST', default=''):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': config('DB_REPLICA_HOST'),
+            'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT'], cast=int),
+            'OPTIONS': copy.deepcopy(DATABASES['default']['OPTIONS']),
+            # Tests run against the primary only
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+# Catalog reads go to the replica when there is one (see utility.routers)
+READ_REPLICA = 'replica' if 'replica' in DATABASES else None
+READ_REPLICA_APPS = {'products'}
+# Catalog cache misses read from the primary for this long after a change,
+# so rows a lagging replica still has aren't cached under the new generation
+READ_REPLICA_MAX_LAG = config('DB_REPLICA_MAX_LAG', default=10, cast=int)  # seconds
+DATABASE_ROUTERS = ['utility.routers.ReplicaRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='ecommerce'),
     }
 }
+# Product listing / detail responses, invalidated on every catalog change
+PRODUCT_CACHE_ALIAS = 'default'
+PRODUCT_CACHE_TIMEOUT = config('PRODUCT_CACHE_TIMEOUT', default=300, cast=int)
+
+# How long stock stays held for a cart in checkout before it is released
+STOCK_RESERVATION_TTL = timedelta(minutes=config('STOCK_RESERVATION_MINUTES', default=15, cast=int))
+# Most units of one product a customer can hold at once
+STOCK_RESERVATION_MAX_QUANTITY = config('STOCK_RESERVATION_MAX_QUANTITY', default=10, cast=int)
+
+# Invoice PDFs are rendered by a background thread pool after the order commits
+INVOICE_ROOT = os.path.join(BASE_DIR, 'invoices')
+INVOICE_ASYNC = config('INVOICE_ASYNC', default=True, cast=bool)
+INVOICE_WORKERS = config('INVOICE_WORKERS', default=2, cast=int)
+INVOICE_RETRY_AFTER = 2  # seconds, sent with 202 while an invoice is pending
+# A failing render is retried after INVOICE_RETRY_BACKOFF seconds, doubling
+# each attempt, and given up after INVOICE_MAX_ATTEMPTS until the order changes
+INVOICE_MAX_ATTEMPTS = config('INVOICE_MAX_ATTEMPTS', default=5, cast=int)
+INVOICE_RETRY_BACKOFF = config('INVOICE_RETRY_BACKOFF', default=30, cast=int)  # seconds
+# Rendered invoices are a cache: least recently served ones go first
+INVOICE_CACHE_MAX_BYTES = config('INVOICE_CACHE_MAX_BYTES', default=256 * 1024 * 1024, cast=int)
+INVOICE_CACHE_MAX_FILES = config('INVOICE_CACHE_MAX_FILES', default=10000, cast=int)
+# Renders trim the cache at most this often; drain_invoice_jobs always trims
+INVOICE_CACHE_EVICT_INTERVAL = config('INVOICE_CACHE_EVICT_INTERVAL', default=60, cast=int)  # seconds
 
 
 # Password validation
@@ -114,6 +203,41 @@ AUTH_PASSWORD_VALIDATORS = [
 # specify the custom model as the default user model
 AUTH_USER_MODEL = "accounts.User"
 
+# Password hashing policy: argon2 (needs argon2-cffi), scrypt or pbkdf2.
+# "auto" picks argon2 when installed, else scrypt. The other hashers stay
+# listed so existing hashes still verify; they are re-hashed with the
+# preferred one, at the current parameters, on the user's next login.
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='auto')
+if PASSWORD_HASHER == 'auto':
+    PASSWORD_HASHER = 'argon2' if find_spec('argon2') else 'scrypt'
+PASSWORD_HASHER_CLASSES = {
+    'argon2': 'accounts.hashers.Argon2PasswordHasher',
+    'scrypt': 'accounts.hashers.ScryptPasswordHasher',
+    'pbkdf2': 'accounts.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for algorithm, path in PASSWORD_HASHER_CLASSES.items()
+    if algorithm != PASSWORD_HASHER and (algorithm != 'argon2' or find_spec('argon2'))
+]
+PASSWORD_HASHER_PARAMS = {
+    'argon2': {
+        'time_cost': config('ARGON2_TIME_COST', default=2, cast=int),
+        'memory_cost': config('ARGON2_MEMORY_COST', default=64 * 1024, cast=int),  # KiB
+        'parallelism': config('ARGON2_PARALLELISM', default=2, cast=int),
+    },
+    'scrypt': {
+        'work_factor': config('SCRYPT_WORK_FACTOR', default=2 ** 14, cast=int),
+        'block_size': config('SCRYPT_BLOCK_SIZE', default=8, cast=int),
+        'parallelism': config('SCRYPT_PARALLELISM', default=1, cast=int),
+    },
+    'pbkdf2': {
+        'iterations': config('PBKDF2_ITERATIONS', default=720000, cast=int),
+    },
+}
+# Hashes run on a bounded pool; past workers + queue, logins get a 503
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=2, cast=int)
+PASSWORD_HASH_QUEUE = config('PASSWORD_HASH_QUEUE', default=16, cast=int)
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -125,12 +249,28 @@ USE_I18N = True
 
 USE_TZ = True
 
+# Zone of the local time stamped into order_ids before they used TIME_ZONE
+# explicitly: TIME_ZONE on Unix hosts, the host's own zone on Windows. Only
+# the orders migrations that read those stamps use it.
+ORDER_ID_TIME_ZONE = config('ORDER_ID_TIME_ZONE', default=TIME_ZONE)
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
-SSTATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATIC_URL = '/static/'
+# collectstatic writes content-hashed names plus .gz / .br copies, served
+# with a far-future Cache-Control (utility.files.serve_static)
+STATIC_MANIFEST = config('STATIC_MANIFEST', default=not DEBUG, cast=bool)
+STATIC_CACHE_MAX_AGE = config('STATIC_CACHE_MAX_AGE', default=60 * 60, cast=int)  # seconds, unhashed names
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'utility.storage.CompressedManifestStaticFilesStorage' if STATIC_MANIFEST
+        else 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
 
 STATICFILES_DIRS = [
    os.path.join(BASE_DIR, 'public/static')
@@ -139,6 +279,30 @@ STATICFILES_DIRS = [
 MEDIA_ROOT = os.path.join(BASE_DIR, 'public/media')
 
 MEDIA_URL = '/media/'
+MEDIA_CACHE_MAX_AGE = config('MEDIA_CACHE_MAX_AGE', default=24 * 60 * 60, cast=int)  # seconds
+
+# How media, static and invoice files reach the client: 'python' streams
+# them from the worker, 'nginx' hands them to nginx with X-Accel-Redirect,
+# 'xsendfile' to Apache / lighttpd with X-Sendfile.
+SENDFILE_BACKEND = config('SENDFILE_BACKEND', default='python')
+if SENDFILE_BACKEND not in ('python', 'nginx', 'xsendfile'):
+    raise ImproperlyConfigured(f"SENDFILE_BACKEND must be python, nginx or xsendfile, not '{SENDFILE_BACKEND}'")
+# nginx `internal` locations aliasing each directory (see README)
+SENDFILE_NGINX_LOCATIONS = {
+    MEDIA_ROOT: '/_protected/media/',
+    STATIC_ROOT: '/_protected/static/',
+    INVOICE_ROOT: '/_protected/invoices/',
+}
+
+# Resized product images, rendered after upload or on first request (products.images)
+IMAGE_DERIVATIVE_ROOT = os.path.join(MEDIA_ROOT, 'derivatives')
+IMAGE_VARIANTS = {'thumb': 160, 'card': 480, 'full': 1200}  # name: max width in pixels
+IMAGE_FORMATS = ('webp', 'jpeg')  # srcset order: WebP first, JPEG as the fallback
+IMAGE_DERIVATIVES_ASYNC = config('IMAGE_DERIVATIVES_ASYNC', default=True, cast=bool)
+IMAGE_WORKERS = config('IMAGE_WORKERS', default=2, cast=int)
+# Variants missing when requested render in the request, at most this many at once
+IMAGE_REQUEST_RENDERS = config('IMAGE_REQUEST_RENDERS', default=2, cast=int)
+IMAGE_CACHE_MAX_AGE = config('IMAGE_CACHE_MAX_AGE', default=24 * 60 * 60, cast=int)  # seconds
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -150,17 +314,25 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS')
 EMAIL_PORT = config('EMAIL_PORT',default=25, cast=int)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER',default='localhost')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
+# Outbound email goes through the accounts.OutgoingEmail outbox
+EMAIL_OUTBOX_ASYNC = config('EMAIL_OUTBOX_ASYNC', default=True, cast=bool)
+EMAIL_OUTBOX_BATCH_SIZE = 50  # emails sent per SMTP connection
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = timedelta(seconds=30)  # doubled after every failed attempt
+EMAIL_OUTBOX_RETRY_MAX_DELAY = timedelta(hours=1)
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # JWT Configration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_RENDERER_CLASSES': (
         'accounts.renderers.UserRenderer',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'utility.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
     # 'DEFAULT_RENDERER_CLASSES': (
     #     'rest_framework.renderers.JSONRenderer',
     # )
@@ -172,6 +344,8 @@ REST_FRAMEWORK = {
 
 
 # JWT’s behavior
+# Full user rows loaded for a request are kept this long per process
+USER_CACHE_TTL = config('USER_CACHE_TTL', default=30, cast=int)  # seconds
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=140),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
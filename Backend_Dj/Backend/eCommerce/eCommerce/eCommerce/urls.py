@@ -1,9 +1,19 @@
+import re
+from urllib.parse import urlsplit
 
 from django.contrib import admin
-from django.urls import path,include
+from django.urls import path,include,re_path
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
+from utility.files import serve_media, serve_static
+
+
+def file_urlpatterns(prefix, view):
+    # Nothing to route when files live on another host (a CDN)
+    if not prefix or urlsplit(prefix).netloc:
+        return []
+    return [re_path(rf'^{re.escape(prefix.lstrip("/"))}(?P<path>.*)$', view)]
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -14,8 +24,9 @@ urlpatterns = [
 ]
 
 
+urlpatterns += file_urlpatterns(settings.MEDIA_URL, serve_media)
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    
-
-urlpatterns += staticfiles_urlpatterns()
\ No newline at end of file
+    # Straight from the app / STATICFILES_DIRS folders, no collectstatic needed
+    urlpatterns += staticfiles_urlpatterns()
+else:
+    urlpatterns += file_urlpatterns(settings.STATIC_URL, serve_static)
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from orders.models import Order, CartItem
+from orders.models import Order, OrderLine, CartItem, InvoiceJob, StockReservation
 
 admin.site.register(Order)
+admin.site.register(OrderLine)
 admin.site.register(CartItem)
+admin.site.register(StockReservation)
+admin.site.register(InvoiceJob)
@@ -0,0 +1,100 @@
+from collections import OrderedDict
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import BooleanField, ExpressionWrapper, F, FloatField, Q, Sum, Window
+from rest_framework import status
+
+from orders.checkout import CheckoutError, check_items
+from orders.models import CartItem
+from products.models import Products
+
+
+def parse_changes(items):
+    """
+    Turn `[{"slug": ..., "quantity": ...}]` into an ordered {slug: quantity}
+    mapping. Quantity 0 removes the product; the last entry for a slug wins.
+    """
+    changes = OrderedDict()
+    for item in check_items(items):
+        slug = item.get('slug')
+        try:
+            quantity = int(item.get('quantity', 1))
+        except (TypeError, ValueError):
+            raise CheckoutError(f"Invalid quantity for product '{slug}'")
+        if quantity < 0:
+            raise CheckoutError(f"Invalid quantity for product '{slug}'")
+        changes[slug] = quantity
+    return changes
+
+
+def update_cart(customer, items):
+    """
+    Set the quantity of many cart lines at once: one `slug__in` lookup, one
+    upsert on the (customer, product) pair and one delete, in a single
+    transaction. Raises CheckoutError for unknown slugs or short stock, in
+    which case nothing changes.
+    """
+    changes = parse_changes(items)
+    products = {
+        slug: (pk, stock)
+        for slug, pk, stock in Products.objects.using(DEFAULT_DB_ALIAS)
+        .filter(slug__in=changes).values_list('slug', 'pk', 'stock')
+    }
+    missing = [slug for slug in changes if slug not in products]
+    if missing:
+        raise CheckoutError(
+            "Product(s) not found: " + ", ".join(f"'{slug}'" for slug in missing), status.HTTP_404_NOT_FOUND
+        )
+    short = [slug for slug, quantity in changes.items() if quantity > products[slug][1]]
+    if short:
+        raise CheckoutError("Not enough stock for product(s) " + ", ".join(f"'{slug}'" for slug in short))
+
+    upserts = [
+        CartItem(customer=customer, product_id=products[slug][0], quantity=quantity)
+        for slug, quantity in changes.items() if quantity
+    ]
+    removals = [products[slug][0] for slug, quantity in changes.items() if not quantity]
+    with transaction.atomic():
+        if upserts:
+            CartItem.objects.bulk_create(
+                upserts,
+                update_conflicts=True,
+                unique_fields=['customer', 'product'],
+                update_fields=['quantity', 'updated_at'],
+            )
+        if removals:
+            CartItem.objects.filter(customer=customer, product_id__in=removals).delete()
+
+
+def summarize_cart(customer):
+    """
+    Price the cart of `customer` in the database: one query returns every
+    line with its total and stock flag, and the cart totals ride along on
+    each row as window aggregates. Returns the summary as a dict.
+    """
+    line_total = ExpressionWrapper(F('product__discount_price') * F('quantity'), output_field=FloatField())
+    lines = list(
+        CartItem.objects.filter(customer=customer)
+        .annotate(
+            line_total=line_total,
+            in_stock=ExpressionWrapper(Q(product__stock__gte=F('quantity')), output_field=BooleanField()),
+            subtotal=Window(Sum(line_total)),
+            item_count=Window(Sum('quantity')),
+        )
+        .order_by('created_at', 'pk')
+        .values(
+            'id', 'quantity', 'line_total', 'in_stock', 'subtotal', 'item_count',
+            slug=F('product__slug'), title=F('product__title'),
+            unit_price=F('product__discount_price'), stock=F('product__stock'),
+        )
+    )
+    subtotal, item_count = (lines[0]['subtotal'], lines[0]['item_count']) if lines else (0, 0)
+    for line in lines:
+        del line['subtotal'], line['item_count']
+    return {
+        'lines': lines,
+        'subtotal': round(subtotal, 2),
+        'item_count': item_count,
+        'line_count': len(lines),
+        'all_in_stock': all(line['in_stock'] for line in lines),
+    }
@@ -0,0 +1,153 @@
+from collections import Counter, OrderedDict
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from rest_framework import status
+
+from orders import stock
+from orders.models import Order, OrderLine, StockReservation
+from orders.serializers import ProductMinimalSerializer
+from products.models import Products
+from utility.queryset import with_related
+
+
+class CheckoutError(Exception):
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def check_items(items):
+    """
+    Make sure posted `items` is a `[{"slug": ..., "quantity": ...}]` list,
+    so malformed bodies are a 400 rather than a crash. Raises CheckoutError.
+    """
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise CheckoutError('Expected a list of {"slug": ..., "quantity": ...} objects')
+    if not all(isinstance(item.get('slug'), str) for item in items):
+        raise CheckoutError("Every item needs a product slug")
+    return items
+
+
+def parse_cart(items):
+    """
+    Turn the posted `[{"slug": ..., "quantity": ...}]` list into an ordered
+    {slug: quantity} mapping, summing repeated slugs.
+    """
+    cart = OrderedDict()
+    for item in check_items(items):
+        slug = item.get('slug')
+        try:
+            quantity = int(item.get('quantity', 1))
+        except (TypeError, ValueError):
+            raise CheckoutError(f"Invalid quantity for product '{slug}'")
+        if quantity < 1:
+            raise CheckoutError(f"Invalid quantity for product '{slug}'")
+        cart[slug] = cart.get(slug, 0) + quantity
+    return cart
+
+
+def resolve_products(cart):
+    """
+    Fetch the products of a parsed cart with one `slug__in` query, keyed by
+    slug. Raises CheckoutError (404) for unknown slugs.
+    """
+    # Prices and stock come from the primary, never a lagging replica
+    products = with_related(
+        Products.objects.using(DEFAULT_DB_ALIAS).filter(slug__in=cart), ProductMinimalSerializer
+    )
+    by_slug = {product.slug: product for product in products}
+    for slug in cart:
+        if slug not in by_slug:
+            raise CheckoutError(f"Product '{slug}' not found", status.HTTP_404_NOT_FOUND)
+    return by_slug
+
+
+def place_order(customer, address, items):
+    """
+    Create the Order of a cart, with one OrderLine per product, and take the
+    stock, all or nothing.
+
+    Stock the customer already holds through reservations is converted
+    instead of taken twice. Costs a fixed number of queries whatever the
+    cart size: one product lookup, one stock update, a few bulk inserts.
+    """
+    cart = parse_cart(items)
+    if not cart:
+        raise CheckoutError("No products to order")
+    by_slug = resolve_products(cart)
+
+    with transaction.atomic():
+        held = list(stock.held_by(customer, [product.pk for product in by_slug.values()]))
+        held_quantity = Counter()
+        for reservation in held:
+            held_quantity[reservation.product_id] += reservation.quantity
+        if held:
+            # The held stock is folded into the order's own reservation below
+            converted = StockReservation.objects.filter(
+                pk__in=[reservation.pk for reservation in held], status=StockReservation.HELD
+            ).update(status=StockReservation.RELEASED)
+            if converted != len(held):
+                raise CheckoutError("Your reservation expired, please try again", status.HTTP_409_CONFLICT)
+
+        needed = {product.pk: cart[slug] - held_quantity[product.pk] for slug, product in by_slug.items()}
+        if not stock.take(needed):
+            short = stock.short_slugs({pk: quantity for pk, quantity in needed.items() if quantity > 0})
+            raise CheckoutError("Not enough stock for product(s) " + ", ".join(f"'{slug}'" for slug in short))
+
+        lines = [
+            OrderLine(
+                product=by_slug[slug],
+                quantity=quantity,
+                unit_price=by_slug[slug].discount_price,
+                final_price=by_slug[slug].discount_price * quantity,
+            )
+            for slug, quantity in cart.items()
+        ]
+        order = Order.objects.create(
+            customer=customer,
+            address=address,
+            final_price=sum(line.final_price for line in lines),
+        )
+        for line in lines:
+            line.order = order
+        OrderLine.objects.bulk_create(lines)
+        StockReservation.objects.bulk_create([
+            StockReservation(
+                customer=customer, product_id=line.product_id, order=order,
+                quantity=line.quantity, status=StockReservation.COMMITTED,
+            )
+            for line in lines
+        ])
+
+    for line in lines:
+        line.product.stock -= line.quantity - held_quantity[line.product_id]
+    return order
+
+
+def cancel_order(order, reason=None):
+    """
+    Cancel a pending order and give its stock back. Safe to call twice or
+    concurrently: only the call that flips `cancelled_at` releases stock.
+    Returns False if the order was already cancelled or shipped.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        won = Order.objects.filter(
+            pk=order.pk, cancelled_at__isnull=True, shipped_at__isnull=True
+        ).update(cancelled_at=now, cancellation_reason=reason)
+        if not won:
+            return False
+        reservations = list(order.reservations.all())
+        if reservations:
+            stock.release(reservations)
+        else:
+            # Orders placed before stock reservations existed
+            quantities = Counter()
+            for line in order.lines.all():
+                quantities[line.product_id] += line.quantity
+            stock.give_back(quantities)
+    order.cancelled_at = now
+    order.cancellation_reason = reason
+    return True
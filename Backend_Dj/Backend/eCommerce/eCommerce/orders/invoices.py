@@ -0,0 +1,506 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Prefetch, Q
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+from orders.models import InvoiceJob, Order, OrderLine
+
+logger = logging.getLogger(__name__)
+
+# A RUNNING job untouched for this long belonged to a worker that died
+STALE_AFTER = timedelta(minutes=10)
+
+# Bump when the PDF layout changes so every cached invoice is re-rendered
+TEMPLATE_VERSION = 3
+
+
+def for_invoice(queryset):
+    """Load what an invoice is rendered from along with the orders of `queryset`."""
+    return queryset.select_related('customer', 'address').prefetch_related(
+        Prefetch('lines', queryset=OrderLine.objects.select_related('product').order_by('pk'))
+    )
+
+
+def invoice_state(order):
+    """Everything printed on the invoice of `order` that can change."""
+    address = order.address
+    return {
+        'template': TEMPLATE_VERSION,
+        'order': [order.pk, order.order_id, order.status, order.created_at],
+        'total': order.final_price,
+        'lines': [
+            [line.product.title, line.quantity, line.unit_price, line.final_price] for line in order.lines.all()
+        ],
+        'customer': [order.customer.name, order.customer.email],
+        'address': [
+            address.village_or_town, address.city, address.state, address.pincode, address.country,
+        ] if address else None,
+    }
+
+
+def invoice_fingerprint(order):
+    state = json.dumps(invoice_state(order), sort_keys=True, default=str)
+    return hashlib.sha256(state.encode()).hexdigest()
+
+
+def invoice_path(fingerprint):
+    """
+    Invoices are stored by the hash of what they show, so a cancelled order
+    or an edited address points at a new file instead of a stale one.
+    """
+    return os.path.join(settings.INVOICE_ROOT, f'{fingerprint}.pdf')
+
+
+class InvoiceStyles:
+    """The stylesheet and table styles of the invoice template."""
+
+    def __init__(self):
+        self.sheet = getSampleStyleSheet()
+        self.normal = self.sheet['Normal']
+        self.title = ParagraphStyle(
+            'CustomTitle',
+            parent=self.sheet['Heading1'],
+            fontSize=24,
+            spaceAfter=30,
+            textColor=colors.darkblue,
+            alignment=1  # Center alignment
+        )
+        self.header = ParagraphStyle(
+            'CustomHeader',
+            parent=self.sheet['Heading2'],
+            fontSize=14,
+            spaceAfter=12,
+            textColor=colors.black
+        )
+        self.details_table = TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
+        self.order_table = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
+        self.total_table = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), colors.lightblue),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 12),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
+
+
+@functools.lru_cache(maxsize=None)
+def invoice_styles():
+    """
+    Build the invoice styles once per process. They are only read while
+    rendering, so every invoice (and every worker thread) shares them.
+    """
+    return InvoiceStyles()
+
+
+def create_invoice_pdf(order, file_path):
+    """
+    Create a professional invoice PDF using ReportLab
+    """
+    try:
+        doc = SimpleDocTemplate(file_path, pagesize=A4)
+        story = []
+        styles = invoice_styles()
+        
+        # Invoice Title
+        story.append(Paragraph("INVOICE", styles.title))
+        story.append(Spacer(1, 12))
+        
+        # Company Information (customize as needed)
+        company_info = """
+        <b>Your Company Name</b><br/>
+        123 Business Street<br/>
+        City, State 12345<br/>
+        Phone: (555) 123-4567<br/>
+        Email: contact@yourcompany.com
+        """
+        story.append(Paragraph(company_info, styles.normal))
+        story.append(Spacer(1, 20))
+        
+        # Invoice Details
+        invoice_data = [
+            ['Invoice Number:', f'INV-{order.id:06d}'],
+            ['Order Date:', timezone.localtime(order.created_at).strftime('%B %d, %Y')],
+            ['Order ID:', order.order_id or str(order.id)],
+            ['Status:', order.status],
+        ]
+        
+        invoice_table = Table(invoice_data, colWidths=[2*inch, 3*inch])
+        invoice_table.setStyle(styles.details_table)
+        
+        story.append(invoice_table)
+        story.append(Spacer(1, 20))
+        
+        # Customer Information
+        story.append(Paragraph("Bill To:", styles.header))
+        address = order.address
+        customer_info = f"""
+        <b>{order.customer.name}</b><br/>
+        {order.customer.email}<br/>
+        {address.village_or_town if address else ''}<br/>
+        {f'{address.city}, {address.state} {address.pincode}' if address else ''}<br/>
+        {address.country if address else ''}
+        """
+        story.append(Paragraph(customer_info, styles.normal))
+        story.append(Spacer(1, 20))
+        
+        # Order Items
+        story.append(Paragraph("Order Details:", styles.header))
+        
+        # Create table data
+        table_data = [['Product', 'Quantity', 'Unit Price', 'Total Price']]
+        
+        # One row per line
+        for line in order.lines.all():
+            table_data.append([
+                line.product.title,
+                str(line.quantity),
+                f'${line.unit_price:.2f}',
+                f'${line.final_price:.2f}'
+            ])
+        
+        # Create table
+        order_table = Table(table_data, colWidths=[3*inch, 1*inch, 1.2*inch, 1.2*inch])
+        order_table.setStyle(styles.order_table)
+        
+        story.append(order_table)
+        story.append(Spacer(1, 20))
+        
+        # Total
+        total_data = [['Total Amount:', f'${order.final_price:.2f}']]
+        total_table = Table(total_data, colWidths=[4.5*inch, 1.9*inch])
+        total_table.setStyle(styles.total_table)
+        
+        story.append(total_table)
+        story.append(Spacer(1, 30))
+        
+        # Footer
+        footer_text = """
+        <b>Thank you for your business!</b><br/>
+        For any questions regarding this invoice, please contact us at support@yourcompany.com
+        """
+        story.append(Paragraph(footer_text, styles.normal))
+        
+        # Build PDF
+        doc.build(story)
+        logger.info(f"Invoice generated successfully for order {order.id}")
+        
+    except Exception as e:
+        logger.error(f"Error generating invoice for order {order.id}: {str(e)}")
+        raise
+
+
+def write_invoice(order, path):
+    """
+    Build the PDF next to `path` and move it into place, so readers never
+    see a half-written file.
+    """
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        create_invoice_pdf(order, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def render_invoice(order, fingerprint=None):
+    """Render the invoice of `order` to its final path."""
+    os.makedirs(settings.INVOICE_ROOT, exist_ok=True)
+    return write_invoice(order, invoice_path(fingerprint or invoice_fingerprint(order)))
+
+
+def touch(path):
+    """Mark a cached invoice as recently used, see `evict`."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def discard(fingerprint):
+    try:
+        os.remove(invoice_path(fingerprint))
+    except FileNotFoundError:
+        pass
+
+
+def evict(max_bytes=None, max_files=None):
+    """
+    Delete the least recently used invoices until the cache fits in
+    INVOICE_CACHE_MAX_BYTES and INVOICE_CACHE_MAX_FILES. Serving an invoice
+    touches its mtime, so mtime order is LRU order. Evicted invoices are
+    rendered again the next time they're asked for. Returns the number of
+    files deleted.
+    """
+    max_bytes = settings.INVOICE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    max_files = settings.INVOICE_CACHE_MAX_FILES if max_files is None else max_files
+    try:
+        entries = [entry for entry in os.scandir(settings.INVOICE_ROOT) if entry.name.endswith('.pdf')]
+    except FileNotFoundError:
+        return 0
+
+    files = []
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue  # evicted by another worker
+        files.append((stat.st_mtime, stat.st_size, entry.path))
+    files.sort()
+
+    total = sum(size for _, size, _ in files)
+    count = len(files)
+    evicted = 0
+    for _, size, path in files:
+        if total <= max_bytes and count <= max_files:
+            break
+        try:
+            os.remove(path)
+            evicted += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+        count -= 1
+    return evicted
+
+
+_last_evict = None
+_evict_lock = threading.Lock()
+
+
+def maybe_evict():
+    """
+    `evict()` at most once every INVOICE_CACHE_EVICT_INTERVAL seconds in
+    this process, since each pass stats every cached file. In between, the
+    cache can overshoot its limits by what was rendered meanwhile. Returns
+    the number of files deleted.
+    """
+    global _last_evict
+    if not _evict_lock.acquire(blocking=False):
+        return 0  # another worker is evicting right now
+    try:
+        now = time.monotonic()
+        if _last_evict is not None and now - _last_evict < settings.INVOICE_CACHE_EVICT_INTERVAL:
+            return 0
+        _last_evict = now
+        return evict()
+    finally:
+        _evict_lock.release()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.INVOICE_WORKERS, thread_name_prefix='invoice'
+            )
+        return _executor
+
+
+def enqueue(orders, fresh=True):
+    """
+    Record a pending InvoiceJob for each order and hand them to the worker
+    pool once the current transaction commits. The job table is the durable
+    queue: jobs lost with a restarted process are picked up again by
+    `manage.py drain_invoice_jobs`.
+
+    Re-enqueueing an existing job asks for a fresh render. `fresh` (the
+    order changed, or its PDF was evicted) also forgets earlier failed
+    attempts; retries of a failed render pass False so they stay counted.
+    """
+    order_ids = [order.id for order in orders]
+    InvoiceJob.objects.bulk_create(
+        [InvoiceJob(order_id=order_id) for order_id in order_ids], ignore_conflicts=True
+    )
+    reset = {'status': InvoiceJob.PENDING, **({'attempts': 0} if fresh else {})}
+    InvoiceJob.objects.filter(
+        order_id__in=order_ids, status__in=[InvoiceJob.FAILED, InvoiceJob.DONE]
+    ).update(**reset)
+    transaction.on_commit(lambda: submit(order_ids))
+
+
+def exhausted(job):
+    """Whether a failed `job` has used up its INVOICE_MAX_ATTEMPTS."""
+    return job.attempts >= settings.INVOICE_MAX_ATTEMPTS
+
+
+def retry_after(job):
+    """
+    Seconds until a failed `job` may be tried again: INVOICE_RETRY_BACKOFF,
+    doubled for every attempt after the first, counted from its last one.
+    """
+    wait = timedelta(seconds=settings.INVOICE_RETRY_BACKOFF * 2 ** max(job.attempts - 1, 0))
+    return max(0.0, (job.updated_at + wait - timezone.now()).total_seconds())
+
+
+def submit(order_ids):
+    if not settings.INVOICE_ASYNC:
+        for order_id in order_ids:
+            process_job(order_id)
+        return
+    executor = get_executor()
+    for order_id in order_ids:
+        executor.submit(_run_in_worker, order_id)
+
+
+def _run_in_worker(order_id):
+    try:
+        process_job(order_id)
+    except Exception:
+        logger.exception(f"Invoice worker crashed on order {order_id}")
+    finally:
+        # Worker threads keep their own connections; don't leak them
+        connections.close_all()
+
+
+def claimable(force=False):
+    """
+    Jobs a worker may take: pending ones, and failed or abandoned ones with
+    attempts left. `force` adds every finished or failed job.
+    """
+    jobs = Q(status=InvoiceJob.PENDING) | Q(
+        Q(status=InvoiceJob.FAILED) | Q(status=InvoiceJob.RUNNING, updated_at__lt=timezone.now() - STALE_AFTER),
+        attempts__lt=settings.INVOICE_MAX_ATTEMPTS,
+    )
+    if force:
+        jobs |= Q(status__in=[InvoiceJob.DONE, InvoiceJob.FAILED])
+    return jobs
+
+
+def process_job(order_id, force=False):
+    """
+    Claim the job of `order_id` and render its invoice. The claim is a
+    conditional update, so a job is rendered by one worker at a time, and
+    failed or abandoned jobs are only claimed until INVOICE_MAX_ATTEMPTS
+    (`force` claims any job). Returns True if this call rendered the invoice.
+    """
+    claimed = InvoiceJob.objects.filter(claimable(force), order_id=order_id).update(
+        status=InvoiceJob.RUNNING, attempts=F('attempts') + 1, updated_at=timezone.now()
+    )
+    if not claimed:
+        return False
+
+    try:
+        order = for_invoice(Order.objects.all()).get(pk=order_id)
+        fingerprint = invoice_fingerprint(order)
+        render_invoice(order, fingerprint)
+    except Exception as e:
+        logger.error(f"Failed to generate invoice for order {order_id}: {e}")
+        InvoiceJob.objects.filter(order_id=order_id).update(
+            status=InvoiceJob.FAILED, last_error=str(e)[:1000], updated_at=timezone.now()
+        )
+        return False
+
+    previous = InvoiceJob.objects.filter(order_id=order_id).values_list('fingerprint', flat=True).first()
+    InvoiceJob.objects.filter(order_id=order_id).update(
+        status=InvoiceJob.DONE, fingerprint=fingerprint, last_error='', updated_at=timezone.now()
+    )
+    if previous and previous != fingerprint:
+        # The order changed since its last render; nobody can ask for that PDF any more
+        discard(previous)
+    maybe_evict()
+    return True
+
+
+def _render_timed(order, fingerprint, path):
+    start = time.perf_counter()
+    try:
+        write_invoice(order, path)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return order.pk, fingerprint, time.perf_counter() - start, error
+
+
+def render_batch(orders, workers=1, chunksize=16):
+    """
+    Render the invoices of `orders` (loaded through `for_invoice`) and yield
+    `(order_id, fingerprint, seconds, error)` per document, in order. With
+    more than one worker the PDFs are built in a process pool, since ReportLab
+    is CPU bound; the workers never touch the database. Job rows are left to
+    `record_batch`.
+    """
+    os.makedirs(settings.INVOICE_ROOT, exist_ok=True)
+    batch = []
+    for order in orders:
+        fingerprint = invoice_fingerprint(order)
+        # Paths are resolved here: spawned workers don't see overridden settings
+        batch.append((order, fingerprint, invoice_path(fingerprint)))
+    if workers <= 1 or len(batch) <= 1:
+        for job in batch:
+            yield _render_timed(*job)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        yield from pool.map(
+            _render_timed, *zip(*batch), chunksize=max(1, min(chunksize, len(batch) // workers))
+        )
+
+
+def record_batch(results):
+    """
+    Mark the jobs of a `render_batch` run DONE or FAILED, creating the ones
+    missing, drop the PDFs the new renders replaced and trim the cache.
+    """
+    results = list(results)
+    order_ids = [order_id for order_id, _, _, _ in results]
+    InvoiceJob.objects.bulk_create(
+        [InvoiceJob(order_id=order_id) for order_id in order_ids], ignore_conflicts=True
+    )
+    jobs = InvoiceJob.objects.in_bulk(order_ids, field_name='order_id')
+    now = timezone.now()
+    replaced = []
+    for order_id, fingerprint, _, error in results:
+        job = jobs[order_id]
+        job.attempts += 1
+        job.updated_at = now
+        if error:
+            job.status, job.last_error = InvoiceJob.FAILED, error[:1000]
+            continue
+        if job.fingerprint and job.fingerprint != fingerprint:
+            replaced.append(job.fingerprint)
+        job.status, job.fingerprint, job.last_error = InvoiceJob.DONE, fingerprint, ''
+    InvoiceJob.objects.bulk_update(
+        jobs.values(), ['status', 'fingerprint', 'last_error', 'attempts', 'updated_at'], batch_size=500
+    )
+    for fingerprint in replaced:
+        discard(fingerprint)
+    maybe_evict()
@@ -0,0 +1,72 @@
+import statistics
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import User, user_address
+from orders.checkout import place_order
+from orders.models import Order, OrderLine
+from products.models import BrandName, Category, Products
+from utility.benchmark import measure, throwaway_database
+
+
+def legacy_place_order(customer, address, items):
+    # CreateOrder.post as it was before: one get + one order + full save per product.
+    orders = []
+    for item in items:
+        product = Products.objects.get(slug=item['slug'])
+        quantity = item.get('quantity', 1)
+        if product.stock < quantity:
+            raise ValueError(item['slug'])
+        order = Order.objects.create(
+            customer=customer,
+            address=address,
+            final_price=product.discount_price * quantity,
+        )
+        OrderLine.objects.create(
+            order=order, product=product, quantity=quantity,
+            unit_price=product.discount_price, final_price=order.final_price,
+        )
+        orders.append(order)
+        product.stock -= quantity
+        product.save()
+    return orders
+
+
+class Command(BaseCommand):
+    help = "Compare queries and latency of checkout against cart size (uses a throwaway database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,5,10,25,50', help="Comma separated cart sizes")
+        parser.add_argument('--repeat', type=int, default=10, help="Checkouts per measurement")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        with throwaway_database():
+            customer = User.objects.create_user(
+                email='bench@example.com', name='Bench', terms_condition=True, password='bench'
+            )
+            address = user_address.objects.create(
+                user=customer, village_or_town='Main Road', city='Pune', state='MH', pincode='411001', phone='9876543210'
+            )
+            brand = BrandName.objects.create(name='Bench')
+            category = Category.objects.create(name='Bench')
+            products = [
+                Products.objects.create(
+                    brand=brand, category=category, title=f'Bench {i}', decription='',
+                    actual_price=20.0, discount_price=15.0, stock=10 ** 9,
+                    front_imges='bench.png', back_imges='bench.png',
+                )
+                for i in range(max(sizes))
+            ]
+
+            self.stdout.write(f"{'cart':>5} {'impl':<8} {'queries':>8} {'median ms':>10}")
+            for size in sizes:
+                items = [{'slug': product.slug, 'quantity': 1} for product in products[:size]]
+                for name, func in (('legacy', legacy_place_order), ('batched', place_order)):
+                    timings = []
+                    for _ in range(options['repeat']):
+                        _, elapsed, queries = measure(func, customer, address, items)
+                        timings.append(elapsed)
+                    self.stdout.write(
+                        f"{size:>5} {name:<8} {queries:>8} {statistics.median(timings) * 1000:>10.2f}"
+                    )
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from accounts.models import User, user_address
+from orders.invoices import InvoiceStyles, for_invoice, render_batch
+from orders.models import Order, OrderLine
+from products.models import BrandName, Category, Products
+from utility.benchmark import throwaway_database
+
+
+class Command(BaseCommand):
+    help = "Measure invoice rendering throughput per worker count (uses a throwaway database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500, help="Invoices per measurement")
+        parser.add_argument('--workers', default=f'1,{os.cpu_count()}', help="Comma separated worker counts")
+
+    def handle(self, *args, **options):
+        worker_counts = [int(count) for count in options['workers'].split(',')]
+        root = tempfile.mkdtemp()
+        try:
+            with throwaway_database(), override_settings(INVOICE_ROOT=root):
+                self.run(options['orders'], worker_counts)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    def run(self, size, worker_counts):
+        customer = User.objects.create_user(
+            email='bench@example.com', name='Bench', terms_condition=True, password='bench'
+        )
+        address = user_address.objects.create(
+            user=customer, village_or_town='Main Road', city='Pune', state='MH', pincode='411001', phone='9876543210'
+        )
+        product = Products.objects.create(
+            brand=BrandName.objects.create(name='Bench'), category=Category.objects.create(name='Bench'),
+            title='Bench', decription='', actual_price=20.0, discount_price=15.0, stock=10 ** 9,
+            front_imges='bench.png', back_imges='bench.png',
+        )
+        orders = Order.objects.bulk_create([
+            Order(customer=customer, address=address, final_price=15.0, order_id=f'BENCH{i}')
+            for i in range(size)
+        ])
+        OrderLine.objects.bulk_create([
+            OrderLine(order=order, product=product, quantity=1, unit_price=15.0, final_price=15.0)
+            for order in orders
+        ])
+        orders = list(for_invoice(Order.objects.all()))
+
+        start = time.perf_counter()
+        for _ in range(100):
+            InvoiceStyles()
+        self.stdout.write(
+            f"building the styles: {(time.perf_counter() - start) * 10:.2f} ms "
+            f"(paid once per process, used to be paid per invoice)"
+        )
+
+        self.stdout.write(f"{'workers':>8} {'docs':>6} {'docs/sec':>9} {'ms/doc':>7}")
+        for workers in worker_counts:
+            start = time.perf_counter()
+            results = list(render_batch(orders, workers))
+            elapsed = time.perf_counter() - start
+            per_doc = sum(seconds for _, _, seconds, _ in results) / len(results)
+            self.stdout.write(f"{workers:>8} {len(results):>6} {len(results) / elapsed:>9.1f} {per_doc * 1000:>7.2f}")
@@ -0,0 +1,46 @@
+import statistics
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import User
+from orders.models import ORDER_SEQUENCE, Order, Sequence
+from utility.benchmark import measure, throwaway_database
+from utility.utility import generate_order_id
+
+
+def count_based_id():
+    # Order.save as it was before: a full COUNT(*) per insert.
+    return generate_order_id(Order.objects.count())
+
+
+def sequence_based_id():
+    with transaction.atomic():
+        return generate_order_id(Sequence.objects.allocate(ORDER_SEQUENCE)[0])
+
+
+class Command(BaseCommand):
+    help = "Compare order id allocation cost against orders-table size (uses a throwaway database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help="Comma separated table sizes")
+        parser.add_argument('--repeat', type=int, default=50, help="Allocations per measurement")
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        with throwaway_database():
+            customer = User.objects.create_user(
+                email='bench@example.com', name='Bench', terms_condition=True, password='bench'
+            )
+
+            self.stdout.write(f"{'orders':>8} {'impl':<9} {'median us':>10}")
+            for size in sizes:
+                missing = size - Order.objects.count()
+                Order.objects.bulk_create(
+                    (Order(customer=customer, final_price=1, order_id='bench')
+                     for _ in range(missing)),
+                    batch_size=5000,
+                )
+                for name, func in (('count', count_based_id), ('sequence', sequence_based_id)):
+                    timings = [measure(func)[1] for _ in range(options['repeat'])]
+                    self.stdout.write(f"{size:>8} {name:<9} {statistics.median(timings) * 1e6:>10.1f}")
@@ -0,0 +1,98 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import User, user_address
+from orders.models import CartItem, Order, OrderLine
+from products import cache
+from products.models import BrandName, Category, Products
+from utility.benchmark import throwaway_database
+from utility.compression import ENCODINGS
+
+# What a listing page / order history / cart widget actually shows
+ENDPOINTS = (
+    ('products', 'product_view', {'page_size': 50},
+     'title,slug,discount_price,actual_price,front_variants,brand_detail,category_detail'),
+    ('products all', 'product_view', {'all': 'true'},
+     'title,slug,discount_price,front_imges,brand_detail'),
+    ('orders', 'showorder', {'page_size': 20},
+     'order_id,created_at,final_price,status,lines.quantity,lines.final_price,lines.product.title,lines.product.slug'),
+    ('cart', 'cart', {},
+     'id,quantity,product.title,product.slug,product.discount_price,product.front_imges'),
+)
+
+
+class Command(BaseCommand):
+    help = "Report bytes on the wire for product, order and cart listings (uses a throwaway database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500, help="Catalog size")
+        parser.add_argument('--orders', type=int, default=40, help="Orders of the benchmark customer")
+        parser.add_argument('--lines', type=int, default=3, help="Lines per order")
+        parser.add_argument('--cart', type=int, default=25, help="Cart items")
+
+    def load(self, options):
+        rng = random.Random(0)
+        customer = User.objects.create_user(
+            email='bench@example.com', name='Bench Customer', terms_condition=True, password='bench'
+        )
+        address = user_address.objects.create(
+            user=customer, village_or_town='Main Road', city='Pune', state='MH', pincode='411001', phone='9876543210'
+        )
+        brands = [BrandName.objects.create(name=f"Brand {i}") for i in range(12)]
+        categories = [Category.objects.create(name=f"Category {i}") for i in range(6)]
+        products = Products.objects.bulk_create(
+            Products(
+                brand=rng.choice(brands), category=rng.choice(categories),
+                title=f"Relaxed fit cotton tee {i}",
+                decription="Soft combed cotton t-shirt with a relaxed fit and ribbed crew neck. " * 3,
+                actual_price=1499.0, discount_price=999.0, stock=100,
+                front_imges=f'products/images/tee_{i}_front.png', back_imges=f'products/images/tee_{i}_back.png',
+                slug=f'bench-{i}',
+            )
+            for i in range(options['products'])
+        )
+        for _ in range(options['orders']):
+            order = Order.objects.create(customer=customer, address=address, final_price=999.0 * options['lines'])
+            OrderLine.objects.bulk_create(
+                OrderLine(order=order, product=product, quantity=1, unit_price=999.0, final_price=999.0)
+                for product in rng.sample(products, options['lines'])
+            )
+        CartItem.objects.bulk_create(
+            CartItem(customer=customer, product=product, quantity=1)
+            for product in rng.sample(products, options['cart'])
+        )
+        return customer
+
+    def handle(self, *args, **options):
+        codings = [None] + list(ENCODINGS)
+        # (label, fields=, sideload=)
+        variants = (("full", False, False), ("sideload", False, True), ("fields", True, False), ("fields+sideload", True, True))
+        header = f"{'endpoint':<14} {'variant':<16}" + "".join(f"{coding or 'identity':>11}" for coding in codings)
+        with throwaway_database(), override_settings(ALLOWED_HOSTS=['testserver']):
+            client = APIClient()
+            client.force_authenticate(self.load(options))
+            self.stdout.write(header)
+            for label, url_name, params, fields in ENDPOINTS:
+                baseline = None
+                for variant, sparse, sideload in variants:
+                    query = dict(params)
+                    if sparse:
+                        query['fields'] = fields
+                    if sideload:
+                        query['sideload'] = 'true'
+                    sizes = []
+                    for coding in codings:
+                        cache.get_cache().clear()
+                        response = client.get(reverse(url_name), query, HTTP_ACCEPT_ENCODING=coding or 'identity')
+                        if response.status_code != 200:
+                            raise RuntimeError(f"{label} {variant}: {response.status_code} {response.content[:200]}")
+                        sizes.append(len(response.content))
+                    baseline = baseline or sizes[0]
+                    self.stdout.write(
+                        f"{label:<14} {variant:<16}" + "".join(f"{size:>11}" for size in sizes)
+                        + f"   x{baseline / sizes[-1]:.1f} smaller"
+                    )
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from orders.invoices import claimable, evict, process_job, retry_after
+from orders.models import InvoiceJob, Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Render pending, failed and stale invoice jobs in this process. Failed jobs wait out their "
+        "retry backoff and are skipped after INVOICE_MAX_ATTEMPTS, unless --rerender is given"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rerender', action='store_true',
+            help="Also re-render finished and given-up invoices and queue orders that never had a job",
+        )
+
+    def handle(self, *args, **options):
+        rerender = options['rerender']
+        if rerender:
+            InvoiceJob.objects.bulk_create(
+                [InvoiceJob(order_id=pk) for pk in Order.objects.filter(invoice_job__isnull=True).values_list('pk', flat=True)],
+                ignore_conflicts=True,
+            )
+
+        jobs = InvoiceJob.objects.filter(claimable(force=rerender)).order_by('pk').only('order_id', 'status', 'attempts', 'updated_at')
+        order_ids = [
+            job.order_id for job in jobs
+            if rerender or job.status != InvoiceJob.FAILED or not retry_after(job)
+        ]
+
+        rendered = sum(process_job(order_id, force=rerender) for order_id in order_ids)
+        failed = len(order_ids) - rendered
+        evicted = evict()
+        self.stdout.write(
+            f"Rendered {rendered} invoice(s), {failed} failed or taken by another worker, evicted {evicted}"
+        )
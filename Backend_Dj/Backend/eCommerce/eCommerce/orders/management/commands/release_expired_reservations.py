@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders.stock import release_expired
+
+
+class Command(BaseCommand):
+    help = "Give back the stock of checkout reservations that have expired (run from cron)"
+
+    def handle(self, *args, **options):
+        released = release_expired()
+        self.stdout.write(f"Released {released} expired reservation(s)")
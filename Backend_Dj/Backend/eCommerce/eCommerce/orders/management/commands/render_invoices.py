@@ -0,0 +1,51 @@
+import os
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.invoices import for_invoice, record_batch, render_batch
+from orders.models import Order
+from utility.utility import parse_day_or_datetime
+
+
+class Command(BaseCommand):
+    help = "Re-render invoices in a process pool, e.g. after a template change"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only orders placed on or after this date (YYYY-MM-DD or ISO datetime)")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Render processes")
+
+    def handle(self, *args, **options):
+        orders = for_invoice(Order.objects.order_by('pk'))
+        if options['since']:
+            try:
+                since, _ = parse_day_or_datetime(options['since'])
+            except ValueError:
+                raise CommandError(f"--since expects YYYY-MM-DD or an ISO datetime, got '{options['since']}'")
+            orders = orders.filter(created_at__gte=since)
+        orders = list(orders)
+        if not orders:
+            self.stdout.write("No orders to render")
+            return
+
+        results = []
+        start = time.perf_counter()
+        for order_id, fingerprint, seconds, error in render_batch(orders, options['workers']):
+            results.append((order_id, fingerprint, seconds, error))
+            if error:
+                self.stderr.write(f"order {order_id}: {error}")
+            elif options['verbosity'] >= 2:
+                self.stdout.write(f"order {order_id}: {seconds * 1000:.1f} ms")
+        elapsed = time.perf_counter() - start
+        record_batch(results)
+
+        timings = sorted(seconds for _, _, seconds, error in results if not error)
+        failed = len(results) - len(timings)
+        summary = f"Rendered {len(timings)} invoice(s) in {elapsed:.2f}s ({len(timings) / elapsed:.1f} docs/sec"
+        if timings:
+            summary += (
+                f", per doc median {statistics.median(timings) * 1000:.1f} ms"
+                f", max {timings[-1] * 1000:.1f} ms"
+            )
+        self.stdout.write(summary + f"), {failed} failed")
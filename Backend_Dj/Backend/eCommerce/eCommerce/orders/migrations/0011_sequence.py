@@ -0,0 +1,30 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+def seed_order_sequence(apps, schema_editor):
+    # Continue numbering where the old count()-based ids left off
+    Order = apps.get_model('orders', 'Order')
+    Sequence = apps.get_model('orders', 'Sequence')
+    Sequence.objects.using(schema_editor.connection.alias).create(
+        name='order', value=Order.objects.using(schema_editor.connection.alias).count()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_order_sequence, migrations.RunPython.noop),
+    ]
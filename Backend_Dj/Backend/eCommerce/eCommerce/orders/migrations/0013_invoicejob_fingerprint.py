@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_invoicejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoicejob',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
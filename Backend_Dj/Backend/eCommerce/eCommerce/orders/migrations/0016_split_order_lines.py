@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+# The orders of one checkout were saved one after another, so their stamps
+# are at most a few seconds apart (and may straddle a second boundary)
+CHECKOUT_WINDOW = timedelta(seconds=5)
+
+
+def checkout_time(order):
+    # created_at is missing on old rows, but order_id carries the checkout
+    # second: ORD-YYYYMMDD-HHMMSS-NNNN. It was stamped with a naive
+    # datetime.now(), i.e. in the server's local time: TIME_ZONE on Unix,
+    # where Django sets the process time zone, but the host's zone on
+    # Windows. ORDER_ID_TIME_ZONE says which it was.
+    if order.created_at:
+        return order.created_at
+    try:
+        stamp = datetime.strptime(order.order_id[4:19], '%Y%m%d-%H%M%S')
+    except (TypeError, ValueError):
+        return None
+    return timezone.make_aware(stamp, ZoneInfo(settings.ORDER_ID_TIME_ZONE))
+
+
+def same_checkout(previous, order):
+    """
+    Whether `order` continues the checkout of `previous`: the next pk, for
+    the same customer, address and status, stamped within CHECKOUT_WINDOW.
+    """
+    if previous is None or order.pk != previous.pk + 1:
+        return False
+    if (order.customer_id, order.address_id, order.cancelled_at, order.shipped_at) != (
+        previous.customer_id, previous.address_id, previous.cancelled_at, previous.shipped_at
+    ):
+        return False
+    stamp, previous_stamp = checkout_time(order), checkout_time(previous)
+    return stamp is not None and previous_stamp is not None and abs(stamp - previous_stamp) <= CHECKOUT_WINDOW
+
+
+def split_order_lines(apps, schema_editor):
+    """
+    Move each order's product into an OrderLine, then fold each run of
+    orders one checkout used to create (see same_checkout) into the first
+    of them.
+    """
+    Order = apps.get_model('orders', 'Order')
+    OrderLine = apps.get_model('orders', 'OrderLine')
+    StockReservation = apps.get_model('orders', 'StockReservation')
+
+    checkouts = []
+    lines = []
+    previous = None
+    for order in Order.objects.order_by('pk').iterator():
+        lines.append(OrderLine(
+            order_id=order.pk,
+            product_id=order.products_id,
+            quantity=order.quantity,
+            unit_price=order.final_price / order.quantity if order.quantity else order.final_price,
+            final_price=order.final_price,
+        ))
+        if same_checkout(previous, order):
+            checkouts[-1].append(order)
+        else:
+            checkouts.append([order])
+        previous = order
+    OrderLine.objects.bulk_create(lines, batch_size=500)
+
+    for orders in checkouts:
+        header, merged = orders[0], [order.pk for order in orders[1:]]
+        if not merged:
+            continue
+        OrderLine.objects.filter(order_id__in=merged).update(order_id=header.pk)
+        StockReservation.objects.filter(order_id__in=merged).update(order_id=header.pk)
+        Order.objects.filter(pk=header.pk).update(final_price=sum(order.final_price for order in orders))
+        Order.objects.filter(pk__in=merged).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0015_orderline'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_order_lines, migrations.RunPython.noop),
+    ]
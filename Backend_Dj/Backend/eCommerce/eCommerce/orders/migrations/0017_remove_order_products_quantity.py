@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:44
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0016_split_order_lines'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='order',
+            name='products',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='quantity',
+        ),
+    ]
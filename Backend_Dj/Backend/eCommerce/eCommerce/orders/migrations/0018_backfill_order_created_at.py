@@ -0,0 +1,37 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+
+def backfill_created_at(apps, schema_editor):
+    """
+    Orders placed before created_at existed get the checkout time stamped in
+    their order_id (ORD-YYYYMMDD-HHMMSS-NNNN), read in ORDER_ID_TIME_ZONE
+    (see 0016), or the migration time.
+    """
+    Order = apps.get_model('orders', 'Order')
+    now = timezone.now()
+    stamp_zone = ZoneInfo(settings.ORDER_ID_TIME_ZONE)
+    missing = list(Order.objects.filter(created_at__isnull=True).only('pk', 'order_id'))
+    for order in missing:
+        try:
+            order.created_at = timezone.make_aware(
+                datetime.strptime(order.order_id[4:19], '%Y%m%d-%H%M%S'), stamp_zone
+            )
+        except (TypeError, ValueError):
+            order.created_at = now
+    Order.objects.bulk_update(missing, ['created_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0017_remove_order_products_quantity'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+    ]
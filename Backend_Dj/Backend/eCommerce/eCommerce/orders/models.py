@@ -1,34 +1,105 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 from accounts.models import User as Customer
 from utility.utility import generate_order_id
 from products.models import Products
 from django.conf import settings
 from accounts.models import user_address
 
+ORDER_SEQUENCE = 'order'
+
 
    
 
 
+class SequenceManager(models.Manager):
+    def allocate(self, name, count=1):
+        """
+        Reserve `count` consecutive numbers from the `name` sequence and return
+        them as a range. One UPDATE and one SELECT on a single row, whatever
+        the size of the orders table. The UPDATE locks the row until the
+        surrounding transaction ends, so concurrent callers get disjoint,
+        increasing ranges, and a rolled back transaction hands its numbers
+        back instead of leaving duplicates.
+        """
+        with transaction.atomic(using=self.db):
+            if not self.filter(name=name).update(value=F('value') + count):
+                self.get_or_create(name=name)
+                self.filter(name=name).update(value=F('value') + count)
+            last = self.filter(name=name).values_list('value', flat=True).get()
+        return range(last - count + 1, last + 1)
+
+
+class Sequence(models.Model):
+    """A named counter, used to number orders without COUNT(*) on the orders table."""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    objects = SequenceManager()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class OrderQuerySet(models.QuerySet):
+    STATUSES = {
+        'pending': Q(cancelled_at__isnull=True, shipped_at__isnull=True),
+        'shipped': Q(cancelled_at__isnull=True, shipped_at__isnull=False),
+        'cancelled': Q(cancelled_at__isnull=False),
+    }
+
+    def with_status(self, status):
+        """Orders whose `Order.status` is `status`, filtered in the database."""
+        return self.filter(self.STATUSES[status])
+
+
 class Order(models.Model):
+    """One checkout. The products bought are its `lines`."""
     customer=models.ForeignKey(Customer,on_delete=models.CASCADE,related_name="customer_order")
-   
-    products=models.ForeignKey(Products,on_delete=models.CASCADE,related_name="product_order")
     order_id=models.CharField(max_length=200,null=True,blank=True)
-    final_price=models.FloatField()
-    quantity = models.PositiveIntegerField(default=1)
+    final_price=models.FloatField()  # Sum of the lines
     address=models.ForeignKey(user_address,on_delete=models.SET_NULL,related_name="address",null=True, blank=True,)
     cancelled_at = models.DateTimeField(null=True, blank=True)
     cancellation_reason = models.TextField(blank=True, null=True)
     shipped_at = models.DateTimeField(null=True, blank=True)  # Optional
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Order history: one customer's orders, newest first
+            models.Index(fields=['customer', '-created_at', '-id'], name='order_customer_created_idx'),
+        ]
+
     def __str__(self):
         # Show order_id and the customer's name (if available)
         return f"Order ID: {self.order_id}, Name: {self.customer.name if self.customer else 'Unknown'}"
+
+    @property
+    def status(self):
+        if self.cancelled_at:
+            return 'cancelled'
+        if self.shipped_at:
+            return 'shipped'
+        return 'pending'
     
     def save(self, *args, **kwargs):
-        if not self.pk:
-             self.order_id=generate_order_id(Order.objects.count())
+        if not self.pk and not self.order_id:
+             self.order_id=generate_order_id(Sequence.objects.allocate(ORDER_SEQUENCE)[0])
         super(Order,self).save(*args, **kwargs)
 
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="lines")
+    product = models.ForeignKey(Products, on_delete=models.CASCADE, related_name="order_lines")
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.FloatField()  # discount_price at checkout
+    final_price = models.FloatField()  # unit_price * quantity
+
+    def __str__(self):
+        return f"{self.order.order_id}: {self.product} x{self.quantity}"
+
+
 class CartItem(models.Model):
     customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="cart_items")
     product = models.ForeignKey(Products, on_delete=models.CASCADE, related_name="cart_products")
@@ -41,3 +112,55 @@ class CartItem(models.Model):
 
     def __str__(self):
         return f"{self.customer} - {self.product} ({self.quantity})"
+
+
+class StockReservation(models.Model):
+    """
+    Ledger of stock taken off `Products.stock`. HELD rows are carts in
+    checkout and expire, COMMITTED rows belong to an order, RELEASED rows
+    have given their stock back.
+    """
+    HELD = 'held'
+    COMMITTED = 'committed'
+    RELEASED = 'released'
+    STATUS_CHOICES = [(HELD, 'Held'), (COMMITTED, 'Committed'), (RELEASED, 'Released')]
+
+    customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="stock_reservations")
+    product = models.ForeignKey(Products, on_delete=models.CASCADE, related_name="reservations")
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, related_name="reservations", null=True, blank=True)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=HELD)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx'),
+            models.Index(fields=['customer', 'status'], name='reservation_customer_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product} x{self.quantity} ({self.status})"
+
+
+class InvoiceJob(models.Model):
+    """Durable queue of invoice PDFs to render, one row per order."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="invoice_job")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    fingerprint = models.CharField(max_length=64, blank=True, default='')  # of the last render
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'updated_at'], name='invoice_job_status_idx')]
+
+    def __str__(self):
+        return f"Invoice for {self.order_id} ({self.status})"
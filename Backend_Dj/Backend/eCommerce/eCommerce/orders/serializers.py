@@ -1,41 +1,57 @@
 
 # backend/orders/serializers.py
 from rest_framework import serializers
-from orders.models import Order, CartItem
+from orders.models import Order, OrderLine, CartItem
 from products.models import Products
-from products.serializers import BrandNameSerializer, CategorySerializer
+from products.serializers import BrandNameSerializer, CategorySerializer, ImageVariantsField
 from accounts.models import User as Customer
 from accounts.serializers import AddressSerializer
+from utility.serializers import SideLoadMixin, SparseFieldsMixin
 
 
-class CustomerMinimalSerializers(serializers.ModelSerializer):
+class CustomerMinimalSerializers(SideLoadMixin, SparseFieldsMixin, serializers.ModelSerializer):
     
 
     class Meta:
         model = Customer
         fields = ['name', 'email']
+        sideload_as = 'customers'
 
 
-class ProductMinimalSerializer(serializers.ModelSerializer):
+class ProductMinimalSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     brand = BrandNameSerializer()
     category = CategorySerializer()
+    front_variants = ImageVariantsField(source='front_imges')
 
     class Meta:
         model = Products
-        fields = ['brand', 'category','front_imges','title','discount_price','slug']
+        fields = ['brand', 'category','front_imges','front_variants','title','discount_price','slug']
+        select_related = ['brand', 'category']
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    products = ProductMinimalSerializer()
+class OrderLineSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    product = ProductMinimalSerializer()
+
+    class Meta:
+        model = OrderLine
+        fields = ['product', 'quantity', 'unit_price', 'final_price']
+        select_related = ['product']
+
+
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     customer = CustomerMinimalSerializers()
+    lines = OrderLineSerializer(many=True, read_only=True)
+    status = serializers.ReadOnlyField()
 
     class Meta:
         model = Order
         exclude = ['id']
+        select_related = ['customer']
+        prefetch_related = ['lines']
 
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # product_title = serializers.CharField(source="product.title", read_only=True)
     # product_price = serializers.FloatField(source="product.discount_price", read_only=True)
     # product_image = serializers.ImageField(source="product.image", read_only=True)
@@ -45,4 +61,5 @@ class CartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ["id", "customer", "product", "quantity"]
+        select_related = ['product', 'customer']
 
@@ -0,0 +1,123 @@
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from orders.models import StockReservation
+from products import cache as product_cache
+from products.models import Products
+
+
+class OutOfStock(Exception):
+    def __init__(self, slugs):
+        super().__init__(", ".join(slugs))
+        self.slugs = slugs
+
+
+def _by_product(quantities):
+    return Case(
+        *(When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()),
+        output_field=IntegerField(),
+    )
+
+
+def take(quantities):
+    """
+    Take `quantities[product_pk]` units off each product in one
+    `UPDATE ... SET stock = stock - n WHERE stock >= n`. The check and the
+    write are a single statement, so concurrent takers can never push stock
+    below zero. Negative quantities give stock back. Returns False (and
+    changes nothing) unless every row had enough stock.
+    """
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity}
+    if not quantities:
+        return True
+    with transaction.atomic():
+        enough = reduce(or_, (Q(pk=pk, stock__gte=quantity) for pk, quantity in quantities.items()))
+        updated = Products.objects.filter(enough).update(stock=F('stock') - _by_product(quantities))
+        if updated != len(quantities):
+            transaction.set_rollback(True)
+            return False
+        # Queryset updates skip post_save, so refresh the catalog cache by hand
+        transaction.on_commit(product_cache.invalidate)
+    return True
+
+
+def give_back(quantities):
+    quantities = {pk: quantity for pk, quantity in quantities.items() if quantity}
+    if quantities:
+        Products.objects.filter(pk__in=quantities).update(stock=F('stock') + _by_product(quantities))
+        transaction.on_commit(product_cache.invalidate)
+
+
+def short_slugs(quantities):
+    return [
+        slug for pk, slug, stock in
+        Products.objects.filter(pk__in=quantities).values_list('pk', 'slug', 'stock')
+        if stock < quantities[pk]
+    ]
+
+
+def reserve(customer, quantities, ttl=None):
+    """
+    Hold `quantities[product_pk]` units for `customer` until the reservation
+    expires. A new reservation replaces the customer's unexpired holds on
+    the same products rather than adding to them, so reserving again never
+    takes the stock twice. Raises OutOfStock if any product is short;
+    nothing changes then, and the previous holds stay.
+    """
+    ttl = ttl if ttl is not None else settings.STOCK_RESERVATION_TTL
+    with transaction.atomic():
+        release(list(held_by(customer, list(quantities)).select_for_update()))
+        if not take(quantities):
+            raise OutOfStock(short_slugs(quantities))
+        expires_at = timezone.now() + ttl
+        return StockReservation.objects.bulk_create([
+            StockReservation(
+                customer=customer, product_id=pk, quantity=quantity,
+                status=StockReservation.HELD, expires_at=expires_at,
+            )
+            for pk, quantity in quantities.items()
+        ])
+
+
+def held_by(customer, product_pks):
+    """Unexpired HELD reservations of `customer` on the given products."""
+    return StockReservation.objects.filter(
+        customer=customer,
+        product_id__in=product_pks,
+        status=StockReservation.HELD,
+        expires_at__gt=timezone.now(),
+    )
+
+
+def release(reservations):
+    """
+    Give the stock of HELD or COMMITTED reservations back. Idempotent: each
+    row flips to RELEASED through a conditional update, and only the caller
+    that wins the flip returns its stock, so repeated or concurrent releases
+    of the same reservation give it back exactly once. Returns the number of
+    reservations released by this call.
+    """
+    released = 0
+    with transaction.atomic():
+        for reservation in reservations:
+            won = StockReservation.objects.filter(
+                pk=reservation.pk,
+                status__in=[StockReservation.HELD, StockReservation.COMMITTED],
+            ).update(status=StockReservation.RELEASED)
+            if won:
+                give_back({reservation.product_id: reservation.quantity})
+                released += 1
+    return released
+
+
+def release_expired(now=None):
+    expired = StockReservation.objects.filter(
+        status=StockReservation.HELD,
+        expires_at__lte=now or timezone.now(),
+    ).only('pk', 'product_id', 'quantity')
+    return release(list(expired))
@@ -1,3 +1,722 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User, user_address
+from orders import invoices, stock
+from orders.checkout import CheckoutError, cancel_order, place_order
+from orders.models import CartItem, InvoiceJob, Order, OrderLine, Sequence, StockReservation
+from products.models import BrandName, Category, Products
+from products.tests import make_product
+from rest_framework.test import APIClient
+from utility.testing import QueryCountMixin
+
+
+def make_customer(email="buyer@example.com"):
+    user = User.objects.create_user(email=email, name="Buyer", terms_condition=True, password="pass12345")
+    address = user_address.objects.create(
+        user=user, village_or_town="Main Road", city="Pune", state="MH", pincode="411001", phone="9876543210"
+    )
+    return user, address
+
+
+def make_catalog(size):
+    products = []
+    for i in range(size):
+        brand = BrandName.objects.create(name=f"Brand {i}")
+        category = Category.objects.create(name=f"Category {i}")
+        products.append(make_product(brand, category, title=f"Tee {i}", stock=100))
+    return products
+
+
+class OrderQueryCountTests(QueryCountMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.address = make_customer()
+        for product in make_catalog(6):
+            order = Order.objects.create(customer=cls.user, address=cls.address, final_price=product.discount_price)
+            OrderLine.objects.create(
+                order=order, product=product, quantity=1,
+                unit_price=product.discount_price, final_price=product.discount_price,
+            )
+            CartItem.objects.create(customer=cls.user, product=product, quantity=2)
+
+    def test_show_order(self):
+        response = self.assertEndpointQueries(2, "get", reverse("showorder"), user=self.user)
+        self.assertEqual(len(response.data["results"]), 6)
+        self.assertEqual(len(response.data["results"][0]["lines"]), 1)
+
+    def test_cart(self):
+        response = self.assertEndpointQueries(1, "get", reverse("cart"), user=self.user)
+        self.assertEqual(len(response.data), 6)
+
+    def test_addresses(self):
+        response = self.assertEndpointQueries(1, "get", reverse("addaddress"), user=self.user)
+        self.assertEqual([address["user"] for address in response.data], [self.user.pk])
+
+    def test_add_address(self):
+        payload = {"village_or_town": "Hill Road", "city": "Pune", "state": "MH", "pincode": "411002", "phone": "9876543210"}
+        self.assertEndpointQueries(1, "post", reverse("addaddress"), payload, status_code=201, user=self.user)
+        self.assertEqual(self.user.addresses.count(), 2)
+
+
+class PayloadTrimmingTests(QueryCountMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.address = make_customer()
+        brand, category = BrandName.objects.create(name="Nike"), Category.objects.create(name="Shoes")
+        for i in range(3):
+            product = make_product(brand, category, title=f"Tee {i}")
+            order = Order.objects.create(customer=cls.user, address=cls.address, final_price=product.discount_price)
+            OrderLine.objects.create(order=order, product=product, quantity=1, unit_price=1, final_price=1)
+            CartItem.objects.create(customer=cls.user, product=product, quantity=2)
+
+    def test_sparse_fields_select_nested_fields(self):
+        response = self.assertEndpointQueries(
+            2, "get", reverse("showorder"), {"fields": "order_id,lines.quantity,lines.product.title"}, user=self.user
+        )
+        order = response.data["results"][0]
+        self.assertEqual(set(order), {"order_id", "lines"})
+        self.assertEqual(order["lines"], [{"quantity": 1, "product": {"title": "Tee 2"}}])
+
+    def test_sideload_lists_repeated_objects_once(self):
+        response = self.assertEndpointQueries(1, "get", reverse("cart"), {"sideload": "true"}, user=self.user)
+        self.assertEqual({item["customer"] for item in response.data["results"]}, {self.user.pk})
+        self.assertEqual(response.data["included"]["customers"], {str(self.user.pk): {"name": "Buyer", "email": self.user.email}})
+        self.assertEqual(list(response.data["included"]["brands"].values()), [{"name": "Nike"}])
+
+        orders = self.assertEndpointQueries(2, "get", reverse("showorder"), {"sideload": "1"}, user=self.user)
+        self.assertEqual(orders.data["results"][0]["customer"], self.user.pk)
+        self.assertEqual(set(orders.data["included"]), {"customers", "brands", "categories"})
+
+    def test_unknown_fields_are_rejected(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(reverse("cart"), {"fields": "product.price"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("cart"), {"fields": "quantity.value"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("showorder"), {"fields": "order_id,"}).status_code, 400)
+
+
+class CartSummaryTests(QueryCountMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _ = make_customer()
+        brand = BrandName.objects.create(name="Brand")
+        category = Category.objects.create(name="Category")
+        cls.products = [
+            make_product(brand, category, title=f"Tee {i}", stock=i, discount_price=1.5) for i in range(300)
+        ]
+        CartItem.objects.bulk_create([
+            CartItem(customer=cls.user, product=product, quantity=2) for product in cls.products
+        ])
+
+    def test_summary_of_a_large_cart_is_one_query(self):
+        response = self.assertEndpointQueries(1, "get", reverse("cart-summary"), user=self.user)
+        self.assertEqual(response.data["line_count"], 300)
+        self.assertEqual(response.data["item_count"], 600)
+        self.assertEqual(response.data["subtotal"], 900.0)
+        self.assertFalse(response.data["all_in_stock"])
+        first, third = response.data["lines"][0], response.data["lines"][2]
+        self.assertEqual((first["line_total"], first["in_stock"]), (3.0, False))
+        self.assertTrue(third["in_stock"])
+
+    def test_empty_cart(self):
+        stranger, _ = make_customer("stranger@example.com")
+        response = self.assertEndpointQueries(1, "get", reverse("cart-summary"), user=stranger)
+        self.assertEqual(
+            response.data, {"lines": [], "subtotal": 0, "item_count": 0, "line_count": 0, "all_in_stock": True}
+        )
+
+
+class BulkCartTests(QueryCountMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _ = make_customer()
+        cls.products = make_catalog(4)
+        CartItem.objects.create(customer=cls.user, product=cls.products[0], quantity=1)
+        CartItem.objects.create(customer=cls.user, product=cls.products[1], quantity=1)
+
+    def cart(self):
+        return dict(CartItem.objects.filter(customer=self.user).values_list("product__slug", "quantity"))
+
+    def test_upserts_and_removes_in_fixed_queries(self):
+        items = [
+            {"slug": self.products[0].slug, "quantity": 5},
+            {"slug": self.products[1].slug, "quantity": 0},
+            {"slug": self.products[2].slug, "quantity": 2},
+            {"slug": self.products[3].slug},
+        ]
+        # lookup, savepoint, upsert, delete, release, summary
+        response = self.assertEndpointQueries(
+            6, "post", reverse("cart-bulk"), {"items": items}, user=self.user
+        )
+        expected = {self.products[0].slug: 5, self.products[2].slug: 2, self.products[3].slug: 1}
+        self.assertEqual(self.cart(), expected)
+        self.assertEqual(response.data["item_count"], 8)
+
+    def test_errors_change_nothing(self):
+        self.client.force_authenticate(self.user)
+        for items, status_code in (
+            ([{"slug": self.products[2].slug, "quantity": 1}, {"slug": "missing"}], 404),
+            ([{"slug": self.products[2].slug, "quantity": 101}], 400),
+            ([{"slug": self.products[2].slug, "quantity": -1}], 400),
+        ):
+            response = self.client.post(reverse("cart-bulk"), {"items": items}, format="json")
+            self.assertEqual(response.status_code, status_code)
+        self.assertEqual(self.cart(), {self.products[0].slug: 1, self.products[1].slug: 1})
+
+    def test_malformed_bodies_are_rejected(self):
+        self.client.force_authenticate(self.user)
+        item = {"slug": self.products[2].slug, "quantity": 1}
+        for body in ([item], {"items": "abc"}, {"items": [item, "abc"]}, {"items": [{"slug": ["x"]}]}, {"items": [{}]}):
+            response = self.client.post(reverse("cart-bulk"), body, format="json")
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn("error", response.data)
+        self.assertEqual(self.cart(), {self.products[0].slug: 1, self.products[1].slug: 1})
+
+        response = self.client.post(reverse("reserve-stock"), [item], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(StockReservation.objects.exists())
+        order = Order.objects.create(customer=self.user, final_price=1)
+        response = self.client.patch(reverse("cancel-order", args=[order.pk]), [], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, "pending")
+
+
+class OrderHistoryTests(QueryCountMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.address = make_customer()
+        product = make_catalog(1)[0]
+        now = timezone.now()
+        cls.orders = Order.objects.bulk_create([
+            Order(customer=cls.user, address=cls.address, final_price=i, order_id=f"ORD-{i}")
+            for i in range(5)
+        ])
+        for days, order in enumerate(cls.orders):
+            # created_at is auto_now_add, so date the orders afterwards: 0 is the oldest
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=4 - days))
+        Order.objects.filter(pk=cls.orders[1].pk).update(cancelled_at=now)
+        OrderLine.objects.bulk_create([
+            OrderLine(order=order, product=product, unit_price=1, final_price=1) for order in cls.orders
+        ])
+
+    def history(self, **params):
+        return self.assertEndpointQueries(2, "get", reverse("showorder"), params, user=self.user)
+
+    def order_ids(self, response):
+        return [order["order_id"] for order in response.data["results"]]
+
+    def test_pages_follow_the_cursor(self):
+        first = self.history(page_size=2)
+        self.assertEqual(self.order_ids(first), ["ORD-4", "ORD-3"])
+        second = self.history(page_size=2, cursor=first.data["cursor"])
+        self.assertEqual(self.order_ids(second), ["ORD-2", "ORD-1"])
+        last = self.history(page_size=2, cursor=second.data["cursor"])
+        self.assertEqual((self.order_ids(last), last.data["next"]), (["ORD-0"], None))
+
+    def test_status_and_date_filters(self):
+        self.assertEqual(self.order_ids(self.history(status="cancelled")), ["ORD-1"])
+        since = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.order_ids(self.history(since=since)), ["ORD-4", "ORD-3"])
+        self.assertEqual(self.order_ids(self.history(until=since, status="pending")), ["ORD-3", "ORD-2", "ORD-0"])
+
+    def test_bad_filters(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(reverse("showorder"), {"status": "lost"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("showorder"), {"since": "yesterday"}).status_code, 400)
+
+    def test_only_own_orders(self):
+        stranger, _ = make_customer("stranger@example.com")
+        self.assertEndpointQueries(1, "get", reverse("showorder"), status_code=404, user=stranger)
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.client.get(reverse("showorder"), {"status": "pending"}).data["results"], [])
+
+
+@override_settings(INVOICE_ROOT=tempfile.mkdtemp(), INVOICE_ASYNC=False)
+class CheckoutTests(QueryCountMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.address = make_customer()
+        cls.products = make_catalog(3)
+
+    def cart(self, quantities):
+        return [{"slug": p.slug, "quantity": q} for p, q in zip(self.products, quantities)]
+
+    def test_creates_one_order_with_a_line_per_product(self):
+        order = place_order(self.user, self.address, self.cart([1, 2, 3]))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(
+            list(order.lines.order_by("pk").values_list("product_id", "quantity")),
+            [(p.pk, q) for p, q in zip(self.products, [1, 2, 3])],
+        )
+        self.assertEqual(order.final_price, sum(p.discount_price * q for p, q in zip(self.products, [1, 2, 3])))
+        self.assertEqual(
+            list(Products.objects.order_by("id").values_list("stock", flat=True)), [99, 98, 97]
+        )
+
+    def test_query_count_does_not_grow_with_cart(self):
+        with self.assertNumQueries(14):  # includes savepoints
+            place_order(self.user, self.address, self.cart([1]))
+        with self.assertNumQueries(14):  # includes savepoints
+            place_order(self.user, self.address, self.cart([1, 1, 1]))
+
+    def test_short_stock_rolls_back_everything(self):
+        with self.assertRaises(CheckoutError):
+            place_order(self.user, self.address, self.cart([1, 1, 101]))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(set(Products.objects.values_list("stock", flat=True)), {100})
+
+    def test_stock_taken_after_read_fails_the_update(self):
+        Products.objects.filter(pk=self.products[1].pk).update(stock=50)
+        self.assertFalse(stock.take({p.pk: 60 for p in self.products}))
+        self.assertEqual(sorted(Products.objects.values_list("stock", flat=True)), [50, 100, 100])
+
+    def test_endpoint(self):
+        payload = {"product": self.cart([2, 1]), "address_id": self.address.pk}
+        response = self.assertEndpointQueries(
+            21, "post", reverse("createorder"), payload, status_code=201, user=self.user
+        )
+        self.assertEqual([line["quantity"] for line in response.data["lines"]], [2, 1])
+        self.assertEqual(InvoiceJob.objects.count(), 1)
+
+    def test_endpoint_unknown_product(self):
+        payload = {"product": [{"slug": "missing"}], "address_id": self.address.pk}
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse("createorder"), payload, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_endpoint_rejects_someone_elses_address(self):
+        stranger, _ = make_customer("stranger@example.com")
+        payload = {"product": self.cart([1]), "address_id": self.address.pk}
+        self.client.force_authenticate(stranger)
+        response = self.client.post(reverse("createorder"), payload, format="json")
+        self.assertEqual((response.status_code, response.data), (404, {"error": "Address not found"}))
+        self.assertFalse(Order.objects.exists())
+
+
+class StockReservationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.address = make_customer()
+        cls.product = make_catalog(1)[0]
+
+    def stock_left(self):
+        return Products.objects.get(pk=self.product.pk).stock
+
+    def test_reserve_holds_stock(self):
+        [reservation] = stock.reserve(self.user, {self.product.pk: 30})
+        self.assertEqual(reservation.status, StockReservation.HELD)
+        self.assertEqual(self.stock_left(), 70)
+
+    def test_reserve_more_than_available(self):
+        with self.assertRaises(stock.OutOfStock) as raised:
+            stock.reserve(self.user, {self.product.pk: 101})
+        self.assertEqual(raised.exception.slugs, [self.product.slug])
+        self.assertEqual(self.stock_left(), 100)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_release_is_idempotent(self):
+        reservations = stock.reserve(self.user, {self.product.pk: 30})
+        self.assertEqual(stock.release(reservations), 1)
+        self.assertEqual(stock.release(reservations), 0)
+        self.assertEqual(self.stock_left(), 100)
+
+    def test_expired_holds_are_released(self):
+        stock.reserve(self.user, {self.product.pk: 30}, ttl=timedelta(seconds=-1))
+        stock.reserve(self.user, {self.product.pk: 5})
+        self.assertEqual(stock.release_expired(), 1)
+        self.assertEqual(self.stock_left(), 95)
+
+    def test_reserving_again_replaces_the_hold(self):
+        Products.objects.filter(pk=self.product.pk).update(stock=4)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = {"product": [{"slug": self.product.slug, "quantity": 2}]}
+        for _ in range(3):
+            self.assertEqual(client.post(reverse("reserve-stock"), payload, format="json").status_code, 201)
+        self.assertEqual(self.stock_left(), 2)
+        [hold] = StockReservation.objects.filter(status=StockReservation.HELD)
+        self.assertEqual(hold.quantity, 2)
+
+        # A larger hold that doesn't fit keeps the previous one
+        payload["product"][0]["quantity"] = 7
+        self.assertEqual(client.post(reverse("reserve-stock"), payload, format="json").status_code, 400)
+        self.assertEqual((self.stock_left(), StockReservation.objects.get(status=StockReservation.HELD)), (2, hold))
+
+    @override_settings(STOCK_RESERVATION_MAX_QUANTITY=5)
+    def test_holds_are_capped_per_product(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = {"product": [{"slug": self.product.slug, "quantity": 6}]}
+        self.assertEqual(client.post(reverse("reserve-stock"), payload, format="json").status_code, 400)
+        self.assertEqual(self.stock_left(), 100)
+
+    def test_checkout_converts_held_stock(self):
+        stock.reserve(self.user, {self.product.pk: 3})
+        order = place_order(self.user, self.address, [{"slug": self.product.slug, "quantity": 5}])
+        self.assertEqual(self.stock_left(), 95)
+        self.assertEqual(order.reservations.get().status, StockReservation.COMMITTED)
+        self.assertFalse(StockReservation.objects.filter(status=StockReservation.HELD).exists())
+
+    def test_cancel_gives_stock_back_once(self):
+        order = place_order(self.user, self.address, [{"slug": self.product.slug, "quantity": 4}])
+        self.assertTrue(cancel_order(order))
+        self.assertFalse(cancel_order(order))
+        self.assertEqual(self.stock_left(), 100)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, "cancelled")
+
+    def test_cancel_endpoint(self):
+        order = place_order(self.user, self.address, [{"slug": self.product.slug, "quantity": 4}])
+        url = reverse("cancel-order", args=[order.pk])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.patch(url).status_code, 200)
+        self.assertEqual(self.client.patch(url).status_code, 400)
+        self.assertEqual(self.stock_left(), 100)
+
+
+class StockConcurrencyTests(TransactionTestCase):
+    """Hammer one product from many threads; stock must never go negative."""
+
+    # refresh_from_db() reads the catalog replica when one is configured
+    databases = "__all__"
+    THREADS = 8
+    ATTEMPTS = 25
+    STOCK = 60
+
+    def setUp(self):
+        self.user, _ = make_customer()
+        self.product = make_catalog(1)[0]
+        Products.objects.filter(pk=self.product.pk).update(stock=self.STOCK)
+
+    def run_threads(self, work):
+        results, barrier = [], threading.Barrier(self.THREADS)
+
+        def worker():
+            barrier.wait()
+            try:
+                for _ in range(self.ATTEMPTS):
+                    results.append(retry_when_locked(work))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_reservations_never_oversell(self):
+        # A customer's new hold replaces their old one, so every attempt is a
+        # different customer; a retried attempt keeps its customer
+        customers = iter(User.objects.bulk_create(
+            User(email=f"buyer{i}@example.com", name="Buyer", terms_condition=True)
+            for i in range(self.THREADS * self.ATTEMPTS)
+        ))
+        attempt = threading.local()
+
+        def work():
+            if getattr(attempt, "customer", None) is None:
+                attempt.customer = next(customers)
+            try:
+                stock.reserve(attempt.customer, {self.product.pk: 1})
+                reserved = True
+            except stock.OutOfStock:
+                reserved = False
+            attempt.customer = None
+            return reserved
+
+        results = self.run_threads(work)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(results.count(True), self.STOCK)
+        self.assertEqual(StockReservation.objects.count(), self.STOCK)
+
+    def test_concurrent_releases_give_back_once(self):
+        reservations = stock.reserve(self.user, {self.product.pk: 10})
+        self.run_threads(lambda: stock.release(reservations))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, self.STOCK)
+
+
+def retry_when_locked(work):
+    # SQLite lets one writer in at a time; the others see "database is locked".
+    while True:
+        try:
+            return work()
+        except OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            time.sleep(0.001)
+
+
+class OrderSequenceTests(TestCase):
+    def test_ranges_are_consecutive_and_increasing(self):
+        first = Sequence.objects.allocate("test", 3)
+        second = Sequence.objects.allocate("test", 2)
+        self.assertEqual(list(first) + list(second), [1, 2, 3, 4, 5])
+
+    def test_rolled_back_numbers_are_handed_out_again(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Sequence.objects.allocate("test", 5)
+            raise RuntimeError
+        self.assertEqual(list(Sequence.objects.allocate("test")), [1])
+
+    def test_order_save_uses_sequence_without_counting(self):
+        user, address = make_customer()
+        product = make_catalog(1)[0]
+        with CaptureQueriesContext(connection) as queries:
+            order = Order.objects.create(customer=user, address=address, final_price=1)
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+        self.assertTrue(order.order_id.endswith("-0001"))
+
+
+class OrderSequenceConcurrencyTests(TransactionTestCase):
+    def test_concurrent_allocations_are_unique(self):
+        numbers, barrier = [], threading.Barrier(8)
+
+        def worker():
+            barrier.wait()
+            try:
+                for _ in range(25):
+                    numbers.extend(retry_when_locked(lambda: Sequence.objects.allocate("test", 2)))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(numbers), list(range(1, 401)))
+
+
+@override_settings(INVOICE_ASYNC=False)
+class InvoicePipelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.address = make_customer()
+        cls.product = make_catalog(1)[0]
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.enterContext(self.settings(INVOICE_ROOT=root))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def checkout(self):
+        payload = {"product": [{"slug": self.product.slug, "quantity": 1}], "address_id": self.address.pk}
+        response = self.client.post(reverse("createorder"), payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.latest("pk")
+
+    def checkout_and_fail(self):
+        with mock.patch("orders.invoices.create_invoice_pdf", side_effect=OSError("disk full")):
+            with self.captureOnCommitCallbacks(execute=True):
+                order = self.checkout()
+        self.assertEqual(InvoiceJob.objects.get(order=order).status, InvoiceJob.FAILED)
+        return order
+
+    def test_invoice_is_rendered_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            order = self.checkout()
+        self.assertEqual(order.invoice_job.status, InvoiceJob.PENDING)
+        self.assertFalse(os.path.exists(invoices.invoice_path(invoices.invoice_fingerprint(order))))
+
+        url = reverse("generate-invoice", args=[order.pk])
+        pending = self.client.get(url)
+        self.assertEqual(pending.status_code, 202)
+        self.assertEqual(pending["Retry-After"], "2")
+
+        for callback in callbacks:
+            callback()
+        order.invoice_job.refresh_from_db()
+        self.assertEqual(order.invoice_job.status, InvoiceJob.DONE)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+    def test_failed_job_is_retried(self):
+        with mock.patch("orders.invoices.create_invoice_pdf", side_effect=OSError("disk full")):
+            with self.captureOnCommitCallbacks(execute=True):
+                order = self.checkout()
+        job = InvoiceJob.objects.get(order=order)
+        self.assertEqual((job.status, job.last_error), (InvoiceJob.FAILED, "disk full"))
+
+        # Still backing off
+        call_command("drain_invoice_jobs", stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (InvoiceJob.FAILED, 1))
+
+        InvoiceJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("drain_invoice_jobs", stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (InvoiceJob.DONE, 2))
+
+    @override_settings(INVOICE_RETRY_BACKOFF=60)
+    def test_polling_a_failed_invoice_waits_for_the_backoff(self):
+        order = self.checkout_and_fail()
+        with mock.patch("orders.invoices.create_invoice_pdf") as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.get(reverse("generate-invoice", args=[order.pk]))
+        self.assertEqual(response.status_code, 202)
+        self.assertGreaterEqual(int(response["Retry-After"]), 59)
+        render.assert_not_called()
+        self.assertEqual(InvoiceJob.objects.get(order=order).attempts, 1)
+
+    @override_settings(INVOICE_RETRY_BACKOFF=0, INVOICE_MAX_ATTEMPTS=2)
+    def test_invoice_is_given_up_after_max_attempts(self):
+        url = reverse("generate-invoice", args=[self.checkout_and_fail().pk])
+        with mock.patch("orders.invoices.create_invoice_pdf", side_effect=OSError("disk full")) as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.get(url).status_code, 202)  # the second attempt
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 500)
+            self.assertEqual(response.data["status"], InvoiceJob.FAILED)
+            call_command("drain_invoice_jobs", stdout=StringIO())
+            self.assertEqual(render.call_count, 1)
+
+        call_command("drain_invoice_jobs", rerender=True, stdout=StringIO())
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_other_customers_cannot_fetch_invoice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self.checkout()
+        stranger, _ = make_customer("stranger@example.com")
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.client.get(reverse("generate-invoice", args=[order.pk])).status_code, 404)
+
+    def test_invoice_supports_etag_and_ranges(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self.checkout()
+        url = reverse("generate-invoice", args=[order.pk])
+        response = self.client.get(url)
+        body = b"".join(response.streaming_content)
+        etag = response["ETag"]
+        self.assertEqual(etag, f'"{invoices.invoice_fingerprint(order)}"')
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        partial = self.client.get(url, HTTP_RANGE="bytes=0-3")
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(b"".join(partial.streaming_content), b"%PDF")
+        self.assertEqual(partial["Content-Length"], "4")
+        self.assertEqual(partial["Content-Range"], f"bytes 0-3/{len(body)}")
+        self.assertEqual(b"".join(self.client.get(url, HTTP_RANGE="bytes=-5").streaming_content), body[-5:])
+        self.assertEqual(self.client.get(url, HTTP_RANGE=f"bytes={len(body)}-").status_code, 416)
+        # A stale If-Range gets the whole file
+        self.assertEqual(self.client.get(url, HTTP_RANGE="bytes=0-3", HTTP_IF_RANGE='"old"').status_code, 200)
+
+    def test_invoice_prints_the_order_date(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self.checkout()
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(datetime(2024, 3, 5, 12)))
+        order = invoices.for_invoice(Order.objects.all()).get(pk=order.pk)
+        self.assertNotEqual(invoices.invoice_fingerprint(order), InvoiceJob.objects.get(order=order).fingerprint)
+        with mock.patch.object(invoices, "Table", wraps=invoices.Table) as table:
+            invoices.render_invoice(order)
+        self.assertIn(["Order Date:", "March 05, 2024"], table.call_args_list[0].args[0])
+
+    def test_changed_order_gets_a_new_invoice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self.checkout()
+        old_path = invoices.invoice_path(invoices.invoice_fingerprint(order))
+        self.assertTrue(os.path.exists(old_path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse("cancel-order", args=[order.pk]), {}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        order = invoices.for_invoice(Order.objects.all()).get(pk=order.pk)
+        new_path = invoices.invoice_path(invoices.invoice_fingerprint(order))
+        self.assertNotEqual(new_path, old_path)
+        self.assertTrue(os.path.exists(new_path))
+        self.assertFalse(os.path.exists(old_path))
+        self.assertEqual(order.invoice_job.fingerprint, invoices.invoice_fingerprint(order))
+
+    def test_evicted_invoice_is_rendered_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self.checkout()
+        self.assertEqual(invoices.evict(max_files=0), 1)
+
+        url = reverse("generate-invoice", args=[order.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.get(url).status_code, 202)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_invoice_evicted_while_served_is_rendered_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = self.checkout()
+        url = reverse("generate-invoice", args=[order.pk])
+        # Deleted between the existence check and opening the file
+        with mock.patch.object(invoices, "touch", side_effect=os.remove):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.get(url).status_code, 202)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_evict_drops_least_recently_used(self):
+        os.makedirs(settings.INVOICE_ROOT, exist_ok=True)
+        for age, name in enumerate(["new", "middle", "old"]):
+            path = invoices.invoice_path(name)
+            with open(path, "wb") as f:
+                f.write(b"x" * 100)
+            os.utime(path, (time.time() - age * 60,) * 2)
+        invoices.touch(invoices.invoice_path("old"))
+
+        self.assertEqual(invoices.evict(max_bytes=200), 1)
+        self.assertEqual(sorted(os.listdir(settings.INVOICE_ROOT)), ["new.pdf", "old.pdf"])
+
+    def test_renders_evict_at_most_once_per_interval(self):
+        self.enterContext(mock.patch.object(invoices, "_last_evict", None))
+        with mock.patch.object(invoices, "evict", return_value=0) as evict:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.checkout()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.checkout()
+            self.assertEqual(evict.call_count, 1)
+
+            with self.settings(INVOICE_CACHE_EVICT_INTERVAL=0):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.checkout()
+            self.assertEqual(evict.call_count, 2)
+
+    def test_render_invoices_command(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            first = self.checkout()
+            second = self.checkout()
+        Order.objects.filter(pk=first.pk).update(created_at=timezone.now() - timedelta(days=30))
+
+        out = StringIO()
+        since = (timezone.localdate() - timedelta(days=1)).isoformat()
+        call_command("render_invoices", since=since, workers=2, stdout=out)
+        self.assertIn("Rendered 1 invoice(s)", out.getvalue())
+
+        second = invoices.for_invoice(Order.objects.all()).get(pk=second.pk)
+        self.assertTrue(os.path.exists(invoices.invoice_path(invoices.invoice_fingerprint(second))))
+        self.assertEqual(
+            (second.invoice_job.status, second.invoice_job.fingerprint),
+            (InvoiceJob.DONE, invoices.invoice_fingerprint(second)),
+        )
+        self.assertEqual(InvoiceJob.objects.get(order=first).status, InvoiceJob.PENDING)
+
+    def test_invoice_styles_are_built_once(self):
+        self.assertIs(invoices.invoice_styles(), invoices.invoice_styles())
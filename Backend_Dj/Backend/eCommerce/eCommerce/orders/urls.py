@@ -1,10 +1,13 @@
 from django.urls import path
-from orders.views import showOrder, CreateOrder, AddToCart, generate_invoice, CancelOrder
+from orders.views import showOrder, CreateOrder, AddToCart, BulkCart, CartSummary, generate_invoice, CancelOrder, ReserveStock
 from . import views
 urlpatterns = [
     path('showorder/', showOrder.as_view(), name='showorder'),
     path('createorder/', CreateOrder.as_view(), name="createorder"),
+    path('checkout/reserve/', ReserveStock.as_view(), name="reserve-stock"),
     path("cart/", AddToCart.as_view(), name="cart"),
+    path("cart/summary/", CartSummary.as_view(), name="cart-summary"),
+    path("cart/bulk/", BulkCart.as_view(), name="cart-bulk"),
     path("cart/<int:pk>/", AddToCart.as_view(), name="cart-detail"),
     path('orders/<int:order_id>/cancel-order/', CancelOrder.as_view(), name='cancel-order'),
     path('orders/<int:order_id>/invoice/', views.generate_invoice, name='generate-invoice'),
@@ -4,261 +4,165 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 
-from orders.models import Order, CartItem
+from orders import invoices, stock
+from orders.cart import summarize_cart, update_cart
+from orders.models import Order, OrderQuerySet, CartItem, InvoiceJob, StockReservation
+from orders.checkout import CheckoutError, cancel_order, parse_cart, place_order, resolve_products
 from orders.serializers import OrderSerializer, CartItemSerializer
 from products.models import Products
 from accounts.models import user_address
-from django.http import FileResponse
+from utility.files import file_response
+from utility.pagination import KeysetPagination
+from utility.queryset import with_related
+from utility.serializers import requested_fields, sideload_context, with_included
+from utility.utility import parse_day_or_datetime
 from django.conf import settings
+from django.db import transaction
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+import math
 import os
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.units import inch
-from django.utils import timezone
-from datetime import datetime
 import logging
+from datetime import timedelta
 
 logger = logging.getLogger(__name__)
 
+
+def send_invoice(request, path, fingerprint, filename):
+    """The cached PDF at `path`, or None if it is gone."""
+    try:
+        return file_response(request, path, 'application/pdf', etag=fingerprint, filename=filename)
+    except FileNotFoundError:
+        return None  # evicted or replaced by a worker since it was found
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
 def generate_invoice(request, order_id):
     """
-    Generate and return invoice PDF for a specific order
+    Return the invoice PDF for a specific order, or 202 with a Retry-After
+    hint while the background workers are still rendering it (or waiting to
+    retry a failed render), and 500 once its render has failed
+    INVOICE_MAX_ATTEMPTS times. The ETag is the fingerprint of the order
+    state the PDF was rendered from.
     """
-    try:
-        order = get_object_or_404(Order, id=order_id, customer=request.user)
-        
-        # Create invoices directory if it doesn't exist
-        invoice_dir = os.path.join(settings.BASE_DIR, 'invoices')
-        os.makedirs(invoice_dir, exist_ok=True)
-        
-        file_path = os.path.join(invoice_dir, f'{order_id}.pdf')
-        
-        # Generate PDF if it doesn't exist
-        if not os.path.exists(file_path):
-            create_invoice_pdf(order, file_path)
-        
-        return FileResponse(open(file_path, 'rb'), content_type='application/pdf')
-    
-    except Order.DoesNotExist:
-        # Return default invoice if order not found
-        default_path = os.path.join(settings.BASE_DIR, 'static', 'default_invoice.pdf')
-        if os.path.exists(default_path):
-            return FileResponse(open(default_path, 'rb'), content_type='application/pdf')
-        else:
+    order = get_object_or_404(
+        invoices.for_invoice(Order.objects.all()), id=order_id, customer=request.user
+    )
+
+    fingerprint = invoices.invoice_fingerprint(order)
+    file_path = invoices.invoice_path(fingerprint)
+    filename = f'invoice_{order.order_id}.pdf'
+    if os.path.exists(file_path):
+        invoices.touch(file_path)
+        response = send_invoice(request, file_path, fingerprint, filename)
+        if response is not None:
+            return response
+
+    job = InvoiceJob.objects.filter(order=order).first()
+    retry_after = settings.INVOICE_RETRY_AFTER
+    # Orders from before the job queue, an evicted file or an order that
+    # changed since it was rendered
+    fresh = job is None or job.status == InvoiceJob.DONE
+    due = fresh
+    if job is not None and job.status == InvoiceJob.FAILED:
+        if invoices.exhausted(job):
             return Response(
-                {"error": "Invoice not found"}, 
-                status=status.HTTP_404_NOT_FOUND
+                {"status": job.status, "error": "The invoice could not be generated"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+        # Polling must not re-render a failing invoice every few seconds
+        wait = invoices.retry_after(job)
+        due = not wait
+        retry_after = max(retry_after, math.ceil(wait))
+    if due:
+        with transaction.atomic():
+            invoices.enqueue([order], fresh=fresh)
+        job = InvoiceJob.objects.get(order=order)
+        if os.path.exists(file_path):
+            response = send_invoice(request, file_path, fingerprint, filename)
+            if response is not None:
+                return response
 
-
-def create_invoice_pdf(order, file_path):
-    """
-    Create a professional invoice PDF using ReportLab
-    """
-    try:
-        doc = SimpleDocTemplate(file_path, pagesize=A4)
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            spaceAfter=30,
-            textColor=colors.darkblue,
-            alignment=1  # Center alignment
-        )
-        
-        header_style = ParagraphStyle(
-            'CustomHeader',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=12,
-            textColor=colors.black
-        )
-        
-        # Invoice Title
-        story.append(Paragraph("INVOICE", title_style))
-        story.append(Spacer(1, 12))
-        
-        # Company Information (customize as needed)
-        company_info = """
-        <b>Your Company Name</b><br/>
-        123 Business Street<br/>
-        City, State 12345<br/>
-        Phone: (555) 123-4567<br/>
-        Email: contact@yourcompany.com
-        """
-        story.append(Paragraph(company_info, styles['Normal']))
-        story.append(Spacer(1, 20))
-        
-        # Invoice Details
-        invoice_data = [
-            ['Invoice Number:', f'INV-{order.id:06d}'],
-            ['Order Date:', order.created_at.strftime('%B %d, %Y')],
-            ['Order ID:', str(order.id)],
-            ['Status:', order.status],
-        ]
-        
-        invoice_table = Table(invoice_data, colWidths=[2*inch, 3*inch])
-        invoice_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        story.append(invoice_table)
-        story.append(Spacer(1, 20))
-        
-        # Customer Information
-        story.append(Paragraph("Bill To:", header_style))
-        customer_info = f"""
-        <b>{order.customer.get_full_name() or order.customer.username}</b><br/>
-        {order.customer.email}<br/>
-        {order.address.address_line_1}<br/>
-        {order.address.address_line_2 or ''}<br/>
-        {order.address.city}, {order.address.state} {order.address.postal_code}<br/>
-        {order.address.country}
-        """
-        story.append(Paragraph(customer_info, styles['Normal']))
-        story.append(Spacer(1, 20))
-        
-        # Order Items
-        story.append(Paragraph("Order Details:", header_style))
-        
-        # Create table data
-        table_data = [['Product', 'Quantity', 'Unit Price', 'Total Price']]
-        
-        # Add product row
-        table_data.append([
-            order.products.name,
-            str(order.quantity),
-            f'${order.products.discount_price:.2f}',
-            f'${order.final_price:.2f}'
-        ])
-        
-        # Create table
-        order_table = Table(table_data, colWidths=[3*inch, 1*inch, 1.2*inch, 1.2*inch])
-        order_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        story.append(order_table)
-        story.append(Spacer(1, 20))
-        
-        # Total
-        total_data = [['Total Amount:', f'${order.final_price:.2f}']]
-        total_table = Table(total_data, colWidths=[4.5*inch, 1.9*inch])
-        total_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.lightblue),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        story.append(total_table)
-        story.append(Spacer(1, 30))
-        
-        # Footer
-        footer_text = """
-        <b>Thank you for your business!</b><br/>
-        For any questions regarding this invoice, please contact us at support@yourcompany.com
-        """
-        story.append(Paragraph(footer_text, styles['Normal']))
-        
-        # Build PDF
-        doc.build(story)
-        logger.info(f"Invoice generated successfully for order {order.id}")
-        
-    except Exception as e:
-        logger.error(f"Error generating invoice for order {order.id}: {str(e)}")
-        raise
+    return Response(
+        {"status": job.status, "msg": "Invoice is being generated, try again shortly"},
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Retry-After': str(retry_after)},
+    )
 
 
 class showOrder(APIView):
+    """
+    Order history of the current user, newest first, one keyset page at a
+    time. Optional filters: `status` (pending/shipped/cancelled) and a
+    `since` / `until` range on the order date, both inclusive. `fields=`
+    and `sideload=true` trim the payload (utility.serializers).
+    """
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    filter_params = {'status', 'since', 'until', 'cursor'}
+
+    def filter_queryset(self, queryset):
+        params = self.request.query_params
+        status_filter = params.get('status')
+        if status_filter:
+            if status_filter not in OrderQuerySet.STATUSES:
+                raise ValidationError({"status": f"Must be one of {', '.join(OrderQuerySet.STATUSES)}"})
+            queryset = queryset.with_status(status_filter)
+        for param, lookup in (('since', 'created_at__gte'), ('until', 'created_at__lt')):
+            value = params.get(param)
+            if not value:
+                continue
+            try:
+                moment, is_day = parse_day_or_datetime(value)
+            except ValueError:
+                raise ValidationError({param: "Expected YYYY-MM-DD or an ISO datetime"})
+            if param == 'until' and is_day:
+                moment += timedelta(days=1)  # the whole day
+            queryset = queryset.filter(**{lookup: moment})
+        return queryset
 
     def get(self, request):
-        orders = Order.objects.filter(customer__email=request.user.email)
-        if not orders.exists():
+        orders = with_related(Order.objects.filter(customer_id=request.user.pk), OrderSerializer)
+        orders = self.filter_queryset(orders)
+        paginator = self.pagination_class()
+        # The first page doubles as the existence check
+        page = paginator.paginate_queryset(orders, request, view=self)
+        if not page and not self.filter_params.intersection(request.query_params):
             return Response(
                 {"error": "You do not have any orders."},
                 status=status.HTTP_404_NOT_FOUND
             )
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        context = sideload_context(request)
+        serializer = OrderSerializer(page, many=True, fields=requested_fields(request), context=context)
+        response = paginator.get_paginated_response(serializer.data)
+        with_included(response.data, context)
+        return response
 
 
 class CreateOrder(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        product_slugs = request.data.get('product', [])
-        address_id = request.data.get('address_id')
+        data = request.data if isinstance(request.data, dict) else {}  # e.g. a JSON array
+        product_slugs = data.get('product', [])
+        address_id = data.get('address_id')
 
         try:
-            address = user_address.objects.get(pk=address_id)
-        except user_address.DoesNotExist:
+            # Ownership is part of the lookup, served by address_owner_idx
+            address = user_address.objects.get(pk=address_id, user=request.user)
+        except (user_address.DoesNotExist, ValueError, TypeError):
             return Response({"error": "Address not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        created_orders = []
-        for product_slug in product_slugs:
-            slug = product_slug.get('slug')
-            quantity = product_slug.get('quantity', 1)
-
-            try:
-                product = Products.objects.get(slug=slug)
-            except Products.DoesNotExist:
-                return Response(
-                    {"error": f"Product '{slug}' not found"},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-
-            if product.stock < quantity:
-                return Response(
-                    {"error": f"Not enough stock for product '{slug}'"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            order = Order.objects.create(
-                customer=request.user,
-                address=address,
-                products=product,
-                final_price=product.discount_price * quantity,
-                quantity=quantity
-            )
+        try:
+            with transaction.atomic():
+                order = place_order(request.user, address, product_slugs)
+                # The invoice is rendered in the background once the order commits
+                invoices.enqueue([order])
+        except CheckoutError as e:
+            return Response({"error": e.message}, status=e.status_code)
 
-            product.stock -= quantity
-            product.save()
-            created_orders.append(order)
-            
-            # Auto-generate invoice after order creation
-            try:
-                invoice_dir = os.path.join(settings.BASE_DIR, 'invoices')
-                os.makedirs(invoice_dir, exist_ok=True)
-                file_path = os.path.join(invoice_dir, f'{order.id}.pdf')
-                create_invoice_pdf(order, file_path)
-                logger.info(f"Auto-generated invoice for order {order.id}")
-            except Exception as e:
-                logger.error(f"Failed to auto-generate invoice for order {order.id}: {str(e)}")
-
-        serializer = OrderSerializer(created_orders, many=True)
+        serializer = OrderSerializer(with_related(Order.objects.filter(pk=order.pk), OrderSerializer).get())
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
@@ -269,53 +173,83 @@ class CancelOrder(APIView):
         """
         Cancel an order and restore product stock
         """
+        order = get_object_or_404(with_related(Order.objects.all(), OrderSerializer), id=order_id, customer=request.user)
+        if not isinstance(request.data, dict):
+            return Response({"error": 'Expected a JSON object, e.g. {"reason": ...}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Check if order can be cancelled; cancel_order re-checks atomically
+        if order.status != 'pending' or not cancel_order(order, request.data.get('reason')):
+            return Response(
+                {"error": f"Cannot cancel order with status: {order.status}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        logger.info(f"Order {order_id} cancelled by user {request.user.email}")
+        # The invoice now shows the order as cancelled
+        invoices.enqueue([order])
+
+        serializer = OrderSerializer(order)
+        return Response({
+            "message": "Order cancelled successfully",
+            "order": serializer.data
+        }, status=status.HTTP_200_OK)
+
+
+class ReserveStock(APIView):
+    """
+    Hold the stock of a cart while the customer goes through checkout, up
+    to STOCK_RESERVATION_MAX_QUANTITY units per product. Posting again
+    replaces the holds on the same products. CreateOrder converts the held
+    stock; unconverted holds expire after STOCK_RESERVATION_TTL and are
+    released by `release_expired_reservations`.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        data = request.data if isinstance(request.data, dict) else {'product': None}
         try:
-            order = get_object_or_404(Order, id=order_id, customer=request.user)
-            
-            # Check if order can be cancelled
-            if order.status in ['delivered', 'cancelled']:
-                return Response(
-                    {"error": f"Cannot cancel order with status: {order.status}"},
-                    status=status.HTTP_400_BAD_REQUEST
+            cart = parse_cart(data.get('product', []))
+            too_many = [slug for slug, quantity in cart.items() if quantity > settings.STOCK_RESERVATION_MAX_QUANTITY]
+            if too_many:
+                raise CheckoutError(
+                    f"At most {settings.STOCK_RESERVATION_MAX_QUANTITY} units can be held per product: "
+                    + ", ".join(f"'{slug}'" for slug in too_many)
                 )
-            
-            # Restore product stock
-            product = order.products
-            product.stock += order.quantity
-            product.save()
-            
-            # Update order status
-            order.status = 'cancelled'
-            order.save()
-            
-            logger.info(f"Order {order_id} cancelled by user {request.user.email}")
-            
-            serializer = OrderSerializer(order)
-            return Response({
-                "message": "Order cancelled successfully",
-                "order": serializer.data
-            }, status=status.HTTP_200_OK)
-            
-        except Order.DoesNotExist:
-            return Response(
-                {"error": "Order not found"},
-                status=status.HTTP_404_NOT_FOUND
+            by_slug = resolve_products(cart)
+            reservations = stock.reserve(
+                request.user, {by_slug[slug].pk: quantity for slug, quantity in cart.items()}
             )
-        except Exception as e:
-            logger.error(f"Error cancelling order {order_id}: {str(e)}")
+        except CheckoutError as e:
+            return Response({"error": e.message}, status=e.status_code)
+        except stock.OutOfStock as e:
             return Response(
-                {"error": "Failed to cancel order"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {"error": "Not enough stock for product(s) " + ", ".join(f"'{slug}'" for slug in e.slugs)},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
+        slugs = {product.pk: slug for slug, product in by_slug.items()}
+        return Response({
+            "expires_at": reservations[0].expires_at if reservations else None,
+            "reservations": [
+                {"slug": slugs[reservation.product_id], "quantity": reservation.quantity}
+                for reservation in reservations
+            ],
+        }, status=status.HTTP_201_CREATED)
+
+    def delete(self, request):
+        held = StockReservation.objects.filter(customer=request.user, status=StockReservation.HELD)
+        stock.release(list(held))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class AddToCart(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        cart_items = CartItem.objects.filter(customer=request.user)
-        serializer = CartItemSerializer(cart_items, many=True)
-        return Response(serializer.data)
+        cart_items = with_related(CartItem.objects.filter(customer=request.user), CartItemSerializer)
+        context = sideload_context(request)
+        serializer = CartItemSerializer(cart_items, many=True, fields=requested_fields(request), context=context)
+        return Response(with_included(serializer.data, context))
 
     def post(self, request):
         product_slug = request.data.get('product')
@@ -342,7 +276,7 @@ class AddToCart(APIView):
 
     def patch(self, request, pk):
         try:
-            cart_item = CartItem.objects.get(pk=pk, customer=request.user)
+            cart_item = with_related(CartItem.objects.all(), CartItemSerializer).get(pk=pk, customer=request.user)
             quantity = request.data.get('quantity')
             if quantity is not None and quantity != 0:
                 cart_item.quantity = quantity
@@ -365,4 +299,29 @@ class AddToCart(APIView):
             item.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         except CartItem.DoesNotExist:
-            return Response({"error": "Cart item not found"}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response({"error": "Cart item not found"}, status=status.HTTP_404_NOT_FOUND)
+
+
+class CartSummary(APIView):
+    """Line totals, subtotal, item count and stock flags of the user's cart."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(summarize_cart(request.user))
+
+
+class BulkCart(APIView):
+    """
+    Upsert or remove many cart lines in one request, e.g. to merge a guest
+    cart at login: `{"items": [{"slug": ..., "quantity": ...}]}`, where
+    quantity 0 removes the product. Answers with the updated cart summary.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            items = request.data.get('items', []) if isinstance(request.data, dict) else None
+            update_cart(request.user, items)
+        except CheckoutError as e:
+            return Response({"error": e.message}, status=e.status_code)
+        return Response(summarize_cart(request.user))
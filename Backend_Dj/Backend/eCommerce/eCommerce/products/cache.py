@@ -0,0 +1,111 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from utility.routers import primary_reads
+
+GENERATION_KEY = "products:generation"
+CHANGED_AT_KEY = "products:changed_at"
+
+
+class CacheStats:
+    """Per-process hit / miss / invalidation counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+    def incr(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    return caches[getattr(settings, "PRODUCT_CACHE_ALIAS", "default")]
+
+
+def get_version():
+    """
+    Return `(generation, changed_at)` for the catalog. Every cache key embeds
+    the generation, so bumping it orphans all existing entries at once (they
+    simply expire). `changed_at` is the unix time of the last bump.
+    """
+    cache = get_cache()
+    version = cache.get_many([GENERATION_KEY, CHANGED_AT_KEY])
+    if len(version) < 2:
+        # Seed from the clock so an evicted counter never restarts at a value
+        # that old entries were stored under.
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        cache.add(CHANGED_AT_KEY, time.time(), None)
+        version = cache.get_many([GENERATION_KEY, CHANGED_AT_KEY])
+    return version.get(GENERATION_KEY, 0), version.get(CHANGED_AT_KEY, 0)
+
+
+def get_generation():
+    return get_version()[0]
+
+
+def invalidate():
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), None)
+    cache.set(CHANGED_AT_KEY, time.time(), None)
+    stats.incr("invalidations")
+
+
+def make_key(kind, ident, generation=None):
+    digest = hashlib.sha1(str(ident).encode("utf-8")).hexdigest()
+    generation = get_generation() if generation is None else generation
+    return f"products:{generation}:{kind}:{digest}"
+
+
+def get_or_build(kind, ident, build):
+    """
+    Read-through lookup. Returns `(data, hit)`; `build()` is only called on a
+    miss and its result is stored for PRODUCT_CACHE_TIMEOUT seconds.
+
+    A replica can still hold the rows from before the last change for a
+    while, and whatever is built now is cached under the new generation. So
+    for READ_REPLICA_MAX_LAG seconds after a change, builds read from the
+    primary.
+    """
+    cache = get_cache()
+    generation, changed_at = get_version()
+    key = make_key(kind, ident, generation)
+    data = cache.get(key)
+    if data is not None:
+        stats.incr("hits")
+        return data, True
+
+    stats.incr("misses")
+    if settings.READ_REPLICA and time.time() - changed_at < settings.READ_REPLICA_MAX_LAG:
+        with primary_reads():
+            data = build()
+    else:
+        data = build()
+    cache.set(key, data, getattr(settings, "PRODUCT_CACHE_TIMEOUT", 300))
+    return data, False
@@ -0,0 +1,239 @@
+"""
+Resized WebP / JPEG variants of product images.
+
+Variants live under IMAGE_DERIVATIVE_ROOT, mirroring the upload path:
+`products/images/tee.png` at card size in WebP is
+`<root>/products/images/tee.card.webp`. They are a cache: rendered after a
+product is saved, by `manage.py build_image_derivatives`, or on the first
+request for one, and re-rendered whenever the original is newer.
+"""
+import logging
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.urls import reverse
+from django.utils._os import safe_join
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+# Only uploads under this prefix have variants
+UPLOAD_PREFIX = 'products/images/'
+# What Pillow raises for an upload it can't read or won't decode
+UNREADABLE = (OSError, Image.DecompressionBombError)
+
+
+def original_path(name):
+    """
+    Absolute path of the upload `name`, or None if it isn't a product image.
+    """
+    name = posixpath.normpath(name or '')
+    if not name.startswith(UPLOAD_PREFIX):
+        return None
+    try:
+        return safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        return None
+
+
+def derivative_path(name, variant, fmt, root=None):
+    stem, _ = posixpath.splitext(posixpath.normpath(name))
+    return safe_join(root or settings.IMAGE_DERIVATIVE_ROOT, f'{stem}.{variant}.{fmt}')
+
+
+def render(source, target, width, fmt):
+    """Write `source` scaled down to `width` pixels wide (never up) to `target` as `fmt`."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+        if fmt == 'jpeg' and image.mode != 'RGB':
+            # JPEG has no alpha: flatten transparent PNGs onto white
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            image.save(tmp, **SAVE_OPTIONS[fmt])
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def _locate(name, variant, fmt, root=None):
+    width = settings.IMAGE_VARIANTS[variant]
+    if fmt not in settings.IMAGE_FORMATS:
+        raise KeyError(fmt)
+    source = original_path(name)
+    if source is None:
+        raise FileNotFoundError(name)
+    return source, derivative_path(name, variant, fmt, root), width
+
+
+def _is_fresh(source, target):
+    source_mtime = os.stat(source).st_mtime
+    try:
+        return os.stat(target).st_mtime >= source_mtime
+    except FileNotFoundError:
+        return False
+
+
+def ensure(name, variant, fmt, root=None):
+    """
+    Return the path of a fresh variant of upload `name`, rendering it if it
+    is missing or older than the original. Raises FileNotFoundError if the
+    original doesn't exist and KeyError for unknown variants or formats.
+    """
+    source, target, width = _locate(name, variant, fmt, root)
+    if not _is_fresh(source, target):
+        render(source, target, width, fmt)
+    return target
+
+
+_rendering = {}  # target path: [lock, waiters]
+_rendering_lock = threading.Lock()
+_render_slots = None
+
+
+@contextmanager
+def _rendering_target(target):
+    """Hold the lock of `target`, shared by every request rendering it."""
+    with _rendering_lock:
+        entry = _rendering.setdefault(target, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _rendering_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _rendering[target]
+
+
+def _slots():
+    global _render_slots
+    with _rendering_lock:
+        if _render_slots is None:
+            _render_slots = threading.BoundedSemaphore(settings.IMAGE_REQUEST_RENDERS)
+        return _render_slots
+
+
+def ensure_for_request(name, variant, fmt):
+    """
+    `ensure()` for the request thread. Requests arriving while a variant
+    is being rendered wait for that render instead of repeating it, and at
+    most IMAGE_REQUEST_RENDERS renders run at once in this process.
+    """
+    source, target, _ = _locate(name, variant, fmt)
+    if _is_fresh(source, target):
+        return target
+    with _rendering_target(target), _slots():
+        # Checks freshness again: the request we waited for rendered it
+        return ensure(name, variant, fmt)
+
+
+def ensure_all(name, root=None):
+    """Render every missing or stale variant of `name`; returns `(name, seconds, error)`."""
+    start = time.perf_counter()
+    try:
+        for variant in settings.IMAGE_VARIANTS:
+            for fmt in settings.IMAGE_FORMATS:
+                ensure(name, variant, fmt, root)
+    except Exception as exc:
+        return name, time.perf_counter() - start, str(exc) or exc.__class__.__name__
+    return name, time.perf_counter() - start, None
+
+
+def build_batch(names, workers=1, chunksize=4):
+    """
+    Render the variants of every upload in `names`, yielding `ensure_all`
+    results. Resizing is CPU bound, so more than one worker means a process
+    pool.
+    """
+    names = list(names)
+    # Resolved here: spawned workers don't see overridden settings
+    root = settings.IMAGE_DERIVATIVE_ROOT
+    if workers <= 1 or len(names) <= 1:
+        for name in names:
+            yield ensure_all(name, root)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        yield from pool.map(
+            ensure_all, names, [root] * len(names),
+            chunksize=max(1, min(chunksize, len(names) // workers)),
+        )
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS, thread_name_prefix='images'
+            )
+        return _executor
+
+
+def _build_in_worker(names):
+    for name in names:
+        if not os.path.exists(original_path(name)):
+            continue  # replaced or deleted since the save
+        _, _, error = ensure_all(name)
+        if error:
+            logger.warning(f"Could not build image variants of {name}: {error}")
+
+
+def enqueue(names):
+    """
+    Render the variants of `names` once the current transaction commits,
+    on the image worker pool (or inline when IMAGE_DERIVATIVES_ASYNC is off).
+    Losing a job only costs a slower first request.
+    """
+    names = [name for name in names if name and original_path(name) is not None]
+    if not names:
+        return
+    if settings.IMAGE_DERIVATIVES_ASYNC:
+        transaction.on_commit(lambda: get_executor().submit(_build_in_worker, names))
+    else:
+        transaction.on_commit(lambda: _build_in_worker(names))
+
+
+def variant_urls(name, request=None):
+    """
+    `{fmt: {variant: url, ..., 'srcset': ...}}` for upload `name`, or None
+    if it has no variants. The URLs render lazily, so they are always valid.
+    """
+    if original_path(name) is None:
+        return None
+    urls = {}
+    for fmt in settings.IMAGE_FORMATS:
+        urls[fmt] = {}
+        for variant in settings.IMAGE_VARIANTS:
+            url = reverse('product_image', kwargs={'variant': f'{variant}.{fmt}', 'name': name})
+            urls[fmt][variant] = request.build_absolute_uri(url) if request is not None else url
+        urls[fmt]['srcset'] = ', '.join(
+            f"{urls[fmt][variant]} {width}w" for variant, width in settings.IMAGE_VARIANTS.items()
+        )
+    return urls
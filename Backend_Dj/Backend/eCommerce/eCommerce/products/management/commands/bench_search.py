@@ -0,0 +1,76 @@
+import random
+import statistics
+import time
+from functools import reduce
+from operator import and_
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from products import search
+from products.models import BrandName, Category, Products
+from utility.benchmark import measure, throwaway_database
+
+WORDS = (
+    "cotton linen wool denim leather canvas running trail walking classic slim relaxed oversized "
+    "crew neck hooded zip pocket striped printed plain washed vintage summer winter travel sport"
+).split()
+SYLLABLES = "ka lo mi ra te su vi no pe da ri go ma lu ze".split()
+QUERIES = ["cotton", "slim denim", "hooded zip", "trail running sport", "vint", "brand 7 winter", "nomatch"]
+
+
+def vocabulary(rng, size=3000):
+    # Rarer made-up words, so most terms match a realistic share of the catalog
+    return sorted({"".join(rng.choices(SYLLABLES, k=3)) for _ in range(size)})
+
+
+def scan(query, limit):
+    # What filtering without the index costs: every word in any of the four columns
+    words = search.terms(query)
+    condition = reduce(and_, (
+        Q(title__icontains=word) | Q(decription__icontains=word)
+        | Q(brand__name__icontains=word) | Q(category__name__icontains=word)
+        for word in words
+    ))
+    return list(Products.objects.filter(condition).order_by('-id').values_list('pk', flat=True)[:limit])
+
+
+class Command(BaseCommand):
+    help = "Compare indexed product search against a LIKE scan (uses a throwaway database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help="Catalog size")
+        parser.add_argument('--repeat', type=int, default=10, help="Searches per measurement")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        rare = vocabulary(rng)
+        with throwaway_database():
+            brands = [BrandName.objects.create(name=f"Brand {i}") for i in range(50)]
+            categories = [Category.objects.create(name=f"Category {i}") for i in range(20)]
+            start = time.perf_counter()
+            Products.objects.bulk_create(
+                (Products(
+                    brand=rng.choice(brands), category=rng.choice(categories),
+                    title=" ".join([rng.choice(WORDS)] + rng.sample(rare, 2)),
+                    decription=" ".join(rng.choices(WORDS, k=5) + rng.choices(rare, k=20)),
+                    actual_price=20.0, discount_price=15.0, stock=10,
+                    front_imges='bench.png', back_imges='bench.png', slug=f'bench-{i}',
+                ) for i in range(options['products'])),
+                batch_size=5000,
+            )
+            self.stdout.write(f"loaded {options['products']} products in {time.perf_counter() - start:.1f}s")
+
+            _, elapsed, _ = measure(search.rebuild)
+            self.stdout.write(f"built the search index in {elapsed:.1f}s\n")
+
+            # The index ranks every match; the scan stops at the first 21 in id order
+            self.stdout.write(f"{'query':<22} {'matches':>8} {'index ms':>9} {'scan ms':>9}")
+            for query in QUERIES + [rare[0]]:
+                matches = len(search.search(query, options['products']))
+                indexed = [measure(search.search, query, 21)[1] for _ in range(options['repeat'])]
+                scanned = [measure(scan, query, 21)[1] for _ in range(options['repeat'])]
+                self.stdout.write(
+                    f"{query:<22} {matches:>8} "
+                    f"{statistics.median(indexed) * 1000:>9.1f} {statistics.median(scanned) * 1000:>9.1f}"
+                )
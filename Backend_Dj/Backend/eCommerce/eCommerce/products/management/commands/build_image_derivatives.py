@@ -0,0 +1,45 @@
+import os
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from products import images
+from products.models import Products
+
+
+class Command(BaseCommand):
+    help = "Render the missing or stale resized variants of every product image in a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Render processes")
+
+    def handle(self, *args, **options):
+        names = set()
+        for front, back in Products.objects.values_list('front_imges', 'back_imges'):
+            names.update((front, back))
+        names = sorted(
+            name for name in names
+            if images.original_path(name) is not None and os.path.exists(images.original_path(name))
+        )
+        if not names:
+            self.stdout.write("No product images to render")
+            return
+
+        timings = []
+        failed = 0
+        start = time.perf_counter()
+        for name, seconds, error in images.build_batch(names, options['workers']):
+            if error:
+                failed += 1
+                self.stderr.write(f"{name}: {error}")
+                continue
+            timings.append(seconds)
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"{name}: {seconds * 1000:.1f} ms")
+        elapsed = time.perf_counter() - start
+
+        summary = f"Processed {len(timings)} image(s) in {elapsed:.2f}s"
+        if timings:
+            summary += f" (per image median {statistics.median(timings) * 1000:.1f} ms)"
+        self.stdout.write(summary + f", {failed} failed")
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from products import search
+
+    connection = schema_editor.connection
+    if connection.vendor not in search.INDEXES:
+        return
+    index = search.INDEXES[connection.vendor]
+    Products = apps.get_model('products', 'Products')
+    with connection.cursor() as cursor:
+        index.create(cursor)
+        rows = search.documents(Products.objects.using(connection.alias))
+        if rows:
+            index.write(cursor, rows)
+
+
+def drop_index(apps, schema_editor):
+    from products import search
+
+    connection = schema_editor.connection
+    if connection.vendor in search.INDEXES:
+        with connection.cursor() as cursor:
+            search.INDEXES[connection.vendor].drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_products_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -34,6 +34,22 @@ class Products(BaseModel):
     back_imges = models.ImageField(upload_to="products/images/")
     slug = models.SlugField(unique=True)
 
+    class Meta:
+        indexes = [
+            # Matches the (created_at, id) keyset used to paginate the catalog
+            models.Index(fields=["-created_at", "-id"], name="products_created_id_idx"),
+            # Category / brand filters, newest first or by price
+            models.Index(fields=["category", "-created_at", "-id"], name="products_category_new_idx"),
+            models.Index(fields=["brand", "-created_at", "-id"], name="products_brand_new_idx"),
+            models.Index(fields=["category", "discount_price", "id"], name="products_category_price_idx"),
+            # Price sort and price range over the whole catalog
+            models.Index(fields=["discount_price", "id"], name="products_price_id_idx"),
+            # The unfiltered facet GROUP BY scans this index instead of the
+            # table; price or stock filters make it read rows through the
+            # price index instead
+            models.Index(fields=["category", "brand"], name="products_facet_idx"),
+        ]
+
     def __str__(self):
         return f"{self.brand} , ({self.title})"
     
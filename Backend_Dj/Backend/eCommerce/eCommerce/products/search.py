@@ -0,0 +1,173 @@
+"""
+Full-text index over product title, description, brand and category.
+
+SQLite keeps it in an FTS5 table, PostgreSQL in a weighted tsvector table
+with a GIN index; both are called `products_search` and keyed by product
+id. The signals in products.signals keep it current, `rebuild()` refills it
+after bulk loads.
+"""
+import re
+
+from django.db import connections, router
+from django.db.utils import NotSupportedError
+
+from products.models import Products
+
+TABLE = 'products_search'
+# Column weights: a title hit counts most, then brand / category, then description
+WEIGHTS = {'title': 4.0, 'brand': 2.0, 'category': 2.0, 'decription': 1.0}
+MAX_TERMS = 8
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def terms(query):
+    """Lower-cased words of a user query; everything else is dropped."""
+    return [word.lower() for word in WORD_RE.findall(query or '')][:MAX_TERMS]
+
+
+class SQLiteIndex:
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            "title, decription, brand, category, "
+            "tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    def delete(self, cursor, pks):
+        cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(pk,) for pk in pks])
+
+    def write(self, cursor, rows):
+        self.delete(cursor, [row[0] for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, title, decription, brand, category) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {TABLE}")
+
+    def match(self, words):
+        # Every word must appear, each as a prefix ("tee" finds "tees")
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def search(self, cursor, words, limit, after=None):
+        # bm25() is lower-is-better, negate it so scores sort like ts_rank
+        weights = ', '.join(str(WEIGHTS[column]) for column in ('title', 'decription', 'brand', 'category'))
+        sql = (
+            f"SELECT id, score FROM (SELECT rowid AS id, -bm25({TABLE}, {weights}) AS score "
+            f"FROM {TABLE} WHERE {TABLE} MATCH %s)"
+        )
+        params = [self.match(words)]
+        if after is not None:
+            sql += " WHERE score < %s OR (score = %s AND id > %s)"
+            params += [after[0], after[0], after[1]]
+        cursor.execute(sql + " ORDER BY score DESC, id LIMIT %s", params + [limit])
+        return cursor.fetchall()
+
+
+class PostgresIndex:
+    DOCUMENT = (
+        "setweight(to_tsvector('english', %s), 'A') || "
+        "setweight(to_tsvector('english', %s), 'B') || "
+        "setweight(to_tsvector('english', %s), 'B') || "
+        "setweight(to_tsvector('english', %s), 'C')"
+    )
+
+    def create(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+            "product_id bigint PRIMARY KEY, document tsvector NOT NULL)"
+        )
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {TABLE}_document_idx ON {TABLE} USING gin (document)")
+
+    def drop(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    def delete(self, cursor, pks):
+        cursor.execute(f"DELETE FROM {TABLE} WHERE product_id = ANY(%s)", [list(pks)])
+
+    def write(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (product_id, document) VALUES (%s, {self.DOCUMENT}) "
+            "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+            [(pk, title, brand, category, decription) for pk, title, decription, brand, category in rows],
+        )
+
+    def clear(self, cursor):
+        cursor.execute(f"TRUNCATE {TABLE}")
+
+    def match(self, words):
+        return ' & '.join(f"{word}:*" for word in words)
+
+    def search(self, cursor, words, limit, after=None):
+        sql = (
+            # ts_rank() is float4: widen it so the cursor's score compares equal
+            f"SELECT id, score FROM (SELECT product_id AS id, ts_rank(document, query)::float8 AS score "
+            f"FROM {TABLE}, to_tsquery('english', %s) query WHERE document @@ query) matches"
+        )
+        params = [self.match(words)]
+        if after is not None:
+            sql += " WHERE score < %s OR (score = %s AND id > %s)"
+            params += [after[0], after[0], after[1]]
+        cursor.execute(sql + " ORDER BY score DESC, id LIMIT %s", params + [limit])
+        return cursor.fetchall()
+
+
+INDEXES = {'sqlite': SQLiteIndex(), 'postgresql': PostgresIndex()}
+
+
+def get_index(connection):
+    try:
+        return INDEXES[connection.vendor]
+    except KeyError:
+        raise NotSupportedError(f"Product search is not available on {connection.vendor}")
+
+
+def documents(queryset):
+    """`(pk, title, decription, brand, category)` rows to index."""
+    return list(queryset.values_list('pk', 'title', 'decription', 'brand__name', 'category__name'))
+
+
+def index_products(pks, batch_size=2000):
+    """(Re)index the products with these primary keys."""
+    connection = connections[router.db_for_write(Products)]
+    index = get_index(connection)
+    products = Products.objects.using(connection.alias)
+    pks = list(pks)
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), batch_size):
+            index.write(cursor, documents(products.filter(pk__in=pks[start:start + batch_size])))
+
+
+def unindex_products(pks):
+    connection = connections[router.db_for_write(Products)]
+    with connection.cursor() as cursor:
+        get_index(connection).delete(cursor, pks)
+
+
+def rebuild(batch_size=2000):
+    """Empty the index and fill it from every product."""
+    connection = connections[router.db_for_write(Products)]
+    with connection.cursor() as cursor:
+        get_index(connection).clear(cursor)
+    index_products(
+        Products.objects.using(connection.alias).values_list('pk', flat=True), batch_size=batch_size
+    )
+
+
+def search(query, limit, after=None):
+    """
+    Return up to `limit` `(product id, score)` pairs matching every word of
+    `query`, best first. `after` is the `(score, id)` of the last row of the
+    previous page.
+    """
+    words = terms(query)
+    if not words:
+        return []
+    connection = connections[router.db_for_read(Products)]
+    with connection.cursor() as cursor:
+        return get_index(connection).search(cursor, words, limit, after)
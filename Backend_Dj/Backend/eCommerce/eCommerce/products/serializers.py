@@ -1,31 +1,49 @@
 from rest_framework import serializers
+from products import images
 from products.models import Category,Products,BrandName
+from utility.serializers import SideLoadMixin, SparseFieldsMixin
 
 
-class BrandNameSerializer(serializers.ModelSerializer):
+class ImageVariantsField(serializers.Field):
+    """Per-format variant URLs and a ready `srcset` for an image field."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return images.variant_urls(value.name, self.context.get('request'))
+
+
+class BrandNameSerializer(SideLoadMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = BrandName
         exclude = ['id','created_at','updated_at']
+        sideload_as = 'brands'
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SideLoadMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model=Category
         exclude = ['id','created_at','updated_at']
+        sideload_as = 'categories'
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     brand = serializers.PrimaryKeyRelatedField(queryset=BrandName.objects.all())  # Allows passing brand ID
     category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all())  # Allows passing category ID
     brand_detail = BrandNameSerializer(source="brand", read_only=True)  # Read-only brand details
     category_detail = CategorySerializer(source="category", read_only=True)  # Read-only category details
+    front_variants = ImageVariantsField(source="front_imges")
+    back_variants = ImageVariantsField(source="back_imges")
 
     class Meta:
         model = Products
         fields = [
             "id", "title", "decription", "actual_price", "discount_price", 
             "stock", "front_imges", "back_imges", "slug", "brand", "category", 
-            "brand_detail", "category_detail"
+            "brand_detail", "category_detail", "front_variants", "back_variants"
         ]
         read_only_fields = ["slug"]  # Slug should be auto-generated
+        select_related = ["brand", "category"]  # Loaded by utility.queryset.with_related
 
     def create(self, validated_data):
         """Custom create method to handle slug generation"""
@@ -0,0 +1,43 @@
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from products import cache, images, search
+from products.models import BrandName, Category, Products
+
+
+@receiver([post_save, post_delete], sender=Products)
+@receiver([post_save, post_delete], sender=BrandName)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    cache.invalidate()
+    if connection.in_atomic_block:
+        # A reader could have cached the pre-commit rows under the new
+        # generation in the meantime, so bump once more after commit.
+        transaction.on_commit(cache.invalidate)
+
+
+@receiver(post_save, sender=Products)
+def index_product(sender, instance, **kwargs):
+    search.index_products([instance.pk])
+
+
+@receiver(post_save, sender=Products)
+def build_image_variants(sender, instance, **kwargs):
+    # Fresh variants are skipped, so this only renders after a new upload
+    images.enqueue([instance.front_imges.name, instance.back_imges.name])
+
+
+@receiver(post_delete, sender=Products)
+def unindex_product(sender, instance, **kwargs):
+    search.unindex_products([instance.pk])
+
+
+@receiver(post_save, sender=BrandName)
+@receiver(post_save, sender=Category)
+def reindex_products_of(sender, instance, created, using, **kwargs):
+    # A renamed brand or category changes the documents of all its products
+    if not created:
+        related = 'brand' if sender is BrandName else 'category'
+        products = Products.objects.using(using).filter(**{related: instance})
+        search.index_products(products.values_list('pk', flat=True))
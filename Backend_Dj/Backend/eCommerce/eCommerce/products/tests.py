@@ -1,3 +1,555 @@
-from django.test import TestCase
+import gzip
+import io
+import os
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from orders.models import Order
+from products import cache, images, search
+from products.models import BrandName, Category, Products
+from utility.routers import ReplicaRouter, primary_reads
+from utility.storage import CompressedManifestStaticFilesStorage
+from utility.testing import QueryCountMixin
+
+
+def make_product(brand, category, **kwargs):
+    fields = {
+        "title": "Tee",
+        "decription": "Cotton tee",
+        "actual_price": 20.0,
+        "discount_price": 15.0,
+        "stock": 10,
+        "front_imges": "products/images/front.png",
+        "back_imges": "products/images/back.png",
+    }
+    fields.update(kwargs)
+    return Products.objects.create(brand=brand, category=category, **fields)
+
+
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        cache.stats.reset()
+
+
+class ProductPaginationTests(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = BrandName.objects.create(name="Wolfly")
+        category = Category.objects.create(name="T-Shirts")
+        cls.products = [make_product(brand, category, title=f"Tee {i}") for i in range(7)]
+        # Several rows share a timestamp so the id tie-breaker is exercised.
+        Products.objects.filter(pk__in=[p.pk for p in cls.products[:4]]).update(created_at=timezone.now())
+
+    def test_pages_cover_catalog_once_in_order(self):
+        url = reverse("product_view") + "?page_size=3"
+        seen = []
+        while url:
+            body = self.client.get(url).json()
+            seen.extend(row["id"] for row in body["results"])
+            url = body["next"]
+        expected = list(Products.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_last_page_has_no_cursor(self):
+        body = self.client.get(reverse("product_view"), {"page_size": 50}).json()
+        self.assertEqual(len(body["results"]), 7)
+        self.assertIsNone(body["next"])
+        self.assertIsNone(body["cursor"])
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse("product_view"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_all_flag_returns_plain_list(self):
+        body = self.client.get(reverse("product_view"), {"all": "true"}).json()
+        self.assertEqual(len(body), 7)
+
+
+class ProductQueryCountTests(QueryCountMixin, CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            brand = BrandName.objects.create(name=f"Brand {i}")
+            category = Category.objects.create(name=f"Category {i}")
+            cls.product = make_product(brand, category, title=f"Tee {i}")
+
+    def test_listing(self):
+        self.assertEndpointQueries(1, "get", reverse("product_view"))
+        self.assertEndpointQueries(1, "get", reverse("product_view") + "?all=true")
+
+    def test_detail(self):
+        self.assertEndpointQueries(1, "get", f"/products/product/{self.product.slug}/")
+
+
+class ProductCacheTests(QueryCountMixin, CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = BrandName.objects.create(name="Wolfly")
+        cls.category = Category.objects.create(name="T-Shirts")
+        cls.product = make_product(cls.brand, cls.category)
+        cls.detail_url = f"/products/product/{cls.product.slug}/"
+
+    def test_repeat_reads_are_served_from_cache(self):
+        first = self.assertEndpointQueries(1, "get", reverse("product_view"))
+        second = self.assertEndpointQueries(0, "get", reverse("product_view"))
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(cache.stats.snapshot()["hits"], 1)
+
+    def test_pages_are_cached_separately(self):
+        self.client.get(reverse("product_view"))
+        response = self.client.get(reverse("product_view"), {"page_size": 5})
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_product_edit_invalidates_detail(self):
+        self.client.get(self.detail_url)
+        self.product.title = "Renamed"
+        self.product.save()
+        response = self.assertEndpointQueries(1, "get", self.detail_url)
+        self.assertEqual(response.data["title"], "Renamed")
+
+    def test_brand_edit_invalidates_listing(self):
+        self.client.get(reverse("product_view"))
+        self.brand.name = "Neverend"
+        self.brand.save()
+        response = self.client.get(reverse("product_view"))
+        self.assertEqual(response.data["results"][0]["brand_detail"], {"name": "Neverend"})
+
+    def test_category_delete_invalidates_listing(self):
+        self.client.get(reverse("product_view"))
+        self.category.delete()
+        self.assertEqual(self.client.get(reverse("product_view")).data["results"], [])
+        self.assertGreaterEqual(cache.stats.snapshot()["invalidations"], 1)
+
+    def test_missing_product_is_not_cached(self):
+        self.assertEqual(self.client.get("/products/product/nope/").status_code, 404)
+        self.assertEqual(self.client.get("/products/product/nope/").status_code, 404)
+        self.assertEqual(cache.stats.snapshot()["hits"], 0)
+
+
+class ProductConditionalGetTests(QueryCountMixin, CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = BrandName.objects.create(name="Wolfly")
+        category = Category.objects.create(name="T-Shirts")
+        cls.product = make_product(brand, category)
+        cls.detail_url = f"/products/product/{cls.product.slug}/"
+
+    def test_matching_etag_is_not_modified(self):
+        first = self.client.get(reverse("product_view"))
+        self.assertTrue(first.has_header("ETag"))
+        self.assertTrue(first.has_header("Last-Modified"))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse("product_view"), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b"")
+
+    def test_if_modified_since(self):
+        first = self.client.get(self.detail_url)
+        second = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(second.status_code, 304)
+
+    def test_etag_varies_per_page_and_slug(self):
+        listing = self.client.get(reverse("product_view"))["ETag"]
+        page = self.client.get(reverse("product_view"), {"page_size": 5})["ETag"]
+        detail = self.client.get(self.detail_url)["ETag"]
+        self.assertEqual(len({listing, page, detail}), 3)
+
+    def test_edit_changes_etag(self):
+        first = self.client.get(self.detail_url)
+        self.product.stock = 3
+        self.product.save()
+        second = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data["stock"], 3)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+
+
+class ProductFilterTests(QueryCountMixin, CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.nike = BrandName.objects.create(name="Nike")
+        cls.puma = BrandName.objects.create(name="Puma")
+        cls.shoes = Category.objects.create(name="Shoes")
+        cls.shirts = Category.objects.create(name="Shirts")
+        cls.runner = make_product(cls.nike, cls.shoes, title="Runner", discount_price=80.0)
+        cls.sandal = make_product(cls.puma, cls.shoes, title="Sandal", discount_price=20.0, stock=0)
+        cls.tee = make_product(cls.puma, cls.shirts, title="Tee", discount_price=15.0)
+        cls.polo = make_product(cls.nike, cls.shirts, title="Polo", discount_price=35.0)
+
+    def titles(self, **params):
+        response = self.client.get(reverse("product_view"), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [product["title"] for product in response.data["results"]]
+
+    def test_filters(self):
+        self.assertEqual(self.titles(category=self.shoes.pk), ["Sandal", "Runner"])
+        self.assertEqual(self.titles(brand=f"{self.nike.pk},{self.puma.pk}", category=self.shirts.pk), ["Polo", "Tee"])
+        self.assertEqual(self.titles(min_price=20, max_price=80, in_stock="true"), ["Polo", "Runner"])
+
+    def test_sorting_pages_by_price(self):
+        url = reverse("product_view") + "?sort=-price&page_size=3"
+        seen = []
+        while url:
+            body = self.client.get(url).json()
+            seen.extend(row["title"] for row in body["results"])
+            url = body["next"]
+        self.assertEqual(seen, ["Runner", "Polo", "Sandal", "Tee"])
+        self.assertEqual(
+            [row["title"] for row in self.client.get(reverse("product_view"), {"sort": "price", "all": "true"}).json()],
+            ["Tee", "Sandal", "Polo", "Runner"],
+        )
+
+    def test_facets_come_from_one_grouped_query(self):
+        url = reverse("product_view") + f"?facets=true&category={self.shoes.pk}&in_stock=1"
+        facets = self.assertEndpointQueries(2, "get", url).data["facets"]
+        # Categories ignore the category filter, brands honour it
+        self.assertEqual(
+            [(entry["name"], entry["count"]) for entry in facets["categories"]], [("Shirts", 2), ("Shoes", 1)]
+        )
+        self.assertEqual([(entry["name"], entry["count"]) for entry in facets["brands"]], [("Nike", 1)])
+
+    def test_invalid_parameters(self):
+        for params in ({"category": "x"}, {"min_price": "cheap"}, {"sort": "name"}):
+            self.assertEqual(self.client.get(reverse("product_view"), params).status_code, 400)
+
+    @skipUnless(connection.vendor == "sqlite", "plans are checked on SQLite")
+    def test_query_plans_use_the_composite_indexes(self):
+        # EXPLAIN the SQL the view runs: the index each query should use
+        requests = (
+            ({"category": self.shoes.pk}, ["products_category_new_idx"]),
+            ({"brand": self.nike.pk}, ["products_brand_new_idx"]),
+            ({"category": self.shoes.pk, "sort": "price"}, ["products_category_price_idx"]),
+            ({"sort": "-price"}, ["products_price_id_idx"]),
+            ({"facets": "true"}, ["products_created_id_idx", "COVERING INDEX products_facet_idx"]),
+            # Filtered facets read the matching rows through the price index
+            ({"facets": "true", "min_price": 20, "in_stock": 1}, ["products_created_id_idx", "products_price_id_idx"]),
+        )
+        for params, indexes in requests:
+            with self.subTest(**params):
+                cache.get_cache().clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(self.client.get(reverse("product_view"), params).status_code, 200)
+                self.assertEqual(len(queries), len(indexes))
+                for query, index in zip(queries, indexes):
+                    with connection.cursor() as cursor:
+                        cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                        self.assertIn(index, " ".join(row[-1] for row in cursor.fetchall()))
+
+
+class ProductPayloadTests(QueryCountMixin, CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        brand, category = BrandName.objects.create(name="Nike"), Category.objects.create(name="Shoes")
+        for i in range(30):
+            make_product(brand, category, title=f"Tee {i}", decription="Soft cotton tee with a relaxed fit. " * 4)
+
+    def test_sparse_fields_and_sideload(self):
+        response = self.assertEndpointQueries(
+            1, "get", reverse("product_view"), {"fields": "title,brand_detail", "sideload": "true"}
+        )
+        brand = BrandName.objects.get()
+        self.assertEqual(response.data["results"][0], {"title": "Tee 29", "brand_detail": brand.pk})
+        self.assertEqual(response.data["included"], {"brands": {str(brand.pk): {"name": "Nike"}}})
+        listing = self.client.get(reverse("product_view"), {"all": "true", "fields": "slug"}).data
+        self.assertEqual(set(listing[0]), {"slug"})
+        self.assertEqual(self.client.get(reverse("product_view"), {"fields": "price"}).status_code, 400)
+
+    def test_large_json_is_compressed(self):
+        plain = self.client.get(reverse("product_view"))
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", plain["Vary"])
+
+        compressed = self.client.get(reverse("product_view"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertLess(len(compressed.content), len(plain.content) // 3)
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertTrue(compressed["ETag"].startswith('W/"'))
+        self.assertEqual(
+            self.client.get(reverse("product_view"), HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=compressed["ETag"]).status_code,
+            304,
+        )
+
+        with override_settings(COMPRESSION_MIN_SIZE=10 ** 6):
+            self.assertFalse(self.client.get(reverse("product_view"), HTTP_ACCEPT_ENCODING="gzip").has_header("Content-Encoding"))
+
+
+class ProductSearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.nike = BrandName.objects.create(name="Nike")
+        self.puma = BrandName.objects.create(name="Puma")
+        self.shoes = Category.objects.create(name="Shoes")
+        self.shirts = Category.objects.create(name="Shirts")
+        self.runner = make_product(self.nike, self.shoes, title="Running shoe", decription="Light trainer")
+        self.tee = make_product(self.puma, self.shirts, title="Cotton tee", decription="For running errands")
+        make_product(self.puma, self.shoes, title="Sandal", decription="Beach wear")
+
+    def slugs(self, query, **params):
+        response = self.client.get(reverse("product_search"), {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [product["slug"] for product in response.data["results"]]
+
+    def test_title_matches_rank_above_description(self):
+        self.assertEqual(self.slugs("running"), [self.runner.slug, self.tee.slug])
+
+    def test_brand_category_and_prefix(self):
+        self.assertEqual(self.slugs("nik"), [self.runner.slug])
+        self.assertEqual(self.slugs("puma shoes"), [Products.objects.get(title="Sandal").slug])
+        self.assertEqual(self.slugs('"shirts" OR (nike'), [])
+
+    def test_index_follows_saves_renames_and_deletes(self):
+        self.tee.title = "Linen shirt"
+        self.tee.save()
+        self.assertEqual(self.slugs("linen"), [self.tee.slug])
+        self.nike.name = "Adidas"
+        self.nike.save()
+        self.assertEqual(self.slugs("adidas"), [self.runner.slug])
+        self.assertEqual(self.slugs("nike"), [])
+        self.runner.delete()
+        self.assertEqual(self.slugs("adidas"), [])
+
+    def page_through(self, query, page_size):
+        response = self.client.get(reverse("product_search"), {"q": query, "page_size": page_size})
+        seen = [product["slug"] for product in response.data["results"]]
+        for _ in range(50):  # a cursor that repeats rows would loop forever
+            if not response.data["next"]:
+                return seen
+            response = self.client.get(response.data["next"])
+            seen += [product["slug"] for product in response.data["results"]]
+        self.fail("the cursor never reached the last page")
+
+    def test_pages_follow_the_cursor(self):
+        for i in range(5):
+            make_product(self.nike, self.shoes, title=f"Trail {i}")
+        seen = self.page_through("trail", 2)
+        self.assertEqual(sorted(seen), sorted(Products.objects.filter(title__startswith="Trail").values_list("slug", flat=True)))
+        self.assertEqual(len(seen), 5)
+
+    def test_pages_of_mixed_scores_and_ties(self):
+        # Scores differ with how often the word appears and tie within each group;
+        # on PostgreSQL they are fractional ts_rank values the cursor has to round-trip
+        for i in range(12):
+            make_product(self.nike, self.shoes, title=f"Trail {i}", decription="trail " * (i % 4))
+        expected = [Products.objects.get(pk=pk).slug for pk, _ in search.search("trail", 100)]
+        self.assertEqual(len(expected), 12)
+        for page_size in (1, 2, 5):
+            self.assertEqual(self.page_through("trail", page_size), expected)
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get(reverse("product_search"), {"q": " ?! "}).status_code, 400)
+        self.assertEqual(search.search("", 10), [])
+
+
+class ProductImageTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.root = media.name
+        settings = override_settings(
+            MEDIA_ROOT=self.root, IMAGE_DERIVATIVE_ROOT=os.path.join(self.root, "derivatives"),
+            IMAGE_DERIVATIVES_ASYNC=False,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        os.makedirs(os.path.join(self.root, "products/images"))
+        # Transparent, so the JPEG variants have to flatten it
+        Image.new("RGBA", (2000, 1000), (200, 30, 30, 128)).save(os.path.join(self.root, "products/images/front.png"))
+        self.product = make_product(BrandName.objects.create(name="Nike"), Category.objects.create(name="Shoes"))
+
+    def fetch(self, variant, name="products/images/front.png"):
+        return self.client.get(reverse("product_image", kwargs={"variant": variant, "name": name}))
+
+    def test_variants_are_resized_and_cached_on_disk(self):
+        response = self.fetch("card.webp")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("max-age=", response["Cache-Control"])
+        path = images.derivative_path("products/images/front.png", "card", "webp")
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (480, 240))
+        with mock.patch.object(images, "render") as render:
+            again = self.client.get(response.wsgi_request.path, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+        render.assert_not_called()
+
+        with Image.open(images.ensure("products/images/front.png", "full", "jpeg")) as image:
+            self.assertEqual((image.format, image.mode, image.size), ("JPEG", "RGB", (1200, 600)))
+
+    def test_stale_variants_are_rendered_again(self):
+        path = images.ensure("products/images/front.png", "thumb", "webp")
+        os.utime(path, (0, 0))
+        images.ensure("products/images/front.png", "thumb", "webp")
+        self.assertGreater(os.stat(path).st_mtime, 0)
+
+    def test_unknown_variants_and_paths_are_404(self):
+        self.assertEqual(self.fetch("huge.webp").status_code, 404)
+        self.assertEqual(self.fetch("card.gif").status_code, 404)
+        self.assertEqual(self.fetch("card.webp", "products/images/missing.png").status_code, 404)
+        self.assertEqual(self.fetch("card.webp", "products/images/../../secret.png").status_code, 404)
+        self.assertEqual(self.fetch("card.webp", "invoices/front.png").status_code, 404)
+
+    def test_unreadable_uploads_are_404(self):
+        with open(os.path.join(self.root, "products/images/broken.png"), "wb") as f:
+            f.write(b"not a png")
+        with self.assertLogs("products.views", "WARNING"):
+            self.assertEqual(self.fetch("card.webp", "products/images/broken.png").status_code, 404)
+
+    def test_concurrent_requests_render_a_variant_once(self):
+        render, started, release = images.render, threading.Event(), threading.Event()
+
+        def slow_render(*args):
+            started.set()
+            release.wait(5)
+            render(*args)
+
+        statuses = []
+        with mock.patch.object(images, "render", side_effect=slow_render) as mocked:
+            first = threading.Thread(target=lambda: statuses.append(self.fetch("card.webp").status_code))
+            first.start()
+            started.wait(5)
+            second = threading.Thread(target=lambda: statuses.append(self.fetch("card.webp").status_code))
+            second.start()
+            second.join(0.2)
+            self.assertTrue(second.is_alive())  # waiting for the first render
+            release.set()
+            first.join()
+            second.join()
+        self.assertEqual(statuses, [200, 200])
+        self.assertEqual(mocked.call_count, 1)
+
+    def test_serializers_expose_srcsets(self):
+        product = self.client.get(reverse("product_view"), {"all": "true"}).data[0]
+        webp = product["front_variants"]["webp"]
+        self.assertEqual(set(product["front_variants"]), {"webp", "jpeg"})
+        self.assertEqual(
+            webp["srcset"], f"{webp['thumb']} 160w, {webp['card']} 480w, {webp['full']} 1200w"
+        )
+        self.assertTrue(webp["card"].endswith("/images/card.webp/products/images/front.png"))
+
+    def test_saving_and_backfill_render_every_variant(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        for variant in ("thumb", "card", "full"):
+            for fmt in ("webp", "jpeg"):
+                self.assertTrue(os.path.exists(images.derivative_path("products/images/front.png", variant, fmt)))
+
+        os.remove(images.derivative_path("products/images/front.png", "card", "jpeg"))
+        call_command("build_image_derivatives", workers=1, stdout=io.StringIO())
+        self.assertTrue(os.path.exists(images.derivative_path("products/images/front.png", "card", "jpeg")))
+
+
+class FileServingTests(SimpleTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.root = media.name
+        settings = override_settings(
+            MEDIA_ROOT=os.path.join(self.root, "media"), STATIC_ROOT=os.path.join(self.root, "static"),
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        os.makedirs(os.path.join(self.root, "media/products/images"))
+        with open(os.path.join(self.root, "media/products/images/front.png"), "wb") as f:
+            f.write(b"0123456789")
+
+    def test_media_has_cache_headers_and_ranges(self):
+        response = self.client.get("/media/products/images/front.png")
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertIn("max-age=", response["Cache-Control"])
+        self.assertEqual(self.client.get(response.wsgi_request.path, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        partial = self.client.get("/media/products/images/front.png", HTTP_RANGE="bytes=2-4")
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial["Content-Length"], "3")
+        self.assertEqual(b"".join(partial.streaming_content), b"234")
+        self.assertEqual(self.client.get("/media/../secret").status_code, 404)
+        self.assertEqual(self.client.get("/media/products/images/missing.png").status_code, 404)
+
+    def test_sendfile_backends_hand_off_to_the_web_server(self):
+        path = os.path.join(self.root, "media/products/images/front.png")
+        with override_settings(
+            SENDFILE_BACKEND="nginx", SENDFILE_NGINX_LOCATIONS={os.path.join(self.root, "media"): "/_protected/media/"}
+        ):
+            response = self.client.get("/media/products/images/front.png")
+        self.assertEqual(response["X-Accel-Redirect"], "/_protected/media/products/images/front.png")
+        self.assertEqual(response.content, b"")
+        with override_settings(SENDFILE_BACKEND="xsendfile"):
+            response = self.client.get("/media/products/images/front.png", HTTP_RANGE="bytes=2-4")
+        self.assertEqual((response.status_code, response["X-Sendfile"]), (200, path))
+
+    def test_collected_static_is_hashed_precompressed_and_immutable(self):
+        source = os.path.join(self.root, "source")
+        os.makedirs(source)
+        with open(os.path.join(source, "app.css"), "w") as f:
+            f.write("body { color: black; }\n" * 100)
+        storage = CompressedManifestStaticFilesStorage(location=os.path.join(self.root, "static"))
+        with open(os.path.join(source, "app.css"), "rb") as f:
+            storage.save("app.css", f)
+        list(storage.post_process({"app.css": (FileSystemStorage(location=source), "app.css")}))
+        hashed = storage.stored_name("app.css")
+        self.assertNotEqual(hashed, "app.css")
+        self.assertTrue(storage.exists(hashed + ".gz"))
+
+        response = self.client.get(f"/static/{hashed}", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), storage.open(hashed).read())
+
+        plain = self.client.get("/static/app.css")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertNotIn("immutable", plain["Cache-Control"])
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    router = ReplicaRouter()
+
+    def test_without_replica_everything_uses_the_primary(self):
+        with override_settings(READ_REPLICA=None):
+            self.assertIsNone(self.router.db_for_read(Products))
+
+    @override_settings(READ_REPLICA='replica', READ_REPLICA_APPS={'products'})
+    def test_catalog_reads_go_to_the_replica(self):
+        self.assertEqual(self.router.db_for_read(Products), 'replica')
+        self.assertEqual(self.router.db_for_read(BrandName), 'replica')
+        self.assertIsNone(self.router.db_for_read(Order))
+        self.assertEqual(self.router.db_for_write(Products), DEFAULT_DB_ALIAS)
+        self.assertFalse(self.router.allow_migrate('replica', 'products'))
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'products'))
+
+    @override_settings(READ_REPLICA='replica', READ_REPLICA_APPS={'products'})
+    def test_primary_reads_block(self):
+        with primary_reads():
+            self.assertEqual(self.router.db_for_read(Products), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.router.db_for_read(Products), 'replica')
+
+    @override_settings(READ_REPLICA='replica', READ_REPLICA_APPS={'products'}, READ_REPLICA_MAX_LAG=10)
+    def test_cache_misses_right_after_a_change_read_the_primary(self):
+        cache.get_cache().clear()
+        build = lambda: self.router.db_for_read(Products)
+        cache.invalidate()
+        self.assertEqual(cache.get_or_build('list', 'a', build), (DEFAULT_DB_ALIAS, False))
+        with mock.patch.object(cache.time, 'time', return_value=time.time() + 11):
+            self.assertEqual(cache.get_or_build('list', 'b', build), ('replica', False))
+
+    @override_settings(READ_REPLICA='replica', READ_REPLICA_APPS={'products'})
+    def test_reads_inside_a_transaction_stay_on_the_primary(self):
+        with mock.patch.object(connections[DEFAULT_DB_ALIAS], 'in_atomic_block', True):
+            self.assertEqual(self.router.db_for_read(Products), DEFAULT_DB_ALIAS)
@@ -1,7 +1,10 @@
 from django.urls import path
-from products.views import ProductView,ProductDetails
+from products.views import ProductView,ProductDetails,ProductCacheStats,ProductSearch,product_image
 
 urlpatterns = [
     path('',ProductView.as_view(),name="product_view"),
+    path('search/',ProductSearch.as_view(),name="product_search"),
     path('product/<slug>/',ProductDetails.as_view(),name="product_view"),
-]
\ No newline at end of file
+    path('images/<str:variant>/<path:name>',product_image,name="product_image"),
+    path('cache-stats/',ProductCacheStats.as_view(),name="product_cache_stats"),
+]
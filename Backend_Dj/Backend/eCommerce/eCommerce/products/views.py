@@ -1,26 +1,230 @@
+import hashlib
+import logging
+import os
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.models import Count
+from django.http import Http404
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition, require_safe
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+from products import cache, images, search
 from products.serializers import ProductSerializer
 from products.models import Products
+from utility.files import file_response
+from utility.pagination import KeysetPagination, RankedPagination
+from utility.queryset import with_related
+from utility.serializers import requested_fields, sideload_context, with_included
+
+logger = logging.getLogger(__name__)
+
+
+def cached_response(kind, ident, build):
+    data, hit = cache.get_or_build(kind, ident, build)
+    response = Response(data)
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+def catalog_etag(request, *args, **kwargs):
+    # Strong validator: changes whenever the catalog generation is bumped,
+    # and differs per page / filter / slug.
+    generation, _ = cache.get_version()
+    ident = f"{generation}:{request.build_absolute_uri()}"
+    return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    _, changed_at = cache.get_version()
+    return datetime.fromtimestamp(changed_at, tz=timezone.utc)
+
+
+# Answers If-None-Match / If-Modified-Since with a 304 before the view runs
+catalog_condition = method_decorator(
+    condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+)
 
 
 class ProductView(APIView):
+    """
+    Catalog listing, one keyset page at a time. Optional filters:
+    `category` / `brand` (comma separated ids), `min_price` / `max_price` on
+    the discounted price, `in_stock=true`, and `sort` (newest, price or
+    -price). `facets=true` adds per-category and per-brand counts;
+    `fields=` and `sideload=true` trim the payload (utility.serializers).
+    """
+    pagination_class = KeysetPagination
+    # Keyset orderings end with a unique column; each has a matching index
+    orderings = {
+        'newest': ('-created_at', '-id'),
+        'price': ('discount_price', 'id'),
+        '-price': ('-discount_price', '-id'),
+    }
+
+    @catalog_condition
     def get(self,request):
-        product=Products.objects.all()
-        serializer = ProductSerializer(product,many=True)
-        return Response(serializer.data)
+        # Pages and filters are all in the query string, the host goes into the "next" link
+        return cached_response('list', request.build_absolute_uri(), lambda: self.build(request))
+
+    def parse_ids(self, param):
+        value = self.request.query_params.get(param)
+        if not value:
+            return set()
+        try:
+            return {int(pk) for pk in value.split(',')}
+        except ValueError:
+            raise ValidationError({param: "Expected comma separated ids"})
+
+    def parse_price(self, param):
+        value = self.request.query_params.get(param)
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            raise ValidationError({param: "Expected a number"})
+
+    def filter_queryset(self, queryset):
+        """
+        Apply the price and stock filters. Category and brand are returned
+        separately so facets can count across them.
+        """
+        params = self.request.query_params
+        for param, lookup in (('min_price', 'discount_price__gte'), ('max_price', 'discount_price__lte')):
+            price = self.parse_price(param)
+            if price is not None:
+                queryset = queryset.filter(**{lookup: price})
+        if params.get('in_stock') in ('1', 'true'):
+            queryset = queryset.filter(stock__gt=0)
+        return queryset, self.parse_ids('category'), self.parse_ids('brand')
+
+    def facet_counts(self, queryset, categories, brands):
+        """
+        Product counts per category and per brand, from one GROUP BY over
+        (category, brand). Each facet honours the other facet's selection
+        but not its own, so picking a category still shows its siblings.
+        """
+        rows = queryset.order_by().values(
+            'category_id', 'category__name', 'brand_id', 'brand__name'
+        ).annotate(count=Count('id'))
+        facets = {'categories': {}, 'brands': {}}
+        for row in rows:
+            if not brands or row['brand_id'] in brands:
+                entry = facets['categories'].setdefault(
+                    row['category_id'], {'id': row['category_id'], 'name': row['category__name'], 'count': 0}
+                )
+                entry['count'] += row['count']
+            if not categories or row['category_id'] in categories:
+                entry = facets['brands'].setdefault(
+                    row['brand_id'], {'id': row['brand_id'], 'name': row['brand__name'], 'count': 0}
+                )
+                entry['count'] += row['count']
+        return {
+            name: sorted(counts.values(), key=lambda entry: (-entry['count'], entry['name']))
+            for name, counts in facets.items()
+        }
+
+    def build(self, request):
+        sort = request.query_params.get('sort', 'newest')
+        if sort not in self.orderings:
+            raise ValidationError({'sort': f"Must be one of {', '.join(self.orderings)}"})
+        filtered, categories, brands = self.filter_queryset(Products.objects.all())
+        product = filtered
+        if categories:
+            product = product.filter(category_id__in=categories)
+        if brands:
+            product = product.filter(brand_id__in=brands)
+        product = with_related(product, ProductSerializer)
+        fields, context = requested_fields(request), sideload_context(request)
+
+        # ?all=true keeps the old unpaginated list for clients that need it
+        if request.query_params.get('all') in ('1', 'true'):
+            serializer = ProductSerializer(
+                product.order_by(*self.orderings[sort]), many=True, fields=fields, context=context
+            )
+            return with_included(serializer.data, context)
+
+        paginator = self.pagination_class()
+        paginator.ordering = self.orderings[sort]
+        page = paginator.paginate_queryset(product, request, view=self)
+        serializer = ProductSerializer(page, many=True, fields=fields, context=context)
+        data = with_included(paginator.get_paginated_response(serializer.data).data, context)
+        if request.query_params.get('facets') in ('1', 'true'):
+            data['facets'] = self.facet_counts(filtered, categories, brands)
+        return data
 
 
 
 class ProductDetails(APIView):
+    @catalog_condition
     def get(self, request, slug=None):  # <-- Ensure slug is optional
         if not slug:
             return Response({"error": "Slug is required"}, status=400)
 
         try:
-            product = Products.objects.get(slug=slug)
-            serializer = ProductSerializer(product)
-            return Response(serializer.data)
+            return cached_response('detail', slug, lambda: self.build(slug))
         except Products.DoesNotExist:
             return Response({"error": "Product not found"}, status=404)
+
+    def build(self, slug):
+        product = with_related(Products.objects.all(), ProductSerializer).get(slug=slug)
+        return ProductSerializer(product).data
+
+
+class ProductSearch(APIView):
+    """Ranked full-text search: ?q=words, paginated with ?cursor=."""
+    pagination_class = RankedPagination
+
+    @catalog_condition
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        if not search.terms(query):
+            return Response({"error": "Search query 'q' is required"}, status=400)
+        return cached_response('search', request.build_absolute_uri(), lambda: self.build(request, query))
+
+    def build(self, request, query):
+        paginator = self.pagination_class()
+        page = paginator.paginate_ranked(
+            lambda limit, after: search.search(query, limit, after),
+            with_related(Products.objects.all(), ProductSerializer),
+            request,
+        )
+        context = sideload_context(request)
+        serializer = ProductSerializer(page, many=True, fields=requested_fields(request), context=context)
+        return with_included(paginator.get_paginated_response(serializer.data).data, context)
+
+
+@require_safe
+def product_image(request, variant, name):
+    """
+    A resized variant of a product image, `<variant>.<format>` (e.g.
+    `card.webp`), rendered on the first request and served from disk after.
+    """
+    variant, _, fmt = variant.partition('.')
+    source = images.original_path(name)
+    if variant not in settings.IMAGE_VARIANTS or fmt not in settings.IMAGE_FORMATS or source is None:
+        raise Http404("No such image variant")
+    try:
+        path = images.ensure_for_request(name, variant, fmt)
+    except FileNotFoundError:
+        raise Http404("No such image")
+    except images.UNREADABLE as e:
+        logger.warning(f"Could not render {variant}.{fmt} of {name}: {e}")
+        raise Http404("No such image")
+    stat = os.stat(path)
+    return file_response(
+        request, path, images.CONTENT_TYPES[fmt], etag=f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+        cache_control=f'public, max-age={settings.IMAGE_CACHE_MAX_AGE}',
+    )
+
+
+class ProductCacheStats(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache.stats.snapshot())
@@ -0,0 +1,30 @@
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def throwaway_database():
+    """
+    Run a benchmark against a freshly migrated test database (the same one
+    `manage.py test` would build) so the real data is never touched.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=False)
+
+
+def measure(func, *args, **kwargs):
+    """
+    Call `func` once and return `(result, seconds, query_count)`.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+    return result, elapsed, len(queries)
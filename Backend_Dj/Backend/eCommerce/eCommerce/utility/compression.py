@@ -0,0 +1,54 @@
+import gzip
+from collections import namedtuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# `best` is for files compressed once ahead of time, `fast` for responses
+Coding = namedtuple('Coding', 'compress suffix best fast')
+
+
+def _brotli(data, level):
+    return brotli.compress(data, quality=level)
+
+
+def _gzip(data, level):
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+# Content-Encoding -> Coding, preferred first
+ENCODINGS = {'gzip': Coding(_gzip, '.gz', best=9, fast=6)}
+if brotli is not None:
+    ENCODINGS = {'br': Coding(_brotli, '.br', best=11, fast=4), **ENCODINGS}
+
+
+def accepted_encodings(header):
+    """`{coding: q-value}` from an Accept-Encoding header."""
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, *params = [piece.strip() for piece in part.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            accepted[coding.lower()] = quality
+    return accepted
+
+
+def negotiate(header, available=None):
+    """
+    Pick the first coding in `available` (default: every one in ENCODINGS)
+    that an Accept-Encoding header allows, or None for identity.
+    """
+    accepted = accepted_encodings(header)
+    for coding in available if available is not None else ENCODINGS:
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
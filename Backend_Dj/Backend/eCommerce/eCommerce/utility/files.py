@@ -0,0 +1,203 @@
+"""
+Serving files from disk: media, collected static files and invoices.
+
+Responses carry an ETag, Cache-Control and single byte-range support. With
+SENDFILE_BACKEND set to 'nginx' or 'xsendfile' the web server sends the
+bytes instead of the worker. Otherwise the file is streamed from Python as
+an open file, which WSGI servers whose `wsgi.file_wrapper` uses
+os.sendfile (gunicorn, uWSGI) send zero-copy, ranges included.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.http import require_safe
+
+from utility.compression import ENCODINGS, negotiate
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# ManifestStaticFilesStorage names: app.3f2a9c1b7e4d.js
+HASHED_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def parse_range(header, size):
+    """
+    Parse a single `bytes=` range against a file of `size` bytes and return
+    `(start, end)` inclusive, None if the header should be ignored (absent,
+    malformed or multi-range), or False if it can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # bytes=-N: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class FileRange:
+    """
+    Bytes `start`..`end` (inclusive) of an open file, for FileResponse. It
+    keeps fileno() and leaves the file positioned at `start`, which is all
+    a sendfile-based `wsgi.file_wrapper` needs to send just the range.
+    """
+
+    def __init__(self, file, start, end):
+        self.file = file
+        self.name = file.name
+        self.remaining = end - start + 1
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def offload(path):
+    """
+    `(header, value)` handing `path` to the web server under
+    SENDFILE_BACKEND, or None to send it from Python.
+    """
+    if settings.SENDFILE_BACKEND == 'xsendfile':
+        return 'X-Sendfile', os.path.abspath(path)
+    if settings.SENDFILE_BACKEND == 'nginx':
+        path = os.path.abspath(path)
+        for root, location in settings.SENDFILE_NGINX_LOCATIONS.items():
+            root = os.path.abspath(root)
+            if os.path.commonpath([root, path]) == root:
+                relative = os.path.relpath(path, root).replace(os.sep, '/')
+                return 'X-Accel-Redirect', location + quote(relative)
+    return None
+
+
+def file_response(request, path, content_type, etag=None, filename=None, cache_control=None, encoding=None):
+    """
+    Serve `path` with ETag / If-None-Match handling and single byte-range
+    support (206 / 416), either offloaded to the web server or streamed.
+    `encoding` is the Content-Encoding of a precompressed file.
+    """
+    etag = quote_etag(etag) if etag else None
+    if etag and etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        if cache_control:
+            response['Cache-Control'] = cache_control
+        return response
+
+    header = offload(path)
+    if header is not None:
+        # The web server answers Range itself
+        response = HttpResponse(content_type=content_type)
+        response[header[0]] = header[1]
+        if filename:
+            response['Content-Disposition'] = f'inline; filename="{filename}"'
+    else:
+        response = _stream(request, path, content_type, etag, filename)
+
+    response['Accept-Ranges'] = 'bytes'
+    if etag:
+        response['ETag'] = etag
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+def _stream(request, path, content_type, etag, filename):
+    size = os.path.getsize(path)
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if byte_range is not None and if_range and if_range != etag:
+        byte_range = None  # the client's copy is stale, send everything
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is not None:
+        start, end = byte_range
+        response = FileResponse(
+            FileRange(open(path, 'rb'), start, end), status=206, content_type=content_type, filename=filename
+        )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        return response
+    return FileResponse(open(path, 'rb'), content_type=content_type, filename=filename)
+
+
+def serve(request, path, document_root, cache_control, precompressed=False):
+    """
+    Serve file `path` under `document_root`. With `precompressed`, a `.br`
+    or `.gz` sibling written by collectstatic is sent instead when the
+    client accepts it (the web server does this itself when offloading).
+    """
+    try:
+        full_path = safe_join(document_root, posixpath.normpath(path).lstrip('/'))
+    except SuspiciousFileOperation:
+        raise Http404("No such file")
+    if not os.path.isfile(full_path):
+        raise Http404("No such file")
+    content_type, _ = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    encoding = None
+    if precompressed and offload(full_path) is None:
+        available = [name for name, coding in ENCODINGS.items() if os.path.isfile(full_path + coding.suffix)]
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING'), available) if available else None
+        if encoding:
+            full_path += ENCODINGS[encoding].suffix
+
+    stat = os.stat(full_path)
+    response = file_response(
+        request, full_path, content_type, etag=f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+        cache_control=cache_control, encoding=encoding,
+    )
+    if precompressed:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Uploaded files under MEDIA_URL."""
+    return serve(request, path, settings.MEDIA_ROOT, f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}')
+
+
+@require_safe
+def serve_static(request, path):
+    """
+    Collected static files under STATIC_URL, for deployments without a CDN
+    or web server in front. Content-hashed names are cached for a year.
+    """
+    if HASHED_RE.search(path):
+        cache_control = IMMUTABLE
+    else:
+        cache_control = f'public, max-age={settings.STATIC_CACHE_MAX_AGE}'
+    return serve(request, path, settings.STATIC_ROOT, cache_control, precompressed=True)
@@ -0,0 +1,50 @@
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from utility.compression import ENCODINGS, negotiate
+
+STRONG_ETAG_RE = re.compile(r'^\s*"')
+
+
+class CompressionMiddleware:
+    """
+    Compress API responses of COMPRESSION_CONTENT_TYPES larger than
+    COMPRESSION_MIN_SIZE bytes with the best coding the client accepts
+    (brotli when installed, else gzip). Smaller bodies are sent as is: the
+    headers and CPU would cost more than the bytes saved.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or response.status_code < 200 or response.status_code == 204
+            or response.get('Content-Type', '').split(';')[0].strip() not in settings.COMPRESSION_CONTENT_TYPES
+            or len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+
+        # Caches must keep one copy per coding even if this client gets identity
+        patch_vary_headers(response, ('Accept-Encoding',))
+        name = negotiate(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if name is None:
+            return response
+        coding = ENCODINGS[name]
+        compressed = coding.compress(response.content, coding.fast)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = name
+        # The bytes differ from the uncompressed representation
+        etag = response.get('ETag')
+        if etag and STRONG_ETAG_RE.match(etag):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,153 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on the ordering columns instead of using
+    OFFSET, so page 1000 costs the same as page 1.
+
+    `ordering` must end with a unique column (usually `id`) so that every row
+    has a distinct position. The cursor is an opaque, url-safe token holding
+    the ordering values of the last row on the page.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        self.model = queryset.model
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.seek(position))
+
+        # Fetch one extra row to know whether there is a next page.
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def seek(self, position):
+        """
+        Build `(a, b, c) > (x, y, z)` in the direction of each ordering column:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z).
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def dump_position(self, values):
+        token = urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode('utf-8'))
+        return token.decode('ascii').rstrip('=')
+
+    def load_position(self, token):
+        values = json.loads(urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise ValueError(token)
+        return values
+
+    def encode_cursor(self, instance):
+        return self.dump_position(
+            [self.model._meta.get_field(name).value_to_string(instance) for name in self.fields]
+        )
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            return [
+                self.model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, self.load_position(token))
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_cursor(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_next_link(self):
+        cursor = self.get_next_cursor()
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'cursor': self.get_next_cursor(),
+            'results': data,
+        })
+
+
+class RankedPagination(KeysetPagination):
+    """
+    Keyset pagination over a ranked search: `search(limit, after)` returns
+    `(pk, score)` rows best first, strictly after the `(score, pk)` position
+    `after`. The cursor holds that position for the last row of the page.
+    """
+    fields = ('score', 'pk')
+
+    def paginate_ranked(self, search, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        rows = search(self.page_size + 1, self.decode_cursor(request))
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.last = rows[-1] if rows else None
+
+        objects = queryset.in_bulk([pk for pk, _ in rows])
+        self.page = []
+        for pk, score in rows:
+            if pk in objects:  # deleted since it was indexed
+                objects[pk].search_score = score
+                self.page.append(objects[pk])
+        return self.page
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            score, pk = self.load_position(token)
+            return float(score), int(pk)
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_cursor(self):
+        if not self.has_next:
+            return None
+        pk, score = self.last
+        return self.dump_position([score, pk])
@@ -0,0 +1,65 @@
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def _nested_serializer(declared_fields, relation):
+    # The nested serializer may sit under another name, e.g. brand_detail(source="brand").
+    for name, field in declared_fields.items():
+        if (field.source or name) != relation:
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+        if isinstance(field, serializers.BaseSerializer):
+            return type(field)
+    return None
+
+
+def related_paths(serializer_class, prefix=""):
+    """
+    Collect the select_related / prefetch_related paths a serializer needs.
+
+    Serializers declare only their own relations in `Meta.select_related`
+    and `Meta.prefetch_related`. When one of those relations is rendered by
+    a nested serializer, that serializer's declarations are pulled in under
+    the relation's path, so `CartItemSerializer` gets `product__brand` for
+    free from `ProductMinimalSerializer`. A prefetched relation rendered by
+    a nested serializer becomes a `Prefetch` whose queryset carries the
+    nested declarations, so its own relations are joined into that single
+    prefetch query instead of costing one query each.
+    """
+    meta = getattr(serializer_class, "Meta", None)
+    declared = getattr(serializer_class, "_declared_fields", {})
+    select, prefetch = [], []
+
+    for name in getattr(meta, "select_related", ()):
+        path = prefix + name
+        select.append(path)
+        nested = _nested_serializer(declared, name)
+        if nested is not None:
+            nested_select, nested_prefetch = related_paths(nested, prefix=path + "__")
+            select.extend(nested_select)
+            prefetch.extend(nested_prefetch)
+
+    for name in getattr(meta, "prefetch_related", ()):
+        path = prefix + name
+        nested = _nested_serializer(declared, name)
+        model = getattr(getattr(nested, "Meta", None), "model", None)
+        if model is None:
+            prefetch.append(path)
+        else:
+            prefetch.append(Prefetch(path, queryset=with_related(model._default_manager.all(), nested)))
+
+    return select, prefetch
+
+
+def with_related(queryset, serializer_class):
+    """
+    Apply the relations declared by `serializer_class` to `queryset` so that
+    serializing the results costs a fixed number of queries.
+    """
+    select, prefetch = related_paths(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
@@ -0,0 +1,47 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+@contextmanager
+def primary_reads():
+    """Route every read in this thread to the primary inside the block."""
+    _state.depth = getattr(_state, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+
+
+class ReplicaRouter:
+    """
+    Send reads of READ_REPLICA_APPS models to the READ_REPLICA database, and
+    everything else (all writes, migrations) to the primary.
+
+    Reads made inside a transaction on the primary stay there so they see
+    its uncommitted writes, and so do reads inside `primary_reads()`. Code
+    that must not see replication lag, like pricing and stock at checkout,
+    reads with `.using(DEFAULT_DB_ALIAS)`.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = settings.READ_REPLICA
+        if not replica or model._meta.app_label not in settings.READ_REPLICA_APPS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or getattr(_state, 'depth', 0):
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,98 @@
+"""
+Payload trimming for list endpoints, driven by two query parameters.
+
+`fields=title,slug,brand_detail.name` keeps only the named fields; dotted
+names select inside nested serializers that use SparseFieldsMixin.
+
+`sideload=true` replaces objects that repeat across rows (customer, brand,
+category), rendered by serializers using SideLoadMixin, with their primary
+key, and lists each one once in a top-level `included` table:
+`{"results": [...], "included": {"brands": {"3": {"name": "Nike"}}}}`.
+"""
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+def requested_fields(request):
+    """
+    The `fields=` parameter as a tree, `{'lines': {'quantity': {}}}`, where
+    an empty dict keeps the whole field; None when it isn't given.
+    """
+    value = request.query_params.get('fields')
+    if not value:
+        return None
+    tree = {}
+    for path in value.split(','):
+        names = path.strip().split('.')
+        if not all(names):
+            raise ValidationError({'fields': f"Invalid field name '{path.strip()}'"})
+        node = tree
+        for name in names:
+            node = node.setdefault(name, {})
+    return tree
+
+
+def sideload_context(request):
+    """Serializer context collecting side-loaded objects when `sideload=true`."""
+    if request.query_params.get('sideload') in ('1', 'true'):
+        return {'included': {}}
+    return {}
+
+
+def with_included(data, context):
+    """Attach the side-loaded table to serialized `data`, wrapping a bare list."""
+    if 'included' not in context:
+        return data
+    if isinstance(data, list):
+        data = {'results': data}
+    data['included'] = context['included']
+    return data
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin taking a `fields` tree (see requested_fields): fields
+    outside it are dropped before anything is rendered. Unknown names are a
+    400, so a typo doesn't silently return an empty object.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sparse_fields = fields
+
+    def get_fields(self):
+        fields = super().get_fields()
+        tree = self.sparse_fields
+        if not tree:
+            return fields
+        unknown = set(tree) - set(fields)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}"})
+        for name in list(fields):
+            if name not in tree:
+                del fields[name]
+            elif tree[name]:
+                nested = fields[name]
+                if isinstance(nested, serializers.ListSerializer):
+                    nested = nested.child
+                if not isinstance(nested, SparseFieldsMixin):
+                    raise ValidationError({'fields': f"'{name}' has no sub-fields"})
+                nested.sparse_fields = tree[name]
+        return fields
+
+
+class SideLoadMixin:
+    """
+    Nested serializer mixin: with an `included` dict in the context, render
+    the object into `included[Meta.sideload_as]` once and return its pk.
+    """
+
+    def to_representation(self, instance):
+        included = self.context.get('included')
+        if included is None or self.parent is None:
+            return super().to_representation(instance)
+        table = included.setdefault(self.Meta.sideload_as, {})
+        key = str(instance.pk)
+        if key not in table:
+            table[key] = super().to_representation(instance)
+        return instance.pk
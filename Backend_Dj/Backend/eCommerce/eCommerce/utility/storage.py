@@ -0,0 +1,43 @@
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+from utility.compression import ENCODINGS
+
+# Text formats worth compressing; images and fonts already are
+COMPRESSIBLE = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.wasm'}
+MIN_SIZE = 256  # bytes; smaller files don't gain enough to matter
+MAX_RATIO = 0.95  # keep a compressed copy only if it saves at least 5%
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Content-hashed static files (`app.3f2a9c1b7e4d.js`), each compressible
+    one with `.gz` (and, when brotli is installed, `.br`) siblings written
+    by collectstatic, so they are never compressed per request.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception) and hashed_name:
+                names.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if not dry_run:
+            for name in sorted(names):
+                self.compress(name)
+
+    def compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE:
+            return
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_SIZE:
+            return
+        for coding in ENCODINGS.values():
+            if self.exists(name + coding.suffix):
+                self.delete(name + coding.suffix)
+            compressed = coding.compress(data, coding.best)
+            if len(compressed) <= len(data) * MAX_RATIO:
+                self._save(name + coding.suffix, ContentFile(compressed))
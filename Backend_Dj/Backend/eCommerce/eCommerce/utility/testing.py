@@ -0,0 +1,19 @@
+from rest_framework.test import APIClient
+
+
+class QueryCountMixin:
+    """
+    TestCase mixin that pins the number of SQL queries an endpoint runs.
+
+    Use it with a fixed expected count and data sets of different sizes, so a
+    serializer that starts lazily loading a relation per row fails the test.
+    """
+    client_class = APIClient
+
+    def assertEndpointQueries(self, expected, method, url, data=None, status_code=200, user=None):
+        if user is not None:
+            self.client.force_authenticate(user=user)
+        with self.assertNumQueries(expected):
+            response = getattr(self.client, method)(url, data, format="json")
+        self.assertEqual(response.status_code, status_code, getattr(response, "data", None))
+        return response
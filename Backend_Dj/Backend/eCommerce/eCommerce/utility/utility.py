@@ -1,11 +1,37 @@
 import uuid
-from datetime import datetime
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
 def get_slug():
     return str(uuid.uuid4()).split("-")[0]
 
 
-def generate_order_id(item_count):
-    now= datetime.now()
-    item_count=str(item_count).zfill(4)
-    order_id = f"ORD-{now.strftime("%Y%m%d-%H%M%S")}-{item_count}"
-    return order_id
\ No newline at end of file
+def generate_order_id(number):
+    # number comes from the orders.Sequence allocator, never from a COUNT(*);
+    # the stamp is TIME_ZONE local time whatever the host's zone
+    now= timezone.localtime()
+    number=str(number).zfill(4)
+    order_id = f"ORD-{now.strftime("%Y%m%d-%H%M%S")}-{number}"
+    return order_id
+
+
+def parse_day_or_datetime(value):
+    """
+    Parse `YYYY-MM-DD` or an ISO datetime into an aware datetime and tell
+    which one it was: returns `(moment, is_day)`. Raises ValueError.
+    """
+    # parse_datetime would also accept a bare date, so try that first
+    day = parse_date(value)
+    is_day = day is not None
+    if is_day:
+        moment = datetime.combine(day, time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment, is_day
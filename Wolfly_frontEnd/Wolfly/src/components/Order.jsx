@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from "react";
+import React, { useState, useEffect, useCallback, useRef } from "react";
 import { Package, Truck,  CheckCircle, XCircle, Clock, Download, Filter,Search,RefreshCw,AlertCircle,ShoppingBag,Eye,Calendar,IndianRupee,MapPin,User,Mail,Phone,Home } from "lucide-react";
 
 const Order = () => {
@@ -7,6 +7,14 @@ const Order = () => {
   const [filteredOrders, setFilteredOrders] = useState([]);
   const [statusFilter, setStatusFilter] = useState("All");
   const [searchQuery, setSearchQuery] = useState("");
+  const [sinceDate, setSinceDate] = useState("");
+  const [untilDate, setUntilDate] = useState("");
+  const [nextCursor, setNextCursor] = useState(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  // Ignore responses for filters that have since changed
+  const requestId = useRef(0);
+  // After the first load, refetches keep the controls on screen
+  const hasLoaded = useRef(false);
   const [isLoading, setIsLoading] = useState(true);
   const [isRefreshing, setIsRefreshing] = useState(false);
   const [errorMessage, setErrorMessage] = useState("");
@@ -34,16 +42,26 @@ const Order = () => {
     setTimeout(() => setToast({ show: false, message: "", type: "" }), 4000);
   }, []);
 
-  // Fetch orders from Django backend
-  const fetchOrders = useCallback(async (showRefreshLoader = false) => {
-    if (showRefreshLoader) {
+  // Fetch orders from Django backend, one keyset page at a time. Status and
+  // dates are filtered by the server; `cursor` appends the next page.
+  const fetchOrders = useCallback(async (showRefreshLoader = false, cursor = null) => {
+    const id = ++requestId.current;
+    if (cursor) {
+      setIsLoadingMore(true);
+    } else if (showRefreshLoader || hasLoaded.current) {
       setIsRefreshing(true);
     } else {
       setIsLoading(true);
     }
-    
+
+    const params = new URLSearchParams();
+    if (statusFilter !== "All") params.set("status", statusFilter);
+    if (sinceDate) params.set("since", sinceDate);
+    if (untilDate) params.set("until", untilDate);
+    if (cursor) params.set("cursor", cursor);
+
     try {
-      const response = await fetch(`${API_BASE_URL}/orders/showorder/`, {
+      const response = await fetch(`${API_BASE_URL}/orders/showorder/?${params}`, {
         method: 'GET',
         headers: {
           'Authorization': `Bearer ${access_token}`,
@@ -51,10 +69,13 @@ const Order = () => {
         },
       });
 
+      if (id !== requestId.current) return;
+
       if (!response.ok) {
         if (response.status === 404) {
           const errorData = await response.json();
           setOrders([]);
+          setNextCursor(null);
           setErrorMessage(errorData.error || "You do not have any orders.");
         } else if (response.status === 401) {
           setErrorMessage("Please log in to view your orders.");
@@ -64,22 +85,30 @@ const Order = () => {
         }
       } else {
         const data = await response.json();
-        setOrders(Array.isArray(data) ? data : []);
+        if (id !== requestId.current) return;
+        const page = Array.isArray(data.results) ? data.results : [];
+        setOrders(previous => cursor ? [...previous, ...page] : page);
+        setNextCursor(data.cursor || null);
         setErrorMessage("");
         if (showRefreshLoader) {
           showToast("Orders refreshed successfully!", "success");
         }
       }
     } catch (error) {
+      if (id !== requestId.current) return;
       console.error('Error fetching orders:', error);
       const errorMsg = error.message || "Network error. Please check your connection.";
       setErrorMessage(errorMsg);
       showToast("Failed to load orders", "error");
     } finally {
-      setIsLoading(false);
-      setIsRefreshing(false);
+      if (id === requestId.current) {
+        hasLoaded.current = true;
+        setIsLoading(false);
+        setIsRefreshing(false);
+        setIsLoadingMore(false);
+      }
     }
-  }, [access_token, showToast]);
+  }, [access_token, showToast, statusFilter, sinceDate, untilDate]);
 
   // Cancel order
  const handleCancelOrder = async (orderId) => {
@@ -256,22 +285,15 @@ const handleCancelOrderWithTimeout = async (orderId) => {
     }
   };
 
-  // Filter and sort orders
+  // Search and sort the pages loaded so far (status and dates are server-side)
   const applyFiltersAndSort = useCallback(() => {
     let filtered = [...orders];
 
-    // Apply status filter
-    if (statusFilter !== "All") {
-      filtered = filtered.filter(order => 
-        (order.status || "pending").toLowerCase() === statusFilter.toLowerCase()
-      );
-    }
-
     // Apply search filter
     if (searchQuery) {
       filtered = filtered.filter(order =>
         order.id?.toString().includes(searchQuery) ||
-        order.products?.title?.toLowerCase().includes(searchQuery.toLowerCase())
+        order.lines?.some(line => line.product?.title?.toLowerCase().includes(searchQuery.toLowerCase()))
       );
     }
 
@@ -283,16 +305,16 @@ const handleCancelOrderWithTimeout = async (orderId) => {
         case "oldest":
           return new Date(a.created_at || 0) - new Date(b.created_at || 0);
         case "amount_high":
-          return (b.final_price * b.quantity) - (a.final_price * a.quantity);
+          return b.final_price - a.final_price;
         case "amount_low":
-          return (a.final_price * a.quantity) - (b.final_price * b.quantity);
+          return a.final_price - b.final_price;
         default:
           return 0;
       }
     });
 
     setFilteredOrders(filtered);
-  }, [orders, statusFilter, searchQuery, sortBy]);
+  }, [orders, searchQuery, sortBy]);
 
   // Utility functions
   const getStatusIcon = (status) => {
@@ -398,13 +420,33 @@ const handleCancelOrderWithTimeout = async (orderId) => {
                 >
                   <option value="All">All Status</option>
                   <option value="pending">Pending</option>
-                  <option value="processing">Processing</option>
                   <option value="shipped">Shipped</option>
-                  <option value="delivered">Delivered</option>
                   <option value="cancelled">Cancelled</option>
                 </select>
               </div>
 
+              {/* Date Range */}
+              <div className="flex items-center gap-2">
+                <Calendar className="w-5 h-5 text-gray-500" />
+                <input
+                  type="date"
+                  value={sinceDate}
+                  max={untilDate || undefined}
+                  onChange={(e) => setSinceDate(e.target.value)}
+                  aria-label="Orders placed from"
+                  className="px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent"
+                />
+                <span className="text-gray-500">to</span>
+                <input
+                  type="date"
+                  value={untilDate}
+                  min={sinceDate || undefined}
+                  onChange={(e) => setUntilDate(e.target.value)}
+                  aria-label="Orders placed until"
+                  className="px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent"
+                />
+              </div>
+
               {/* Sort By */}
               <select
                 value={sortBy}
@@ -469,27 +511,30 @@ const handleCancelOrderWithTimeout = async (orderId) => {
                   </div>
 
                   {/* Product Info */}
-                  <div className="flex items-center gap-4 mb-4">
-                    <img
-                      src={order.products?.front_imges ? `${API_BASE_URL}${order.products.front_imges}` : '/api/placeholder/80/80'}
-                      className="w-20 h-20 rounded-lg object-cover border"
-                      alt={order.products?.title || 'Product'}
-                      onError={(e) => {
-                        e.target.src = '/api/placeholder/80/80';
-                      }}
-                    />
-                    <div className="flex-1">
-                      <h4 className="font-medium text-gray-900 mb-1">
-                        {order.products?.title || 'Product Name'}
-                      </h4>
-                      <div className="flex flex-col sm:flex-row sm:items-center gap-2 text-sm text-gray-600">
-                        <span>Quantity: {order.quantity}</span>
-                        <span className="hidden sm:inline">•</span>
-                        <span className="font-semibold text-gray-900">
-                          Total: {formatPrice(order.final_price * order.quantity)}
-                        </span>
+                  {order.lines?.map((line, index) => (
+                    <div key={index} className="flex items-center gap-4 mb-4">
+                      <img
+                        src={line.product?.front_imges ? `${API_BASE_URL}${line.product.front_imges}` : '/api/placeholder/80/80'}
+                        className="w-20 h-20 rounded-lg object-cover border"
+                        alt={line.product?.title || 'Product'}
+                        onError={(e) => {
+                          e.target.src = '/api/placeholder/80/80';
+                        }}
+                      />
+                      <div className="flex-1">
+                        <h4 className="font-medium text-gray-900 mb-1">
+                          {line.product?.title || 'Product Name'}
+                        </h4>
+                        <div className="flex flex-col sm:flex-row sm:items-center gap-2 text-sm text-gray-600">
+                          <span>Quantity: {line.quantity}</span>
+                          <span className="hidden sm:inline">•</span>
+                          <span>{formatPrice(line.final_price)}</span>
+                        </div>
                       </div>
                     </div>
+                  ))}
+                  <div className="mb-4 text-sm font-semibold text-gray-900">
+                    Total: {formatPrice(order.final_price)}
                   </div>
 
                   {/* Actions */}
@@ -526,22 +571,22 @@ const handleCancelOrderWithTimeout = async (orderId) => {
               </div>
             ))}
           </div>
-        ) : (
+        ) : (!nextCursor || !searchQuery) && (
           <div className="text-center py-12 bg-white rounded-lg shadow-sm border">
             <Package className="w-16 h-16 text-gray-300 mx-auto mb-4" />
             <h3 className="text-lg font-medium text-gray-900 mb-2">
-              {searchQuery || statusFilter !== "All" 
-                ? `No ${statusFilter.toLowerCase()} orders found` 
+              {searchQuery || statusFilter !== "All" || sinceDate || untilDate
+                ? `No ${statusFilter === "All" ? "" : statusFilter + " "}orders found`
                 : "No orders yet"
               }
             </h3>
             <p className="text-gray-500 mb-6">
-              {searchQuery || statusFilter !== "All"
+              {searchQuery || statusFilter !== "All" || sinceDate || untilDate
                 ? "Try adjusting your search or filter criteria"
                 : "Start shopping to see your orders here"
               }
             </p>
-            {(!searchQuery && statusFilter === "All") && (
+            {(!searchQuery && statusFilter === "All" && !sinceDate && !untilDate) && (
               <button
                 onClick={() => window.location.href = "/"}
                 className="bg-blue-600 text-white px-6 py-3 rounded-lg hover:bg-blue-700 transition-colors"
@@ -552,6 +597,25 @@ const handleCancelOrderWithTimeout = async (orderId) => {
           </div>
         )}
 
+        {/* Next Page */}
+        {nextCursor && (
+          <div className="text-center mt-6">
+            {(searchQuery || sortBy !== "newest") && (
+              <p className="text-sm text-gray-500 mb-3">
+                {searchQuery ? "Searching" : "Sorting"} the {orders.length} orders loaded so far. Load more to include older orders.
+              </p>
+            )}
+            <button
+              onClick={() => fetchOrders(false, nextCursor)}
+              disabled={isLoadingMore}
+              className="inline-flex items-center gap-2 px-6 py-2 border border-blue-600 text-blue-600 rounded-lg hover:bg-blue-50 disabled:opacity-50 disabled:cursor-not-allowed transition-colors"
+            >
+              {isLoadingMore && <RefreshCw className="w-4 h-4 animate-spin" />}
+              {isLoadingMore ? "Loading..." : "Load More Orders"}
+            </button>
+          </div>
+        )}
+
         {/* Order Details Modal */}
         {selectedOrder && (
           <div className="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center p-4 z-50">
@@ -596,7 +660,7 @@ const handleCancelOrderWithTimeout = async (orderId) => {
                       <label className="text-sm font-medium text-gray-500">Total Amount</label>
                       <div className="flex items-center gap-2 text-gray-900 font-semibold text-lg">
                         <IndianRupee className="w-5 h-5" />
-                        {formatPrice(selectedOrder.final_price * selectedOrder.quantity)}
+                        {formatPrice(selectedOrder.final_price)}
                       </div>
                     </div>
                   </div>
@@ -643,29 +707,31 @@ const handleCancelOrderWithTimeout = async (orderId) => {
                 {/* Product Information */}
                 <div className="mt-6 pt-6 border-t">
                   <h4 className="font-semibold text-gray-900 mb-4">Product Details</h4>
-                  <div className="flex items-center gap-4 p-4 bg-gray-50 rounded-lg">
-                    <img
-                      src={selectedOrder.products?.front_imges ? `${API_BASE_URL}${selectedOrder.products.front_imges}` : '/api/placeholder/80/80'}
-                      className="w-16 h-16 rounded-lg object-cover border"
-                      alt={selectedOrder.products?.title || 'Product'}
-                      onError={(e) => {
-                        e.target.src = '/api/placeholder/80/80';
-                      }}
-                    />
-                    <div className="flex-1">
-                      <h5 className="font-medium text-gray-900">{selectedOrder.products?.title}</h5>
-                      <div className="grid grid-cols-2 gap-4 mt-2 text-sm">
-                        <div>
-                          <span className="text-gray-500">Quantity:</span>
-                          <span className="ml-2 font-medium">{selectedOrder.quantity}</span>
-                        </div>
-                        <div>
-                          <span className="text-gray-500">Unit Price:</span>
-                          <span className="ml-2 font-medium">{formatPrice(selectedOrder.final_price)}</span>
+                  {selectedOrder.lines?.map((line, index) => (
+                    <div key={index} className="flex items-center gap-4 p-4 mb-2 bg-gray-50 rounded-lg">
+                      <img
+                        src={line.product?.front_imges ? `${API_BASE_URL}${line.product.front_imges}` : '/api/placeholder/80/80'}
+                        className="w-16 h-16 rounded-lg object-cover border"
+                        alt={line.product?.title || 'Product'}
+                        onError={(e) => {
+                          e.target.src = '/api/placeholder/80/80';
+                        }}
+                      />
+                      <div className="flex-1">
+                        <h5 className="font-medium text-gray-900">{line.product?.title}</h5>
+                        <div className="grid grid-cols-2 gap-4 mt-2 text-sm">
+                          <div>
+                            <span className="text-gray-500">Quantity:</span>
+                            <span className="ml-2 font-medium">{line.quantity}</span>
+                          </div>
+                          <div>
+                            <span className="text-gray-500">Unit Price:</span>
+                            <span className="ml-2 font-medium">{formatPrice(line.unit_price)}</span>
+                          </div>
                         </div>
                       </div>
                     </div>
-                  </div>
+                  ))}
                 </div>
 
                 {/* Actions */}
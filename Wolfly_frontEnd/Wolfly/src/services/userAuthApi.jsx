@@ -83,7 +83,7 @@ export const userAuthApi = createApi({
             },
         }),
         getProducts: builder.query({
-            query: () => "products/",
+            query: () => "products/?all=true",
         }),
         getCartItem: builder.query({
             query:(access_token)=>{